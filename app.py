@@ -5,22 +5,34 @@ OCR API dengan dukungan preview, save, history, dan export XLSX
 
 import os
 import sys
+import time
+
+# Durasi import modul (cv2, numpy, SQLAlchemy, ...) masuk laporan startup
+_import_started = time.perf_counter()
+
 import logging
 from datetime import datetime
-from flask import Flask, request, jsonify, send_file, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_file, send_from_directory, stream_with_context
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
 from werkzeug.utils import secure_filename
-from io import BytesIO
-import tempfile
+import zipfile
 
 # Import custom modules
+from config import Config
+from models import db
 from bukti_setor.processor import BuktiSetorProcessor
-from utils.file_utils import allowed_file, cleanup_temp_files
-from utils.helpers import validate_file_size, format_response
+from bukti_setor.jobs import JobManager, QueueFull
+from bukti_setor.admission import AdmissionController, OverBudget
+from bukti_setor.batch import iter_uploads, iter_zip_members, open_zip, process_batch
+from bukti_setor.metrics import registry
+from bukti_setor import export, queries, search
+from bukti_setor.records import CREATED, DUPLICATE, INVALID, clear_missing_ntpn, save_records
+from bukti_setor.runtime import STARTUP, PerProcess, report_startup, startup_phase
+from bukti_setor.uploads import UploadRequest, upload_source
+from utils.file_utils import allowed_file, cleanup_temp_files, save_stream_to_tempfile
+from utils.helpers import validate_file_size, format_response, format_stream_event, strip_timings
 
-# Database setup
-db = SQLAlchemy()
+STARTUP['import'] = time.perf_counter() - _import_started
 
 # Configure logging
 logging.basicConfig(
@@ -29,14 +41,24 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Content-addressed previews never change under the same name
+PREVIEW_MAX_AGE = 365 * 24 * 3600
+PREVIEW_CACHE_CONTROL = f'public, max-age={PREVIEW_MAX_AGE}, immutable'
+
 def create_app():
     """Application factory"""
     app = Flask(__name__)
+    # Upload kecil di memori, besar di satu file sementara (lihat bukti_setor/uploads.py)
+    app.request_class = UploadRequest
     
     # Configuration
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     app.config['UPLOAD_FOLDER'] = os.path.join(os.getcwd(), 'uploads')
-    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
+    # 16MB untuk request biasa, route batch punya batas sendiri. Batas global Flask
+    # memakai yang terbesar, batas per route dicek di limit_content_length().
+    app.config['SINGLE_MAX_CONTENT_LENGTH'] = Config.MAX_CONTENT_LENGTH  # 16MB max
+    app.config['BATCH_MAX_CONTENT_LENGTH'] = Config.BATCH_MAX_CONTENT_LENGTH
+    app.config['MAX_CONTENT_LENGTH'] = max(Config.MAX_CONTENT_LENGTH, Config.BATCH_MAX_CONTENT_LENGTH)
     
     # Database configuration
     database_url = os.environ.get('DATABASE_URL')
@@ -61,10 +83,137 @@ def create_app():
     })
     
     # Import models after db initialization
-    from models import BuktiSetor
+    from models import BuktiSetor, ensure_columns, ensure_indexes
+    
+    # Pastikan tabel ada (juga saat dijalankan lewat gunicorn), lalu tambahkan
+    # kolom & index baru ke tabel yang dibuat oleh versi sebelumnya
+    try:
+        with app.app_context():
+            db.create_all()
+            added = ensure_columns()
+            if added:
+                logger.info(f"✅ Kolom database ditambahkan: {', '.join(added)}")
+            cleared = clear_missing_ntpn()
+            if cleared:
+                logger.info(f"✅ NTPN kosong/placeholder di {cleared} data lama diubah menjadi NULL")
+            created = ensure_indexes()
+            if created:
+                logger.info(f"✅ Index database dibuat: {', '.join(created)}")
+            indexed = search.ensure_search_index()
+            if indexed:
+                logger.info(f"✅ Index full-text dibuat untuk {indexed} data lama")
+            # Koneksi dibuka ulang di setiap proses (aman di-fork saat --preload)
+            db.engine.dispose()
+    except Exception as e:
+        logger.error(f"❌ Database initialization error: {e}")
+    
+    def build_processor():
+        """OCR processor (sekali per worker, state-nya dipakai ulang antar request)"""
+        processor = BuktiSetorProcessor(upload_folder=app.config['UPLOAD_FOLDER'])
+        
+        # Preview yang dirujuk data tersimpan tidak boleh ikut di-evict
+        try:
+            with app.app_context():
+                refs = db.session.query(BuktiSetor.preview_filename, db.func.count()).filter(
+                    BuktiSetor.preview_filename.isnot(None)
+                ).group_by(BuktiSetor.preview_filename).all()
+            processor.previews.sync_refs(dict(refs))
+        except Exception as e:
+            logger.error(f"❌ Preview reference sync error: {e}")
+        return processor
+    
+    def build_job_manager():
+        """Antrian job OCR asynchronous (job yang tertinggal dari worker lama diambil ulang)"""
+        manager = JobManager(
+            app, processor.get(),
+            max_workers=Config.OCR_JOB_WORKERS,
+            max_queue=Config.OCR_JOB_QUEUE_SIZE,
+            admission=admission.get(),
+            batch_workers=Config.OCR_BATCH_WORKERS or None,
+            batch_capacity=Config.BATCH_QUEUE_SIZE
+        )
+        try:
+            manager.recover()
+        except Exception as e:
+            logger.error(f"❌ Job recovery error: {e}")
+        return manager
+    
+    def build_admission():
+        """Budget memori OCR bersama semua worker (tabel SQLite di upload folder)"""
+        return AdmissionController(
+            os.path.join(app.config['UPLOAD_FOLDER'], 'admission.sqlite3'),
+            Config.OCR_MEMORY_BUDGET,
+            max_wait=Config.OCR_ADMISSION_MAX_WAIT,
+            retry_after=Config.OCR_ADMISSION_RETRY_AFTER
+        )
+    
+    def start_worker():
+        """Siapkan worker sebelum menerima request: processor, antrian job, warm-up OCR"""
+        with startup_phase('worker'):
+            job_manager.get()
+        if Config.OCR_WARMUP:
+            with startup_phase('warmup'):
+                try:
+                    processor.warm_up()
+                except Exception as e:
+                    logger.warning(f"⚠️ OCR warm-up gagal: {e}")
+        report_startup()
+        return True
     
-    # Initialize OCR processor
-    processor = BuktiSetorProcessor()
+    # Thread pool, koneksi SQLite dan engine Tesseract tidak boleh ikut di-fork
+    # dari master gunicorn (--preload), jadi dibuat per proses. gunicorn.conf.py
+    # memanggil worker.get() di post_worker_init; tanpa gunicorn, saat request pertama.
+    processor = PerProcess(build_processor)
+    admission = PerProcess(build_admission)
+    job_manager = PerProcess(build_job_manager)
+    worker = PerProcess(start_worker)
+    app.extensions['easyocr_worker'] = worker
+    
+    registry.gauge('easyocr_admission_in_use_bytes', lambda: admission.usage()['in_use_bytes'])
+    registry.gauge('easyocr_admission_budget_bytes', lambda: admission.max_bytes)
+    registry.gauge('easyocr_admission_active', lambda: admission.usage()['active'])
+    
+    batch_endpoints = {'process_batch_upload'}
+    
+    @app.before_request
+    def ensure_worker():
+        worker.get()
+    
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+    
+    @app.after_request
+    def record_metrics(response):
+        """Count every request and its latency for /metrics"""
+        endpoint = request.endpoint or 'unknown'
+        started = g.get('request_started')
+        if started is not None:
+            registry.observe('easyocr_request_duration_seconds', time.perf_counter() - started, endpoint=endpoint)
+        registry.inc('easyocr_requests_total', endpoint=endpoint, status=str(response.status_code))
+        if response.status_code >= 500:
+            registry.inc('easyocr_errors_total', stage='http')
+        registry.flush()
+        return response
+    
+    def over_budget(e):
+        """503 + Retry-After saat budget memori OCR penuh"""
+        response = jsonify({'error': 'Server is busy processing other documents, please retry later'})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 503
+    
+    def include_timings():
+        """Per-stage timings are only returned when requested with ?timings=1"""
+        return request.args.get('timings', '').lower() in ('1', 'true', 'yes')
+    
+    @app.before_request
+    def limit_content_length():
+        """Enforce the 16MB limit on every route except batch upload"""
+        if request.endpoint in batch_endpoints:
+            return None
+        if request.content_length and request.content_length > app.config['SINGLE_MAX_CONTENT_LENGTH']:
+            return jsonify({'error': 'File too large'}), 413
+        return None
     
     # Routes
     @app.route('/health', methods=['GET'])
@@ -76,6 +225,11 @@ def create_app():
             'service': 'EasyOCR Backend'
         }), 200
     
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Prometheus metrics aggregated across all gunicorn workers"""
+        return Response(registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
+    
     @app.route('/api/bukti_setor/process', methods=['POST'])
     def process_bukti_setor():
         """Process bukti setor with OCR"""
@@ -94,109 +248,441 @@ def create_app():
             if not validate_file_size(file):
                 return jsonify({'error': 'File too large'}), 400
             
-            # Process with temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-                file.save(temp_file.name)
+            # OCR langsung dari buffer upload, atau dari file spill untuk upload besar
+            data, path = upload_source(file)
+            try:
+                # Cek cache dulu; OCR baru antri jika budget memori OCR sedang penuh
+                doc = processor.prepare(filepath=path, data=data, filename=file.filename)
+                with processor.admit(doc, admission.get()):
+                    result = processor.process(doc)
                 
-                try:
-                    # Process OCR
-                    result = processor.process_file(temp_file.name)
+                if result.get('success'):
+                    if not include_timings():
+                        strip_timings(result)
+                    return jsonify(format_response(result, 'OCR processing completed successfully'))
+                else:
+                    return jsonify({'error': result.get('error', 'Processing failed')}), 500
                     
-                    if result.get('success'):
-                        return jsonify(format_response(result, 'OCR processing completed successfully'))
-                    else:
-                        return jsonify({'error': result.get('error', 'Processing failed')}), 500
+            except OverBudget as e:
+                return over_budget(e)
+            except Exception as e:
+                logger.error(f"OCR processing error: {e}")
+                return jsonify({'error': f'Processing failed: {str(e)}'}), 500
                         
+        except Exception as e:
+            logger.error(f"Request processing error: {e}")
+            return jsonify({'error': 'Internal server error'}), 500
+    
+    @app.route('/api/bukti_setor/process/stream', methods=['POST'])
+    def process_bukti_setor_stream():
+        """Process bukti setor and stream each page result as soon as it is done (NDJSON or SSE)"""
+        try:
+            if 'file' not in request.files:
+                return jsonify({'error': 'No file provided'}), 400
+            
+            file = request.files['file']
+            if file.filename == '':
+                return jsonify({'error': 'No file selected'}), 400
+            
+            if not allowed_file(file.filename):
+                return jsonify({'error': 'File type not allowed'}), 400
+            
+            if not validate_file_size(file):
+                return jsonify({'error': 'File too large'}), 400
+            
+            fmt = request.args.get('format')
+            if not fmt:
+                fmt = 'sse' if 'text/event-stream' in request.headers.get('Accept', '') else 'ndjson'
+            if fmt not in ('ndjson', 'sse'):
+                return jsonify({'error': 'format must be ndjson or sse'}), 400
+            
+            # Buffer / file spill upload tetap hidup selama stream (stream_with_context)
+            data, path = upload_source(file)
+            original_filename = file.filename
+            with_timings = include_timings()
+            
+            # Budget dipegang sampai stream selesai (atau client putus); hasil cache tanpa budget
+            doc = processor.prepare(filepath=path, data=data, filename=original_filename)
+            try:
+                ticket = processor.admit(doc, admission.get())
+            except OverBudget as e:
+                return over_budget(e)
+            
+            events = processor.stream(doc)
+            
+            def generate():
+                try:
+                    for event, payload in events:
+                        if not with_timings:
+                            strip_timings(payload)
+                        yield format_stream_event(event, payload, fmt)
                 except Exception as e:
-                    logger.error(f"OCR processing error: {e}")
-                    return jsonify({'error': f'Processing failed: {str(e)}'}), 500
+                    logger.error(f"OCR streaming error: {e}")
+                    yield format_stream_event('error', {'success': False, 'error': f'Processing failed: {str(e)}'}, fmt)
                 finally:
-                    # Cleanup
-                    try:
-                        os.unlink(temp_file.name)
-                    except:
-                        pass
-                        
+                    ticket.release()
+            
+            response = Response(
+                stream_with_context(generate()),
+                mimetype='text/event-stream' if fmt == 'sse' else 'application/x-ndjson'
+            )
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['X-Accel-Buffering'] = 'no'  # Matikan buffering proxy (nginx)
+            # Client putus sebelum generator jalan: finally di atas tidak terpanggil
+            response.call_on_close(ticket.release)
+            return response
+            
         except Exception as e:
             logger.error(f"Request processing error: {e}")
             return jsonify({'error': 'Internal server error'}), 500
     
+    @app.route('/api/bukti_setor/batch', methods=['POST'])
+    def process_batch_upload():
+        """
+        Process many bukti setor files (multipart 'files' list or a ZIP). Small batches
+        are answered in this request; larger ones (or ?async=1) are queued as one job
+        per file and return a batch ID immediately.
+        """
+        archive = None
+        try:
+            max_file_size = app.config['SINGLE_MAX_CONTENT_LENGTH']
+            
+            if request.mimetype in ('application/zip', 'application/x-zip-compressed'):
+                # Body berupa ZIP mentah: alirkan ke file sementara per chunk
+                try:
+                    archive = save_stream_to_tempfile(
+                        request.stream, app.config['BATCH_MAX_CONTENT_LENGTH'], suffix='.zip'
+                    )
+                except ValueError:
+                    return jsonify({'error': 'Batch too large'}), 413
+                zip_stream = archive
+            else:
+                files = request.files.getlist('files') + request.files.getlist('file')
+                files = [file for file in files if file.filename]
+                if not files:
+                    return jsonify({'error': 'No file provided'}), 400
+                
+                # Multipart sudah ditampung UploadRequest (memori / file spill), ZIP dibaca langsung dari sana
+                zip_stream = None
+                if len(files) == 1 and files[0].filename.lower().endswith('.zip'):
+                    zip_stream = files[0].stream
+            
+            if zip_stream is not None:
+                try:
+                    zf = open_zip(zip_stream)
+                except zipfile.BadZipFile:
+                    return jsonify({'error': 'Invalid ZIP archive'}), 400
+                total_files = sum(1 for info in zf.infolist() if not info.is_dir())
+                items = iter_zip_members(zf, max_file_size)
+            else:
+                total_files = len(files)
+                items = iter_uploads(files, max_file_size)
+            
+            if total_files > Config.BATCH_MAX_FILES:
+                return jsonify({'error': f'Too many files (max {Config.BATCH_MAX_FILES})'}), 400
+            
+            if total_files > Config.BATCH_SYNC_MAX_FILES or request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+                try:
+                    batch_id, total = job_manager.submit_batch(items, total_files)
+                except QueueFull:
+                    response = jsonify({'error': 'OCR queue is full, please retry later'})
+                    response.headers['Retry-After'] = '10'
+                    return response, 429
+                
+                return jsonify({
+                    'success': True,
+                    'batch_id': batch_id,
+                    'status': 'queued',
+                    'total': total,
+                    'status_url': f'/api/bukti_setor/batch/{batch_id}'
+                }), 202
+            
+            results = process_batch(
+                processor, items, max_workers=Config.OCR_BATCH_WORKERS or None, admission=admission.get()
+            )
+            if not include_timings():
+                for item in results:
+                    strip_timings(item)
+            berhasil = sum(1 for item in results if item['success'])
+            
+            return jsonify({
+                'success': True,
+                'total': len(results),
+                'berhasil': berhasil,
+                'gagal': len(results) - berhasil,
+                'results': results,
+                'message': f'✅ Berhasil memproses {berhasil} dari {len(results)} file'
+            }), 200
+            
+        except Exception as e:
+            logger.error(f"Batch processing error: {e}")
+            return jsonify({'error': f'Batch processing failed: {str(e)}'}), 500
+        finally:
+            if archive is not None:
+                archive.close()
+    
+    @app.route('/api/bukti_setor/batch/<batch_id>', methods=['GET'])
+    def get_batch(batch_id):
+        """Get queued batch progress and per-file results"""
+        try:
+            batch = job_manager.get_batch(batch_id)
+            if batch is None:
+                return jsonify({'error': 'Batch not found'}), 404
+            
+            if not include_timings():
+                for item in batch['results']:
+                    strip_timings(item)
+            return jsonify({'success': True, **batch}), 200
+            
+        except Exception as e:
+            logger.error(f"Batch retrieval error: {e}")
+            return jsonify({'error': f'Failed to retrieve batch: {str(e)}'}), 500
+    
+    @app.route('/api/bukti_setor/jobs', methods=['POST'])
+    def create_job():
+        """Queue bukti setor for async OCR, returns a job ID immediately"""
+        try:
+            if 'file' not in request.files:
+                return jsonify({'error': 'No file provided'}), 400
+            
+            file = request.files['file']
+            if file.filename == '':
+                return jsonify({'error': 'No file selected'}), 400
+            
+            if not allowed_file(file.filename):
+                return jsonify({'error': 'File type not allowed'}), 400
+            
+            if not validate_file_size(file):
+                return jsonify({'error': 'File too large'}), 400
+            
+            try:
+                job_id = job_manager.submit(file)
+            except QueueFull:
+                response = jsonify({'error': 'OCR queue is full, please retry later'})
+                response.headers['Retry-After'] = '10'
+                return response, 429
+            
+            return jsonify({
+                'success': True,
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': f'/api/bukti_setor/jobs/{job_id}'
+            }), 202
+            
+        except Exception as e:
+            logger.error(f"Job submit error: {e}")
+            return jsonify({'error': f'Failed to queue job: {str(e)}'}), 500
+    
+    @app.route('/api/bukti_setor/jobs/<job_id>', methods=['GET'])
+    def get_job(job_id):
+        """Get async OCR job status and per-page results"""
+        try:
+            job = job_manager.get(job_id)
+            if job is None:
+                return jsonify({'error': 'Job not found'}), 404
+            
+            if not include_timings():
+                strip_timings(job)
+            return jsonify({'success': True, **job}), 200
+            
+        except Exception as e:
+            logger.error(f"Job retrieval error: {e}")
+            return jsonify({'error': f'Failed to retrieve job: {str(e)}'}), 500
+    
+    @app.route('/api/bukti_setor/cache/stats', methods=['GET'])
+    def cache_stats():
+        """OCR result cache counters (hit/miss/eviction)"""
+        if processor.cache is None:
+            return jsonify({'success': True, 'enabled': False, 'previews': processor.previews.stats()}), 200
+        return jsonify({
+            'success': True,
+            'enabled': True,
+            'stats': processor.cache.stats(),
+            'previews': processor.previews.stats()
+        }), 200
+    
+    @app.route('/api/bukti_setor/admission', methods=['GET'])
+    def admission_stats():
+        """Current OCR memory budget usage across all workers"""
+        return jsonify({'success': True, **admission.usage()}), 200
+    
     @app.route('/api/bukti_setor/save', methods=['POST'])
     def save_bukti_setor():
-        """Save OCR result to database"""
+        """Save one OCR result (kode_setor, tanggal, jumlah, ntpn, preview_filename); an existing NTPN is not saved twice"""
         try:
-            data = request.get_json()
+            data = request.get_json(silent=True)
             
             if not data:
                 return jsonify({'error': 'No data provided'}), 400
             
-            # Create new record
-            bukti_setor = BuktiSetor(
-                filename=data.get('filename', ''),
-                ntpn=data.get('ntpn', ''),
-                npwp=data.get('npwp', ''),
-                nama_wajib_pajak=data.get('nama_wajib_pajak', ''),
-                tanggal_setor=data.get('tanggal_setor', ''),
-                jumlah_setor=data.get('jumlah_setor', 0),
-                kode_akun_pajak=data.get('kode_akun_pajak', ''),
-                kode_jenis_setoran=data.get('kode_jenis_setoran', ''),
-                masa_pajak=data.get('masa_pajak', ''),
-                tahun_pajak=data.get('tahun_pajak', ''),
-                ocr_confidence=data.get('ocr_confidence', 0.0),
-                raw_text=data.get('raw_text', ''),
-                processing_time=data.get('processing_time', 0.0)
-            )
-            
-            db.session.add(bukti_setor)
-            db.session.commit()
+            (result,), previews = save_records([data])
+            if result['status'] == INVALID:
+                return jsonify({'error': 'Invalid data', 'errors': result['errors']}), 400
+            processor.previews.pin(*previews)
             
+            created = result['status'] == CREATED
             return jsonify({
                 'success': True,
-                'message': 'Data saved successfully',
-                'id': bukti_setor.id,
-                'data': bukti_setor.to_dict()
-            }), 201
+                'message': 'Data saved successfully' if created else 'NTPN already saved',
+                'status': result['status'],
+                'id': result['id'],
+                'data': db.session.get(BuktiSetor, result['id']).to_dict()
+            }), 201 if created else 200
             
         except Exception as e:
             db.session.rollback()
             logger.error(f"Save error: {e}")
             return jsonify({'error': f'Failed to save data: {str(e)}'}), 500
     
+    @app.route('/api/bukti_setor/save/bulk', methods=['POST'])
+    def save_bukti_setor_bulk():
+        """
+        Save many OCR results in one transaction: {"records": [...]} or a JSON list.
+        Each row gets status created / duplicate (NTPN already saved) / invalid (with errors).
+        """
+        try:
+            data = request.get_json(silent=True)
+            items = data.get('records') if isinstance(data, dict) else data
+            
+            if not isinstance(items, list) or not items:
+                return jsonify({'error': 'No records provided'}), 400
+            if len(items) > Config.SAVE_MAX_RECORDS:
+                return jsonify({'error': f'Too many records (max {Config.SAVE_MAX_RECORDS})'}), 400
+            
+            results, previews = save_records(items)
+            processor.previews.pin(*previews)
+            
+            summary = {status: 0 for status in (CREATED, DUPLICATE, INVALID)}
+            for result in results:
+                summary[result['status']] += 1
+            
+            return jsonify({
+                'success': True,
+                'summary': summary,
+                'results': results
+            }), 200
+            
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Bulk save error: {e}")
+            return jsonify({'error': f'Failed to save data: {str(e)}'}), 500
+    
     @app.route('/api/bukti_setor/history', methods=['GET'])
     def get_history():
-        """Get processing history"""
+        """
+        Get processing history, newest first, with keyset pagination:
+        pass pagination.next_cursor back as ?cursor= for the next page.
+        Filters: ?start=&end= (tanggal setor), ?kode_setor=a,b, ?ntpn=; ?total=1 adds a (possibly estimated) total.
+        The old ?page= offset pagination still works for existing clients.
+        """
         try:
-            page = request.args.get('page', 1, type=int)
-            per_page = request.args.get('per_page', 10, type=int)
+            per_page = min(max(request.args.get('per_page', 10, type=int), 1), queries.MAX_PER_PAGE)
+            cursor = request.args.get('cursor')
+            try:
+                filters = queries.parse_filters(request.args)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             
-            records = BuktiSetor.query.order_by(BuktiSetor.created_at.desc()).paginate(
-                page=page, per_page=per_page, error_out=False
-            )
+            if 'page' in request.args and not cursor:
+                page = request.args.get('page', 1, type=int)
+                query = queries.apply_filters(BuktiSetor.query, filters)
+                records = query.order_by(BuktiSetor.created_at.desc(), BuktiSetor.id.desc()).paginate(
+                    page=page, per_page=per_page, error_out=False
+                )
+                return jsonify({
+                    'success': True,
+                    'data': [record.to_dict() for record in records.items],
+                    'pagination': {
+                        'page': page,
+                        'per_page': per_page,
+                        'total': records.total,
+                        'pages': records.pages,
+                        'has_next': records.has_next,
+                        'has_prev': records.has_prev
+                    }
+                }), 200
+            
+            try:
+                records, next_cursor = queries.page_after(filters, cursor=cursor, per_page=per_page)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            pagination = {
+                'per_page': per_page,
+                'next_cursor': next_cursor,
+                'has_next': next_cursor is not None
+            }
+            if request.args.get('total', '').lower() in ('1', 'true', 'yes'):
+                pagination['total'], pagination['total_is_estimate'] = queries.count_total(filters)
             
             return jsonify({
                 'success': True,
-                'data': [record.to_dict() for record in records.items],
+                'data': [record.to_dict() for record in records],
+                'pagination': pagination
+            }), 200
+            
+        except Exception as e:
+            logger.error(f"History retrieval error: {e}")
+            return jsonify({'error': f'Failed to retrieve history: {str(e)}'}), 500
+    
+    @app.route('/api/bukti_setor/search', methods=['GET'])
+    def search_records():
+        """
+        Full-text search over the saved OCR text and fields, best match first
+        (newest first when the words match too many records to rank).
+        ?q= words (prefix match, all required; numbers match with or without separators),
+        same filters as history (?start=&end=&kode_setor=&ntpn=), ?page=&per_page=.
+        """
+        try:
+            q = request.args.get('q', '')
+            page = max(request.args.get('page', 1, type=int), 1)
+            per_page = min(max(request.args.get('per_page', 20, type=int), 1), search.MAX_PER_PAGE)
+            try:
+                filters = queries.parse_filters(request.args)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            if not search.available():
+                return jsonify({'error': 'Full-text search is not available for this database'}), 503
+            
+            try:
+                rows, has_next, ranked = search.search(q, filters, page=page, per_page=per_page)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            data = []
+            for record, rank in rows:
+                item = record.to_dict()
+                item['rank'] = float(rank) if rank is not None else None
+                item['snippet'] = search.snippet(record, q)
+                data.append(item)
+            
+            return jsonify({
+                'success': True,
+                'query': q,
+                'ranked': ranked,
+                'data': data,
                 'pagination': {
                     'page': page,
                     'per_page': per_page,
-                    'total': records.total,
-                    'pages': records.pages,
-                    'has_next': records.has_next,
-                    'has_prev': records.has_prev
+                    'has_next': has_next
                 }
             }), 200
             
         except Exception as e:
-            logger.error(f"History retrieval error: {e}")
-            return jsonify({'error': f'Failed to retrieve history: {str(e)}'}), 500
+            logger.error(f"Search error: {e}")
+            return jsonify({'error': f'Search failed: {str(e)}'}), 500
     
     @app.route('/api/bukti_setor/delete/<int:record_id>', methods=['DELETE'])
     def delete_record(record_id):
         """Delete a record"""
         try:
             record = BuktiSetor.query.get_or_404(record_id)
+            preview_filename = record.preview_filename
+            search.unindex(record)
             db.session.delete(record)
             db.session.commit()
+            processor.previews.unpin(preview_filename)
             
             return jsonify({
                 'success': True,
@@ -209,81 +695,34 @@ def create_app():
             return jsonify({'error': f'Failed to delete record: {str(e)}'}), 500
     
     @app.route('/api/bukti_setor/export', methods=['GET'])
-    def export_to_xlsx():
-        """Export records to XLSX"""
+    def export_data():
+        """
+        Export records to XLSX (default) or CSV, streamed chunk by chunk.
+        Filters: ?start=YYYY-MM-DD&end=YYYY-MM-DD (tanggal setor) and ?kode_setor=a,b
+        """
         try:
-            from openpyxl import Workbook
-            from openpyxl.styles import Font, Alignment
-            
-            # Get all records
-            records = BuktiSetor.query.order_by(BuktiSetor.created_at.desc()).all()
+            fmt = (request.args.get('format') or 'xlsx').lower()
+            if fmt not in export.FORMATS:
+                return jsonify({'error': 'format must be xlsx or csv'}), 400
+            try:
+                filters = queries.parse_filters(request.args)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             
-            if not records:
+            if not export.has_rows(filters):
                 return jsonify({'error': 'No data to export'}), 404
             
-            # Create workbook
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Bukti Setor Data"
-            
-            # Headers
-            headers = [
-                'ID', 'Filename', 'NTPN', 'NPWP', 'Nama Wajib Pajak',
-                'Tanggal Setor', 'Jumlah Setor', 'Kode Akun Pajak',
-                'Kode Jenis Setoran', 'Masa Pajak', 'Tahun Pajak',
-                'OCR Confidence', 'Processing Time', 'Created At'
-            ]
-            
-            # Add headers
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.alignment = Alignment(horizontal='center')
-            
-            # Add data
-            for row, record in enumerate(records, 2):
-                data = record.to_dict()
-                ws.cell(row=row, column=1, value=data['id'])
-                ws.cell(row=row, column=2, value=data['filename'])
-                ws.cell(row=row, column=3, value=data['ntpn'])
-                ws.cell(row=row, column=4, value=data['npwp'])
-                ws.cell(row=row, column=5, value=data['nama_wajib_pajak'])
-                ws.cell(row=row, column=6, value=data['tanggal_setor'])
-                ws.cell(row=row, column=7, value=data['jumlah_setor'])
-                ws.cell(row=row, column=8, value=data['kode_akun_pajak'])
-                ws.cell(row=row, column=9, value=data['kode_jenis_setoran'])
-                ws.cell(row=row, column=10, value=data['masa_pajak'])
-                ws.cell(row=row, column=11, value=data['tahun_pajak'])
-                ws.cell(row=row, column=12, value=data['ocr_confidence'])
-                ws.cell(row=row, column=13, value=data['processing_time'])
-                ws.cell(row=row, column=14, value=data['created_at'])
-            
-            # Auto-adjust column widths
-            for column in ws.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # Save to memory
-            output = BytesIO()
-            wb.save(output)
-            output.seek(0)
-            
-            filename = f"bukti_setor_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            
-            return send_file(
-                output,
-                as_attachment=True,
-                download_name=filename,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
+            rows = export.iter_rows(filters, chunk_size=Config.EXPORT_CHUNK_SIZE)
+            if fmt == 'csv':
+                body = export.stream_csv(rows)
+            else:
+                body = export.stream_xlsx(rows, export.column_widths(filters))
+            
+            response = Response(stream_with_context(body), mimetype=export.MIMETYPES[fmt])
+            response.headers['Content-Disposition'] = f'attachment; filename="{export.export_filename(fmt)}"'
+            response.headers['Cache-Control'] = 'no-store'
+            response.headers['X-Accel-Buffering'] = 'no'
+            return response
             
         except Exception as e:
             logger.error(f"Export error: {e}")
@@ -291,9 +730,34 @@ def create_app():
     
     @app.route('/uploads/<filename>')
     def uploaded_file(filename):
-        """Serve uploaded files"""
+        """
+        Serve previews. Content-addressed previews are immutable (strong ETag,
+        cached forever); ?size=full serves the full-resolution render, rendered from the kept
+        source document on first request (PREVIEW_FULL_SIZE=on_demand).
+        Older flat files in the upload folder are served as before.
+        """
         try:
-            return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+            path = processor.previews.path(filename)
+            if path is None:
+                return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+            
+            # A preview that was just returned may still be encoding in the background
+            processor.previews.wait(filename, timeout=5)
+            immutable = True
+            if request.args.get('size') == 'full':
+                full_path = processor.previews.full(filename)
+                if full_path:
+                    filename, path = os.path.basename(full_path), full_path
+                else:
+                    # Thumbnail stand-in must not be cached as the full-size image
+                    immutable = False
+            if not os.path.exists(path):
+                return jsonify({'error': 'File not found'}), 404
+            
+            processor.previews.touch(filename)
+            response = send_file(path, etag=processor.previews.etag(filename), max_age=PREVIEW_MAX_AGE, conditional=True)
+            response.headers['Cache-Control'] = PREVIEW_CACHE_CONTROL if immutable else 'no-cache'
+            return response
         except Exception as e:
             logger.error(f"File serving error: {e}")
             return jsonify({'error': 'File not found'}), 404
@@ -301,7 +765,8 @@ def create_app():
     return app
 
 # Create app instance
-app = create_app()
+with startup_phase('app'):
+    app = create_app()
 
 if __name__ == "__main__":
     # Production configuration
@@ -313,6 +778,9 @@ if __name__ == "__main__":
     logger.info(f"   Memory optimization: enabled")
     logger.info(f"   Database: {'enabled' if db else 'disabled'}")
     
+    # Snapshot metrics dari run sebelumnya tidak ikut dijumlahkan
+    registry.reset()
+    
     # Ensure upload folder exists
     upload_folder = app.config.get('UPLOAD_FOLDER', 'uploads')
     os.makedirs(upload_folder, exist_ok=True)
@@ -325,6 +793,8 @@ if __name__ == "__main__":
     except Exception as e:
         logger.error(f"❌ Database initialization error: {e}")
     
+    app.extensions['easyocr_worker'].get()
+    
     try:
         # Production mode - no debug
         app.run(host="0.0.0.0", port=port, debug=False)
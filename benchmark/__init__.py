@@ -0,0 +1,11 @@
+# benchmark/__init__.py
+# Benchmark pipeline OCR bukti setor dengan dokumen sintetis (ground truth diketahui)
+
+from .generator import random_fields, render_receipt, generate_dataset, load_manifest
+
+__all__ = [
+    "random_fields",
+    "render_receipt",
+    "generate_dataset",
+    "load_manifest"
+]
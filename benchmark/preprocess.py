@@ -0,0 +1,115 @@
+# benchmark/preprocess.py - Benchmark stage preprocessing vs implementasi lama
+# -*- coding: utf-8 -*-
+#
+# Membandingkan preprocess_for_ocr versi lama (PIL -> BGR -> resize 3 channel
+# -> gray -> adaptive -> MORPH_CLOSE 1x1 -> gc.collect) dengan PreprocessPipeline,
+# per stage dan end-to-end, pada bukti setor sintetis.
+#
+#   python -m benchmark.preprocess --count 6 --repeat 20 --output bench-preprocess.json
+
+import gc
+import json
+import random
+import argparse
+import tracemalloc
+import cv2
+import numpy as np
+
+from bukti_setor.preprocess import (
+    PreprocessPipeline, STAGES, THRESHOLD_STAGES, estimate_text_height, normalize_resolution, to_gray
+)
+from benchmark.generator import random_fields, render_receipt
+from benchmark.run import _timeit, stats
+
+# Batas ukuran tetap implementasi lama (sebelum resolusi adaptif)
+MAX_IMAGE_SIZE = (1920, 1080)
+
+def legacy_preprocess(image):
+    """Salinan preprocess_for_ocr sebelum engine preprocessing (sebagai baseline)"""
+    img = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    height, width = img.shape[:2]
+    if width > MAX_IMAGE_SIZE[0] or height > MAX_IMAGE_SIZE[1]:
+        scale = min(MAX_IMAGE_SIZE[0] / width, MAX_IMAGE_SIZE[1] / height)
+        img = cv2.resize(img, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+    thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, np.ones((1, 1), np.uint8))
+    del gray
+    gc.collect()
+    return thresh
+
+def _peak_alloc_kb(fn):
+    """Puncak alokasi (KB) satu panggilan, diukur dengan tracemalloc"""
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing stages against the legacy function")
+    parser.add_argument("--count", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=8.0)
+    parser.add_argument("--skew", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench-preprocess.json")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    pages = [
+        render_receipt(random_fields(rng), dpi=args.dpi, noise=args.noise,
+                       skew=rng.uniform(-args.skew, args.skew), template=i % 2, seed=args.seed + i)
+        for i in range(args.count)
+    ]
+
+    buffers = {}
+    durations = {"legacy": [], "to_gray": [], "estimate_text_height": [], "normalize_resolution": []}
+    names = ("adaptive", "deskew,adaptive", "otsu", "deskew,denoise,otsu")
+    durations.update({f"pipeline[{name}]": [] for name in names})
+    durations.update({name: [] for name in STAGES})
+    pipelines = {name: PreprocessPipeline(name) for name in names}
+
+    for page in pages:
+        durations["legacy"] += _timeit(lambda: legacy_preprocess(page), args.repeat)[1]
+        gray, took = _timeit(lambda: to_gray(page, buffers), args.repeat)
+        durations["to_gray"] += took
+        durations["estimate_text_height"] += _timeit(lambda: estimate_text_height(gray), args.repeat)[1]
+        gray, took = _timeit(lambda: normalize_resolution(gray, buffers), args.repeat)
+        durations["normalize_resolution"] += took
+        gray = gray.copy()
+        for name, stage in STAGES.items():
+            durations[name] += _timeit(lambda: stage(gray, buffers, {}), args.repeat)[1]
+        for name, pipeline in pipelines.items():
+            durations[f"pipeline[{name}]"] += _timeit(lambda: pipeline.run(page, buffers), args.repeat)[1]
+
+    page = pages[0]
+    warm = {}
+    pipelines["adaptive"].run(page, warm)
+    report = {
+        "pages": args.count,
+        "page_size": list(page.size),
+        "repeat": args.repeat,
+        "stages": {name: stats(values) for name, values in durations.items()},
+        "peak_alloc_kb": {
+            "legacy": _peak_alloc_kb(lambda: legacy_preprocess(page)),
+            "pipeline[adaptive]": _peak_alloc_kb(lambda: pipelines["adaptive"].run(page, warm)),
+        },
+        "threshold_stages": list(THRESHOLD_STAGES),
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    legacy = report["stages"]["legacy"]["p50_ms"]
+    print(f"{'stage':<30}{'p50 ms':>10}{'p95 ms':>10}{'vs legacy':>12}")
+    for name, row in report["stages"].items():
+        print(f"{name:<30}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p50_ms'] / legacy:>11.2f}x")
+    print(f"peak alloc KB: {report['peak_alloc_kb']}")
+    print(f"✅ Laporan ditulis ke {args.output}")
+    return report
+
+if __name__ == "__main__":
+    main()
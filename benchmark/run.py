@@ -0,0 +1,282 @@
+# benchmark/run.py - Benchmark per stage dan end-to-end pipeline OCR
+# -*- coding: utf-8 -*-
+#
+# Mengukur preprocess_for_ocr, OCR, setiap extractor, preview (hash di jalur
+# request vs encode yang dikerjakan thread background) dan
+# BuktiSetorProcessor.process_file pada dataset sintetis, lalu menulis laporan
+# JSON (throughput, p50/p95, peak RSS, akurasi per field) yang bisa dibandingkan
+# antar run dengan --compare.
+#
+#   python -m benchmark.run --count 12 --output bench-report.json
+#   python -m benchmark.run --data bench_data --compare bench-baseline.json
+
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import argparse
+import tempfile
+import itertools
+import contextlib
+from datetime import datetime
+import numpy as np
+from PIL import Image
+
+from bukti_setor.cache import hash_file
+from bukti_setor.processor import BuktiSetorProcessor, preprocess_for_ocr
+from bukti_setor.pages import iter_pdf_pages
+from bukti_setor.preview import PreviewStore
+from bukti_setor.extractors import (
+    extract_kode_setor, extract_tanggal_setor, extract_jumlah_setor, extract_ntpn, extract_fields
+)
+from benchmark.generator import generate_dataset, load_manifest, FORMATS
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+FIELDS = ("kode_setor", "tanggal", "jumlah", "ntpn")
+
+def stats(durations):
+    """Ringkasan durasi (detik) dalam ms"""
+    if not durations:
+        return {"n": 0}
+    ms = np.asarray(durations) * 1000
+    return {
+        "n": len(durations),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "max_ms": round(float(ms.max()), 3),
+        "throughput_per_s": round(1000 / float(ms.mean()), 3) if ms.mean() > 0 else None,
+    }
+
+def peak_rss_mb():
+    """Peak RSS proses ini dan proses anak (tesseract/pdftoppm), dalam MB"""
+    if resource is None:
+        return {"self": None, "children": None}
+    # ru_maxrss dalam KB di Linux, byte di macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+def _timeit(fn, repeat):
+    durations = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        durations.append(time.perf_counter() - start)
+    return result, durations
+
+def _load_first_page(path, processor):
+    if path.lower().endswith(".pdf"):
+        for page in iter_pdf_pages(path, dpi=processor.pdf_dpi, max_pages=1, poppler_path=processor.poppler_path,
+                                   **processor._pdf_resolution()):
+            if isinstance(page, Exception):
+                raise page
+            return page
+    with Image.open(path) as img:
+        return img.copy()
+
+def _field_correct(field, expected, actual):
+    if field == "jumlah":
+        try:
+            return abs(float(actual) - float(expected)) < 0.5
+        except (TypeError, ValueError):
+            return False
+    return str(actual) == str(expected)
+
+def bench_stages(processor, data_dir, samples, repeat, preview_folder):
+    """Durasi per stage, dihitung pada halaman pertama setiap sampel"""
+    durations = {name: [] for name in (
+        "load", "preprocess_for_ocr", "ocr", "extract_kode_setor", "extract_tanggal_setor",
+        "extract_jumlah_setor", "extract_ntpn", "extract_fields", "preview_submit", "preview_encode"
+    )}
+    buffers = {}
+    # Encode sinkron dengan setting preview processor; nomor halaman berbeda per
+    # ulangan agar setiap panggilan benar-benar meng-encode (bukan hit nama yang sama)
+    previews = processor.previews
+    encoder = PreviewStore(
+        preview_folder, fmt=previews.format, max_size=previews.max_size, quality=previews.quality,
+        full_size=previews.full_size, workers=0
+    )
+    page_nums = itertools.count(1)
+
+    for sample in samples:
+        path = os.path.join(data_dir, sample["file"])
+        image, took = _timeit(lambda: _load_first_page(path, processor), 1)
+        durations["load"] += took
+
+        thresh, took = _timeit(lambda: preprocess_for_ocr(image, buffers), repeat)
+        durations["preprocess_for_ocr"] += took
+
+        raw_text, took = _timeit(lambda: processor.ocr.image_to_string(thresh), repeat)
+        durations["ocr"] += took
+
+        for name, extractor in (
+            ("extract_kode_setor", extract_kode_setor),
+            ("extract_tanggal_setor", extract_tanggal_setor),
+            ("extract_jumlah_setor", extract_jumlah_setor),
+            ("extract_ntpn", extract_ntpn),
+            ("extract_fields", extract_fields),
+        ):
+            _, took = _timeit(lambda: extractor(raw_text), repeat)
+            durations[name] += took
+
+        # Processor memberi nama preview dari hash upload yang sudah dihitung untuk cache
+        source = hash_file(path)
+        _, took = _timeit(lambda: processor.previews.submit(image, 1, sample["file"], source=source), repeat)
+        durations["preview_submit"] += took
+        processor.previews.flush()
+
+        _, took = _timeit(lambda: encoder.submit(image, next(page_nums), sample["file"], source=source), repeat)
+        durations["preview_encode"] += took
+
+    encoder.close()
+    return {name: stats(values) for name, values in durations.items()}
+
+def bench_process_file(processor, data_dir, samples, repeat):
+    """Latency end-to-end process_file dan akurasi per field terhadap ground truth"""
+    durations = []
+    pages = 0
+    benar = {field: 0 for field in FIELDS}
+    semua_benar = 0
+    gagal = []
+
+    started = time.perf_counter()
+    for sample in samples:
+        path = os.path.join(data_dir, sample["file"])
+        result, took = _timeit(lambda: processor.process_file(path), repeat)
+        durations += took
+
+        halaman = result.get("data") or []
+        if not result.get("success") or not halaman:
+            gagal.append(sample["file"])
+            continue
+        pages += len(halaman) * repeat
+
+        hasil = halaman[0]
+        cocok = [field for field in FIELDS if _field_correct(field, sample["truth"][field], hasil.get(field))]
+        for field in cocok:
+            benar[field] += 1
+        if len(cocok) == len(FIELDS):
+            semua_benar += 1
+    elapsed = time.perf_counter() - started
+
+    total = len(samples) or 1
+    accuracy = {field: round(benar[field] / total, 4) for field in FIELDS}
+    accuracy["all_fields"] = round(semua_benar / total, 4)
+    report = stats(durations)
+    report["pages_per_s"] = round(pages / elapsed, 3) if elapsed > 0 else None
+    report["failed_files"] = gagal
+    return report, accuracy
+
+def compare(report, baseline):
+    """Cetak perubahan p50/p95 dan akurasi terhadap laporan sebelumnya"""
+    print(f"\n{'stage':<24}{'p50 ms':>12}{'Δ%':>9}{'p95 ms':>12}{'Δ%':>9}")
+    rows = dict(report["stages"])
+    rows["process_file"] = report["process_file"]
+    base_rows = dict(baseline.get("stages", {}))
+    base_rows["process_file"] = baseline.get("process_file", {})
+    for name, row in rows.items():
+        base = base_rows.get(name, {})
+        cols = []
+        for key in ("p50_ms", "p95_ms"):
+            now, before = row.get(key), base.get(key)
+            delta = f"{(now - before) / before * 100:+.1f}" if now is not None and before else "-"
+            cols.append((now if now is not None else "-", delta))
+        print(f"{name:<24}{cols[0][0]:>12}{cols[0][1]:>9}{cols[1][0]:>12}{cols[1][1]:>9}")
+
+    print(f"\n{'accuracy':<24}{'now':>12}{'before':>12}")
+    for field, value in report["accuracy"].items():
+        print(f"{field:<24}{value:>12}{baseline.get('accuracy', {}).get(field, '-'):>12}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the bukti setor OCR pipeline")
+    parser.add_argument("--data", help="Existing dataset folder (with manifest.json); generated if omitted")
+    parser.add_argument("--count", type=int, default=12, help="Samples to generate")
+    parser.add_argument("--formats", default="png,jpg,pdf")
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=8.0)
+    parser.add_argument("--skew", type=float, default=1.5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions per sample")
+    parser.add_argument("--ocr-backend", default=None, help="auto, tesserocr or pytesseract")
+    parser.add_argument("--page-workers", type=int, default=None)
+    parser.add_argument("--output", default="bench-report.json")
+    parser.add_argument("--compare", help="Previous report to compare against")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix="bench_") as workdir:
+        data_dir = args.data
+        if data_dir:
+            manifest = load_manifest(data_dir)
+        else:
+            data_dir = os.path.join(workdir, "data")
+            formats = tuple(fmt.strip() for fmt in args.formats.split(",") if fmt.strip() in FORMATS)
+            manifest = generate_dataset(
+                data_dir, count=args.count, formats=formats or FORMATS,
+                dpi=args.dpi, noise=args.noise, skew=args.skew, seed=args.seed
+            )
+        samples = manifest["samples"]
+
+        processor = BuktiSetorProcessor(
+            upload_folder=os.path.join(workdir, "uploads"), cache=False,
+            ocr_backend=args.ocr_backend, page_workers=args.page_workers
+        )
+        processor.ocr.warm_up()
+
+        print(f"⏱️ Benchmark {len(samples)} sampel x {args.repeat} ulangan (ocr: {processor.ocr.name})")
+        # Extractor mencetak log per panggilan, jangan ikut diukur di terminal
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            stage_report = bench_stages(
+                processor, data_dir, samples, args.repeat, os.path.join(workdir, "preview")
+            )
+            process_report, accuracy = bench_process_file(processor, data_dir, samples, args.repeat)
+        processor.close()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "ocr_backend": processor.ocr.name,
+            "tesseract_config": processor.tesseract_config,
+            "page_workers": processor.page_workers,
+            "repeat": args.repeat,
+        },
+        "dataset": {
+            "source": args.data or "generated",
+            "samples": len(samples),
+            "seed": manifest.get("seed"),
+            "formats": sorted({sample["format"] for sample in samples}),
+        },
+        "stages": stage_report,
+        "process_file": process_report,
+        "accuracy": accuracy,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Laporan ditulis ke {args.output}")
+    print(f"   process_file p50={process_report.get('p50_ms')}ms p95={process_report.get('p95_ms')}ms "
+          f"akurasi={accuracy['all_fields']:.0%} peak RSS={report['peak_rss_mb']['self']}MB")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+# bukti_setor/admission.py - Admission control berdasarkan budget memori OCR
+# -*- coding: utf-8 -*-
+#
+# Setiap request OCR diperkirakan biaya memorinya (ukuran file + halaman yang
+# diproses bersamaan x piksel render x byte per piksel) sebelum diproses. Biaya
+# dicatat di tabel SQLite di UPLOAD_FOLDER yang dipakai bersama semua worker
+# gunicorn, sehingga total memori OCR di seluruh container dibatasi satu budget.
+# Request yang tidak muat menunggu sebentar (antri), lalu ditolak dengan
+# OverBudget -> HTTP 503 + Retry-After. Request yang sendirian selalu diterima
+# walaupun lebih besar dari budget, agar file besar tetap bisa diproses.
+# Tiket hanya dihapus tanpa release() jika prosesnya sudah mati, jadi OCR/job
+# yang berjalan lama tetap memegang budget-nya sampai selesai.
+
+import os
+import time
+import logging
+import sqlite3
+import threading
+from bukti_setor.metrics import registry
+from bukti_setor.runtime import process_owner
+
+logger = logging.getLogger(__name__)
+
+# Byte per piksel halaman yang sedang diproses: render RGB (3) + grayscale,
+# biner dan buffer rotasi/preview
+BYTES_PER_PIXEL = 6
+# Ukuran halaman PDF jika pdfinfo tidak tersedia (A4, point)
+DEFAULT_PAGE_POINTS = (595.0, 842.0)
+POLL_INTERVAL = 0.1
+MAX_POLL_INTERVAL = 1.0
+
+class OverBudget(Exception):
+    """Budget memori penuh; client diminta mencoba lagi setelah retry_after detik"""
+
+    def __init__(self, retry_after):
+        super().__init__("Server sedang sibuk, coba lagi nanti")
+        self.retry_after = retry_after
+
+def estimate_cost(file_size, pages, page_pixels, in_flight):
+    """Perkiraan memori puncak (byte) satu dokumen: file + halaman yang diproses bersamaan"""
+    pages = max(1, pages or 1)
+    return int(file_size + min(pages, in_flight) * page_pixels * BYTES_PER_PIXEL)
+
+def pdf_page_pixels(page_points, dpi, max_pixels=None):
+    """Jumlah piksel satu halaman PDF (ukuran dalam point) bila di-render pada ``dpi``"""
+    width, height = page_points or DEFAULT_PAGE_POINTS
+    pixels = (width / 72 * dpi) * (height / 72 * dpi)
+    return min(pixels, max_pixels) if max_pixels else pixels
+
+class Ticket:
+    """Bagian budget yang sedang dipakai satu request; lepas dengan release() / with"""
+
+    def __init__(self, controller, ticket_id, cost):
+        self.controller = controller
+        self.ticket_id = ticket_id
+        self.cost = cost
+
+    def release(self):
+        if self.ticket_id is not None:
+            self.controller.release(self.ticket_id)
+            self.ticket_id = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class AdmissionController:
+    """Budget memori OCR bersama semua worker (buku besar di SQLite)"""
+
+    def __init__(self, db_path, max_bytes, max_wait=10.0, retry_after=5):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self._local = threading.local()
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+        if self.enabled:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+                conn = self._conn()
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS admission ("
+                    "id INTEGER PRIMARY KEY AUTOINCREMENT, pid INTEGER NOT NULL, "
+                    "cost INTEGER NOT NULL, admitted_at REAL NOT NULL, owner TEXT)"
+                )
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(admission)")}
+                if "owner" not in columns:
+                    conn.execute("ALTER TABLE admission ADD COLUMN owner TEXT")
+                conn.commit()
+            except Exception as e:
+                logger.warning(f"⚠️ Admission control dimatikan, database tidak tersedia: {e}")
+                self.db_path = None
+
+    @property
+    def enabled(self):
+        return bool(self.db_path) and self.max_bytes > 0
+
+    def _conn(self):
+        """Koneksi SQLite per thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def try_admit(self, cost):
+        """Catat biaya jika masih muat di budget; return id tiket atau None"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._drop_dead_workers(conn)
+            in_use, active = conn.execute("SELECT COALESCE(SUM(cost), 0), COUNT(*) FROM admission").fetchone()
+            if active and in_use + cost > self.max_bytes:
+                conn.execute("COMMIT")
+                return None
+            ticket_id = conn.execute(
+                "INSERT INTO admission (pid, cost, admitted_at, owner) VALUES (?, ?, ?, ?)",
+                (os.getpid(), int(cost), time.time(), process_owner())
+            ).lastrowid
+            conn.execute("COMMIT")
+            return ticket_id
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def admit(self, cost, timeout=-1):
+        """
+        Tunggu sampai biaya muat di budget lalu kembalikan Ticket.
+        ``timeout`` detik (default max_wait, None = tunggu terus); lewat dari itu raise OverBudget.
+        """
+        if not self.enabled:
+            return Ticket(self, None, cost)
+        if timeout == -1:
+            timeout = self.max_wait
+
+        ticket = self._try_ticket(cost)
+        if ticket is not None:
+            return ticket
+
+        registry.inc("easyocr_admission_events_total", result="queued")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        interval = POLL_INTERVAL
+        with self._lock:
+            self._waiting += 1
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                sleep = interval if deadline is None else min(interval, max(0.0, deadline - time.monotonic()))
+                time.sleep(sleep)
+                interval = min(interval * 2, MAX_POLL_INTERVAL)
+                ticket = self._try_ticket(cost)
+                if ticket is not None:
+                    return ticket
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        registry.inc("easyocr_admission_events_total", result="rejected")
+        logger.warning(f"⏳ Request ditolak: budget memori OCR penuh (biaya {cost / 1e6:.0f} MB)")
+        raise OverBudget(self.retry_after)
+
+    def _try_ticket(self, cost):
+        """Ticket jika diterima, None jika budget penuh"""
+        try:
+            ticket_id = self.try_admit(cost)
+        except Exception as e:
+            # Buku besar bermasalah: jangan sampai OCR ikut berhenti
+            logger.warning(f"⚠️ Admission control error, request diterima tanpa budget: {e}")
+            return Ticket(self, None, cost)
+        if ticket_id is None:
+            return None
+        registry.inc("easyocr_admission_events_total", result="admitted")
+        return Ticket(self, ticket_id, cost)
+
+    def release(self, ticket_id):
+        """Kembalikan biaya tiket ke budget"""
+        try:
+            self._conn().execute("DELETE FROM admission WHERE id = ?", (ticket_id,))
+        except Exception as e:
+            logger.warning(f"⚠️ Admission release error: {e}")
+
+    def _drop_dead_workers(self, conn):
+        """
+        Hapus tiket milik worker yang sudah mati (crash / di-restart gunicorn).
+        Tiket dengan pid proses ini tetapi token lain berasal dari proses lama
+        yang pid-nya dipakai ulang, jadi juga sudah mati.
+        """
+        own_pid = os.getpid()
+        conn.execute("DELETE FROM admission WHERE pid = ? AND owner IS NOT ?", (own_pid, process_owner()))
+        for (pid,) in conn.execute("SELECT DISTINCT pid FROM admission WHERE pid != ?", (own_pid,)).fetchall():
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                conn.execute("DELETE FROM admission WHERE pid = ?", (pid,))
+            except PermissionError:
+                pass
+
+    def usage(self):
+        """Pemakaian budget saat ini (semua worker) untuk monitoring"""
+        stats = {
+            "enabled": self.enabled,
+            "budget_bytes": self.max_bytes,
+            "in_use_bytes": 0,
+            "active": 0,
+            "waiting": self._waiting,
+        }
+        if self.enabled:
+            try:
+                in_use, active = self._conn().execute(
+                    "SELECT COALESCE(SUM(cost), 0), COUNT(*) FROM admission"
+                ).fetchone()
+                stats["in_use_bytes"] = in_use
+                stats["active"] = active
+            except Exception as e:
+                logger.warning(f"⚠️ Admission stats error: {e}")
+        return stats
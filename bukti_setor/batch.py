@@ -0,0 +1,123 @@
+# bukti_setor/batch.py - Proses banyak bukti setor dalam satu request
+# -*- coding: utf-8 -*-
+#
+# Sumber file: daftar upload multipart atau satu arsip ZIP. Anggota ZIP dibaca
+# satu per satu langsung dari arsip (tidak diekstrak ke disk), lalu dibagi ke
+# pool thread. Jumlah file yang sudah dibaca tapi belum selesai diproses
+# dibatasi agar memori tetap konstan. Batch sinkron harus selesai dalam timeout
+# gunicorn, jadi hanya untuk batch kecil; batch besar diantrikan sebagai job
+# per file (JobManager.submit_batch di jobs.py).
+
+import os
+import logging
+import threading
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from bukti_setor.admission import OverBudget
+from utils.file_utils import allowed_file
+
+logger = logging.getLogger(__name__)
+
+# Rasio kompresi maksimum anggota ZIP (perlindungan zip bomb)
+MAX_ZIP_RATIO = 100
+
+def iter_zip_members(zf, max_file_size):
+    """
+    Iterasi anggota ZIP sebagai (nama, bytes) atau (nama, pesan_error).
+    Direktori dan file metadata macOS dilewati.
+    """
+    for info in zf.infolist():
+        name = info.filename
+        base = os.path.basename(name)
+        if info.is_dir() or not base or name.startswith("__MACOSX/") or base.startswith("."):
+            continue
+        if not allowed_file(base):
+            yield name, ValueError("Format file tidak didukung")
+            continue
+        if info.file_size > max_file_size:
+            yield name, ValueError("File terlalu besar")
+            continue
+        if info.compress_size and info.file_size / info.compress_size > MAX_ZIP_RATIO:
+            yield name, ValueError("Rasio kompresi tidak wajar")
+            continue
+        try:
+            yield name, zf.read(info)
+        except Exception as e:
+            yield name, e
+
+def iter_uploads(files, max_file_size):
+    """Iterasi FileStorage multipart sebagai (nama, bytes) atau (nama, pesan_error)"""
+    for file in files:
+        name = file.filename or ""
+        if not name:
+            continue
+        if not allowed_file(name):
+            yield name, ValueError("Format file tidak didukung")
+            continue
+        data = file.stream.read(max_file_size + 1)
+        if len(data) > max_file_size:
+            yield name, ValueError("File terlalu besar")
+            continue
+        yield name, data
+
+def open_zip(fileobj):
+    """Buka arsip ZIP dari file object yang bisa di-seek (file sementara/spooled)"""
+    return zipfile.ZipFile(fileobj)
+
+def process_batch(processor, items, max_workers=None, admission=None):
+    """
+    Jalankan OCR untuk setiap (nama, bytes|Exception) secara paralel.
+    Hasil per file dikembalikan dengan urutan yang sama dengan input.
+    Dengan ``admission`` setiap file yang belum ada di cache menunggu budget
+    memori OCR; yang tidak kebagian budget dalam batas waktu gagal dengan
+    pesan server sibuk.
+    """
+    max_workers = max_workers or processor.page_workers
+    slot = threading.BoundedSemaphore(max_workers * 2)
+    futures = []
+
+    def run(name, data):
+        try:
+            filename = os.path.basename(name)
+            doc = processor.prepare(data=data, filename=filename)
+            with processor.admit(doc, admission):
+                result = processor.process(doc)
+        except OverBudget as e:
+            result = {"success": False, "error": str(e)}
+        except Exception as e:
+            logger.error(f"❌ Batch error {name}: {e}")
+            result = {"success": False, "error": str(e)}
+        finally:
+            slot.release()
+        return file_result(name, result)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr-batch") as executor:
+        for name, data in items:
+            if isinstance(data, Exception):
+                futures.append(_done(file_result(name, {"success": False, "error": str(data)})))
+                continue
+            slot.acquire()
+            futures.append(executor.submit(run, name, data))
+            del data
+
+        return [future.result() for future in futures]
+
+def file_result(name, result):
+    """Hasil satu file batch dari hasil process_bytes/process_file"""
+    item = {"filename": name, "success": bool(result.get("success"))}
+    if item["success"]:
+        item["data"] = result.get("data", [])
+        item["total_halaman"] = result.get("total_halaman", 0)
+        if result.get("cached"):
+            item["cached"] = True
+        if "timings" in result:
+            item["timings"] = result["timings"]
+    else:
+        item["error"] = result.get("error", "Processing failed")
+    return item
+
+def _done(value):
+    """Future yang sudah selesai, untuk file yang langsung gagal validasi"""
+    future = Future()
+    future.set_result(value)
+    return future
@@ -0,0 +1,244 @@
+# bukti_setor/cache.py - Cache hasil OCR berdasarkan hash isi file
+# -*- coding: utf-8 -*-
+#
+# Key = sha256(versi pipeline + config Tesseract + isi file), sehingga file
+# yang di-upload ulang (retry, double click, export ulang) tidak di-OCR lagi.
+# Tier 1: LRU di memori dengan batas ukuran (byte).
+# Tier 2 (opsional): SQLite di UPLOAD_FOLDER, dipakai bersama semua worker gunicorn.
+# Tier disk dibatasi total ukuran dan umur: baris yang paling lama tidak dipakai
+# dihapus lebih dulu (halaman SQLite yang kosong dipakai ulang, file tidak terus membesar).
+
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from bukti_setor.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Eviction tier disk paling sering sekali per interval ini (detik) per worker
+EVICT_INTERVAL = 60
+EVICT_LOW_WATERMARK = 0.9
+
+def hash_bytes(data, salt=""):
+    """Hash isi file di memori"""
+    h = hashlib.sha256(salt.encode("utf-8"))
+    h.update(data)
+    return h.hexdigest()
+
+def hash_file(filepath, salt=""):
+    """Hash isi file di disk per chunk (tanpa membaca semuanya ke memori)"""
+    h = hashlib.sha256(salt.encode("utf-8"))
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class ResultCache:
+    """Cache dua tingkat (memori LRU + SQLite opsional) untuk hasil OCR per file"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, db_path=None, disk_max_bytes=256 * 1024 * 1024,
+                 disk_max_age_days=30):
+        self.max_bytes = max_bytes
+        self.db_path = db_path
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_max_age = disk_max_age_days * 86400 if disk_max_age_days else None
+        self._last_evict = 0.0
+        self._entries = OrderedDict()  # key -> (json_str, size)
+        self._size = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats_counter = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "disk_evictions": 0,
+            "stores": 0,
+        }
+
+        if self.db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+                conn = self._conn()
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS ocr_cache ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, "
+                    "size INTEGER NOT NULL DEFAULT 0, last_access REAL NOT NULL DEFAULT 0)"
+                )
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(ocr_cache)")}
+                if "size" not in columns:
+                    # Tabel dari versi sebelumnya: tambah kolom ukuran & akses terakhir
+                    conn.execute("ALTER TABLE ocr_cache ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                    conn.execute("ALTER TABLE ocr_cache ADD COLUMN last_access REAL NOT NULL DEFAULT 0")
+                    conn.execute("UPDATE ocr_cache SET size = length(value), last_access = created_at")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_cache_last_access ON ocr_cache (last_access)")
+                conn.commit()
+            except Exception as e:
+                logger.warning(f"⚠️ Cache disk tidak tersedia, hanya memakai memori: {e}")
+                self.db_path = None
+
+    def _conn(self):
+        """Koneksi SQLite per thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name):
+        with self._lock:
+            self.stats_counter[name] += 1
+        registry.inc("easyocr_cache_events_total", event=name)
+
+    def get(self, key):
+        """Ambil hasil dari cache, atau None jika tidak ada"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats_counter["hits"] += 1
+                value = entry[0]
+            else:
+                value = None
+        if value is not None:
+            registry.inc("easyocr_cache_events_total", event="hits")
+            return json.loads(value)
+
+        if self.db_path:
+            try:
+                row = self._conn().execute(
+                    "SELECT value FROM ocr_cache WHERE key = ?", (key,)
+                ).fetchone()
+            except Exception as e:
+                logger.warning(f"⚠️ Cache disk read error: {e}")
+                row = None
+            if row:
+                self._remember(key, row[0])
+                self._count("disk_hits")
+                self._touch(key)
+                return json.loads(row[0])
+
+        self._count("misses")
+        return None
+
+    def put(self, key, result):
+        """Simpan hasil OCR (dict yang bisa di-JSON-kan)"""
+        value = json.dumps(result, ensure_ascii=False, default=str)
+        self._remember(key, value)
+        self._count("stores")
+
+        if self.db_path:
+            try:
+                conn = self._conn()
+                now = time.time()
+                conn.execute(
+                    "INSERT OR REPLACE INTO ocr_cache (key, value, created_at, size, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, value, now, len(value), now)
+                )
+                conn.commit()
+            except Exception as e:
+                logger.warning(f"⚠️ Cache disk write error: {e}")
+            self._maybe_evict()
+
+    def _touch(self, key):
+        try:
+            conn = self._conn()
+            conn.execute("UPDATE ocr_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+        except Exception as e:
+            logger.debug(f"Cache disk touch error: {e}")
+
+    def evict(self):
+        """
+        Hapus baris tier disk yang tidak dipakai lebih lama dari disk_max_age,
+        lalu yang paling lama tidak dipakai sampai total ukuran di bawah 90%
+        disk_max_bytes. Hasil: jumlah baris yang dihapus.
+        """
+        if not self.db_path:
+            return 0
+        conn = self._conn()
+        dihapus = 0
+        if self.disk_max_age:
+            dihapus += conn.execute(
+                "DELETE FROM ocr_cache WHERE last_access < ?", (time.time() - self.disk_max_age,)
+            ).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+        if self.disk_max_bytes and total > self.disk_max_bytes:
+            target = self.disk_max_bytes * EVICT_LOW_WATERMARK
+            keys = []
+            for key, size in conn.execute("SELECT key, size FROM ocr_cache ORDER BY last_access"):
+                if total <= target:
+                    break
+                keys.append((key,))
+                total -= size
+            dihapus += conn.executemany("DELETE FROM ocr_cache WHERE key = ?", keys).rowcount
+        conn.commit()
+        if dihapus:
+            with self._lock:
+                self.stats_counter["disk_evictions"] += dihapus
+            registry.inc("easyocr_cache_events_total", dihapus, event="disk_evictions")
+            logger.info(f"🧹 {dihapus} hasil OCR lama dihapus dari cache disk")
+        return dihapus
+
+    def _maybe_evict(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_evict < EVICT_INTERVAL:
+                return
+            self._last_evict = now
+        try:
+            self.evict()
+        except Exception as e:
+            logger.warning(f"⚠️ Eviction cache disk gagal: {e}")
+
+    def _remember(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        evicted = 0
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > self.max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.stats_counter["evictions"] += 1
+                evicted += 1
+        if evicted:
+            registry.inc("easyocr_cache_events_total", evicted, event="evictions")
+
+    def clear(self):
+        """Kosongkan tier memori (tier disk tidak disentuh)"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        """Counter hit/miss/eviction dan ukuran cache saat ini"""
+        with self._lock:
+            stats = dict(self.stats_counter)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._size
+            stats["max_bytes"] = self.max_bytes
+        stats["disk_enabled"] = bool(self.db_path)
+        if self.db_path:
+            stats["disk_max_bytes"] = self.disk_max_bytes
+            try:
+                stats["disk_entries"], stats["disk_bytes"] = self._conn().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_cache"
+                ).fetchone()
+            except Exception:
+                stats["disk_entries"] = stats["disk_bytes"] = None
+        return stats
@@ -0,0 +1,128 @@
+# bukti_setor/export.py - Export data bukti setor (XLSX/CSV) secara streaming
+# -*- coding: utf-8 -*-
+#
+# Baris dibaca dari database per chunk (yield_per, server-side cursor di
+# PostgreSQL) dan langsung ditulis, tidak pernah dikumpulkan dalam satu list.
+# CSV di-stream per blok teks. XLSX ditulis dengan workbook write-only openpyxl
+# ke file sementara lalu di-stream per blok; lebar kolom dihitung dari panjang
+# maksimum di database karena write-only mode butuh lebar sebelum baris pertama.
+
+import io
+import csv
+import tempfile
+from datetime import datetime
+from sqlalchemy import func
+from models import db, BuktiSetor
+from bukti_setor.queries import apply_filters
+
+# (header, kolom, lebar tetap; None = dihitung dari data)
+COLUMNS = (
+    ("ID", "id", 8),
+    ("Kode Setor", "kode_setor", None),
+    ("Tanggal", "tanggal", 12),
+    ("Jumlah", "jumlah", 18),
+    ("NTPN", "ntpn", None),
+    ("Preview", "preview_filename", None),
+    ("Created At", "created_at", 20),
+)
+
+FORMATS = ("xlsx", "csv")
+MIMETYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+}
+
+MAX_COLUMN_WIDTH = 50
+STREAM_BLOCK = 64 * 1024
+
+def has_rows(filters):
+    """True jika ada minimal satu baris yang cocok dengan filter"""
+    query = apply_filters(db.session.query(BuktiSetor.id), filters)
+    return db.session.query(query.exists()).scalar()
+
+def iter_rows(filters, chunk_size=1000):
+    """Iterasi baris (tuple sesuai COLUMNS) per chunk, terbaru dulu"""
+    query = db.session.query(*[getattr(BuktiSetor, attr) for _, attr, _ in COLUMNS])
+    query = apply_filters(query, filters)
+    query = query.order_by(BuktiSetor.created_at.desc(), BuktiSetor.id.desc())
+    for row in query.yield_per(chunk_size):
+        yield tuple(row)
+
+def column_widths(filters):
+    """Lebar kolom XLSX: tetap untuk angka/tanggal, max(length) di database untuk teks"""
+    dynamic = [attr for _, attr, width in COLUMNS if width is None]
+    query = db.session.query(*[func.max(func.length(getattr(BuktiSetor, attr))) for attr in dynamic])
+    lengths = dict(zip(dynamic, apply_filters(query, filters).one()))
+
+    widths = []
+    for header, attr, width in COLUMNS:
+        if width is None:
+            width = max(lengths.get(attr) or 0, len(header)) + 2
+        widths.append(min(width, MAX_COLUMN_WIDTH))
+    return widths
+
+def _text(value):
+    """Nilai sel untuk CSV"""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+def stream_csv(rows, block_size=STREAM_BLOCK):
+    """Tulis baris sebagai CSV UTF-8 (dengan BOM agar terbaca Excel), yield per blok bytes"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow([header for header, _, _ in COLUMNS])
+    for row in rows:
+        writer.writerow([_text(value) for value in row])
+        if buffer.tell() >= block_size:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def stream_xlsx(rows, widths, block_size=STREAM_BLOCK):
+    """
+    Tulis baris ke workbook write-only (memori konstan) di file sementara,
+    lalu yield isinya per blok bytes. File sementara dihapus setelah selesai.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Bukti Setor Data")
+    for index, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+    ws.freeze_panes = "A2"
+
+    bold = Font(bold=True)
+    center = Alignment(horizontal="center")
+    header = []
+    for title, _, _ in COLUMNS:
+        cell = WriteOnlyCell(ws, value=title)
+        cell.font = bold
+        cell.alignment = center
+        header.append(cell)
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+
+    with tempfile.TemporaryFile(suffix=".xlsx") as output:
+        wb.save(output)
+        output.seek(0)
+        while True:
+            block = output.read(block_size)
+            if not block:
+                break
+            yield block
+
+def export_filename(fmt):
+    """Nama file download, mis. bukti_setor_export_20240131_120000.xlsx"""
+    return f"bukti_setor_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
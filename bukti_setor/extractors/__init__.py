@@ -4,10 +4,13 @@ from .kode_setor import extract_kode_setor
 from .tanggal import extract_tanggal_setor
 from .jumlah import extract_jumlah_setor
 from .ntpn import extract_ntpn
+from .engine import extract_fields, field_found
 
 __all__ = [
     "extract_kode_setor",
     "extract_tanggal_setor", 
     "extract_jumlah_setor",
-    "extract_ntpn"
+    "extract_ntpn",
+    "extract_fields",
+    "field_found"
 ]
@@ -0,0 +1,260 @@
+# bukti_setor/extractors/engine.py
+# Engine ekstraksi satu-lintasan untuk kode setor, tanggal, jumlah dan NTPN
+#
+# Teks OCR di-tokenisasi sekali (lowercase, baris, token angka), lalu keempat
+# field di-resolve dari hasil itu dengan urutan prioritas yang sama persis
+# dengan extract_kode_setor / extract_tanggal_setor / extract_jumlah_setor /
+# extract_ntpn. Setiap pattern diberi kata kunci wajib sehingga regex hanya
+# dijalankan jika kata kuncinya memang ada di teks.
+
+import re
+from datetime import datetime
+from functools import cached_property
+
+from .kode_setor import KODE_SETOR_PATTERNS
+from .tanggal import TANGGAL_INDONESIA_PATTERN, TANGGAL_NUMERIK_PATTERNS, BULAN_LIST, BULAN_MAP
+from .jumlah import JUMLAH_PATTERNS, clean_number
+from .ntpn import NTPN_PATTERNS
+
+TIDAK_DITEMUKAN = "Tidak ditemukan"
+
+# Token angka (dikompilasi sekali saat import)
+KODE_TOKEN = re.compile(r"\b(\d{6,8})\b")
+NTPN_TOKEN = re.compile(r"\b(\d{16})\b")
+NTPN_TERPISAH = re.compile(r"(\d{4})[-.\s](\d{4})[-.\s](\d{4})[-.\s](\d{4})")
+UANG_TOKEN = re.compile(r"[\d.,]{6,}")
+ANGKA_TOKEN = re.compile(r"\d+")
+ANGKA_UANG_TOKEN = re.compile(r"[\d.,]+")
+
+# Kata kunci wajib per pattern (urutan sama dengan daftar pattern aslinya).
+# None = pattern tanpa kata kunci, selalu dijalankan.
+KODE_SETOR_RULES = list(zip(KODE_SETOR_PATTERNS, [
+    ("kode", "setor"), ("kode",), ("ssp",),
+    ("411211",), ("411121",), ("411126",), ("411128",), ("411124",), ("411125",),
+    ("setoran",), ("pajak",), ("billing",),
+]))
+
+TANGGAL_NUMERIK_RULES = list(zip(TANGGAL_NUMERIK_PATTERNS, [
+    None, None, ("tanggal",), ("tgl",), ("date",),
+]))
+
+JUMLAH_RULES = list(zip(JUMLAH_PATTERNS, [
+    ("jumlah", "setor", "rp"), ("total", "setor", "rp"), ("nominal", "rp"), ("nilai", "rp"), ("amount", "rp"),
+    ("jumlah", "setor"), ("total", "setor"), ("nominal",), ("nilai",),
+    ("transfer", "rp"), ("debet", "rp"), ("debit", "rp"),
+    ("rp",),
+]))
+
+NTPN_RULES = list(zip(NTPN_PATTERNS, [
+    ("ntpn",), ("nomor", "transaksi"), ("transaksi",), ("reference",), ("ref",),
+    ("ntpn",), ("ntpn",),
+    "token16",
+    ("transaksi",), ("penerimaan",), ("billing",),
+]))
+
+BULAN_LOWER = tuple(bulan.lower() for bulan in BULAN_LIST.split("|"))
+
+TANGGAL_KEYWORDS = ("tanggal", "tgl", "date", "setor")
+JUMLAH_KEYWORDS = ("jumlah", "total", "nominal", "setor", "bayar", "transfer", "debet", "debit")
+NTPN_KEYWORDS = ("ntpn", "transaksi", "reference", "billing", "nomor")
+
+class _Teks:
+    """
+    Hasil tokenisasi teks OCR, dipakai bersama oleh semua field.
+    Token yang hanya dibutuhkan jalur fallback dihitung saat pertama dipakai.
+    """
+
+    def __init__(self, raw_text):
+        self.raw = raw_text
+        self.lower = raw_text.lower()
+
+    @cached_property
+    def lines(self):
+        return self.raw.splitlines()
+
+    @cached_property
+    def lines_lower(self):
+        return [line.lower() for line in self.lines]
+
+    @cached_property
+    def kode_tokens(self):
+        return KODE_TOKEN.findall(self.raw)
+
+    @cached_property
+    def ntpn_token(self):
+        match = NTPN_TOKEN.search(self.raw)
+        return match.group(1) if match else None
+
+    def punya(self, keywords):
+        return all(keyword in self.lower for keyword in keywords)
+
+    def baris_dengan(self, keywords):
+        """Baris (asli) yang mengandung salah satu kata kunci"""
+        for line, line_lower in zip(self.lines, self.lines_lower):
+            if any(keyword in line_lower for keyword in keywords):
+                yield line
+
+def _resolve_kode_setor(teks):
+    for pattern, keywords in KODE_SETOR_RULES:
+        if not teks.punya(keywords):
+            continue
+        match = pattern.search(teks.raw)
+        if match:
+            return match.group(1).strip(), pattern.pattern
+
+    if teks.kode_tokens:
+        likely_codes = [code for code in teks.kode_tokens if code.startswith("4")]
+        if likely_codes:
+            return likely_codes[0], "fallback_kode_4"
+        return teks.kode_tokens[0], "fallback_angka_pertama"
+
+    return TIDAK_DITEMUKAN, None
+
+def _resolve_tanggal(teks):
+    if any(bulan in teks.lower for bulan in BULAN_LOWER):
+        match = TANGGAL_INDONESIA_PATTERN.search(teks.raw)
+        if match:
+            hari, bulan, tahun = match.groups()
+            bulan_inggris = BULAN_MAP.get(bulan.lower())
+            if bulan_inggris:
+                try:
+                    return datetime.strptime(f"{hari} {bulan_inggris} {tahun}", "%d %B %Y"), TANGGAL_INDONESIA_PATTERN.pattern
+                except ValueError:
+                    pass
+
+    if "/" in teks.raw or "-" in teks.raw:
+        for pattern, keywords in TANGGAL_NUMERIK_RULES:
+            if keywords and not teks.punya(keywords):
+                continue
+            match = pattern.search(teks.raw)
+            if match:
+                parts = match.groups()
+                try:
+                    if len(parts[0]) == 4:  # YYYY-MM-DD
+                        tanggal = datetime.strptime(f"{parts[0]}-{parts[1]}-{parts[2]}", "%Y-%m-%d")
+                    else:  # DD-MM-YYYY
+                        tanggal = datetime.strptime(f"{parts[0]}-{parts[1]}-{parts[2]}", "%d-%m-%Y")
+                    return tanggal, pattern.pattern
+                except ValueError:
+                    continue
+
+    for line in teks.baris_dengan(TANGGAL_KEYWORDS):
+        numbers = ANGKA_TOKEN.findall(line)
+        if len(numbers) >= 3:
+            try:
+                for i in range(len(numbers) - 2):
+                    day, month, year = numbers[i:i+3]
+                    if len(year) == 4 and 1 <= int(day) <= 31 and 1 <= int(month) <= 12:
+                        return datetime(int(year), int(month), int(day)), "baris_konteks"
+            except (ValueError, IndexError):
+                continue
+
+    return None, None
+
+def _resolve_jumlah(teks):
+    for pattern, keywords in JUMLAH_RULES:
+        if not teks.punya(keywords):
+            continue
+        match = pattern.search(teks.raw)
+        if match:
+            jumlah = clean_number(match.group(1))
+            if jumlah > 0:
+                return jumlah, pattern.pattern
+
+    candidates = [value for value in map(clean_number, UANG_TOKEN.findall(teks.raw)) if value > 10000]
+    if candidates:
+        return max(candidates), "fallback_angka_terbesar"
+
+    for line in teks.baris_dengan(JUMLAH_KEYWORDS):
+        for num_str in ANGKA_UANG_TOKEN.findall(line):
+            num_val = clean_number(num_str)
+            if num_val > 10000:
+                return num_val, "baris_konteks"
+
+    return 0.0, None
+
+def _resolve_ntpn(teks):
+    for pattern, keywords in NTPN_RULES:
+        if keywords == "token16":
+            # Sama dengan pattern \b(\d{16})\b: token 16 digit paling kiri
+            if teks.ntpn_token:
+                return teks.ntpn_token, pattern.pattern
+            continue
+        if not teks.punya(keywords):
+            continue
+        match = pattern.search(teks.raw)
+        if match:
+            ntpn = "".join(match.groups())
+            if len(ntpn) == 16:
+                return ntpn, pattern.pattern
+
+    # Sampai di sini berarti tidak ada token 16 digit utuh di teks,
+    # jadi tinggal cari NTPN yang ditulis dengan pemisah di baris kata kunci
+    for line in teks.baris_dengan(NTPN_KEYWORDS):
+        separated = NTPN_TERPISAH.findall(line)
+        if separated:
+            return "".join(separated[0]), "baris_konteks_pemisah"
+
+    return TIDAK_DITEMUKAN, None
+
+def field_found(field, value):
+    """True jika nilai field hasil extract_fields memang ditemukan"""
+    if field == "tanggal":
+        return value is not None
+    if field == "jumlah":
+        return bool(value) and value > 0
+    return bool(value) and value != TIDAK_DITEMUKAN
+
+# Format nilai per field untuk memeriksa hasil baca ulang region (crop bisa
+# meleset ke teks lain, terutama region dari layout template di cache)
+FIELD_FORMATS = {
+    "kode_setor": re.compile(r"\d{6,8}"),
+    "ntpn": re.compile(r"[0-9A-Z]{16}"),
+}
+TAHUN_MINIMUM = 2000
+
+def field_valid(field, value):
+    """True jika nilai field ditemukan dan formatnya masuk akal"""
+    if not field_found(field, value):
+        return False
+    if field in FIELD_FORMATS:
+        return bool(FIELD_FORMATS[field].fullmatch(str(value).strip().upper()))
+    if field == "tanggal":
+        return TAHUN_MINIMUM <= value.year <= datetime.now().year + 1
+    return True
+
+def extract_fields(raw_text):
+    """
+    Ekstraksi kode setor, tanggal, jumlah dan NTPN dalam satu lintasan.
+
+    Hasil:
+        {"kode_setor": str, "tanggal": datetime|None, "jumlah": float,
+         "ntpn": str, "rules": {field: pattern/aturan yang dipakai atau None}}
+    """
+    try:
+        teks = _Teks(raw_text or "")
+        kode_setor, kode_rule = _resolve_kode_setor(teks)
+        tanggal, tanggal_rule = _resolve_tanggal(teks)
+        jumlah, jumlah_rule = _resolve_jumlah(teks)
+        ntpn, ntpn_rule = _resolve_ntpn(teks)
+    except Exception as e:
+        print(f"[ERROR extract_fields] {e}")
+        return {
+            "kode_setor": TIDAK_DITEMUKAN, "tanggal": None, "jumlah": 0.0, "ntpn": TIDAK_DITEMUKAN,
+            "rules": {"kode_setor": None, "tanggal": None, "jumlah": None, "ntpn": None},
+        }
+
+    print(f"[✅ EKSTRAKSI] kode_setor={kode_setor} tanggal={tanggal.strftime('%Y-%m-%d') if tanggal else '-'} "
+          f"jumlah={jumlah} ntpn={ntpn}")
+    return {
+        "kode_setor": kode_setor,
+        "tanggal": tanggal,
+        "jumlah": jumlah,
+        "ntpn": ntpn,
+        "rules": {
+            "kode_setor": kode_rule,
+            "tanggal": tanggal_rule,
+            "jumlah": jumlah_rule,
+            "ntpn": ntpn_rule,
+        },
+    }
@@ -3,6 +3,30 @@
 
 import re
 
+# Pattern untuk mencari jumlah setoran (dikompilasi sekali saat import)
+JUMLAH_PATTERNS = [
+    # Dengan label jelas
+    re.compile(r"jumlah\s*setor(?:an)?\s*:?\s*Rp\.?\s*([\d.,]+)", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"total\s*setor(?:an)?\s*:?\s*Rp\.?\s*([\d.,]+)", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"nominal\s*:?\s*Rp\.?\s*([\d.,]+)", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"nilai\s*:?\s*Rp\.?\s*([\d.,]+)", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"amount\s*:?\s*Rp\.?\s*([\d.,]+)", re.IGNORECASE | re.MULTILINE),
+
+    # Tanpa Rp
+    re.compile(r"jumlah\s*setor(?:an)?\s*:?\s*([\d.,]+)", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"total\s*setor(?:an)?\s*:?\s*([\d.,]+)", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"nominal\s*:?\s*([\d.,]+)", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"nilai\s*:?\s*([\d.,]+)", re.IGNORECASE | re.MULTILINE),
+
+    # Pattern untuk bank/transfer
+    re.compile(r"transfer\s*.*?Rp\.?\s*([\d.,]+)", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"debet\s*.*?Rp\.?\s*([\d.,]+)", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"debit\s*.*?Rp\.?\s*([\d.,]+)", re.IGNORECASE | re.MULTILINE),
+
+    # Pattern umum untuk angka besar dengan Rp
+    re.compile(r"Rp\.?\s*([\d.,]{7,})", re.IGNORECASE | re.MULTILINE),
+]
+
 def clean_number(text):
     """Convert string seperti 'Rp 1.000.000,00' ke float 1000000.0"""
     if not text:
@@ -46,38 +70,14 @@ def extract_jumlah_setor(raw_text):
     try:
         jumlah = 0.0
         
-        # Pattern untuk mencari jumlah setoran
-        patterns = [
-            # Dengan label jelas
-            r"jumlah\s*setor(?:an)?\s*:?\s*Rp\.?\s*([\d.,]+)",
-            r"total\s*setor(?:an)?\s*:?\s*Rp\.?\s*([\d.,]+)",
-            r"nominal\s*:?\s*Rp\.?\s*([\d.,]+)",
-            r"nilai\s*:?\s*Rp\.?\s*([\d.,]+)",
-            r"amount\s*:?\s*Rp\.?\s*([\d.,]+)",
-            
-            # Tanpa Rp
-            r"jumlah\s*setor(?:an)?\s*:?\s*([\d.,]+)",
-            r"total\s*setor(?:an)?\s*:?\s*([\d.,]+)",
-            r"nominal\s*:?\s*([\d.,]+)",
-            r"nilai\s*:?\s*([\d.,]+)",
-            
-            # Pattern untuk bank/transfer
-            r"transfer\s*.*?Rp\.?\s*([\d.,]+)",
-            r"debet\s*.*?Rp\.?\s*([\d.,]+)",
-            r"debit\s*.*?Rp\.?\s*([\d.,]+)",
-            
-            # Pattern umum untuk angka besar dengan Rp
-            r"Rp\.?\s*([\d.,]{7,})",
-        ]
-        
         # Cari dengan pattern yang spesifik dulu
-        for pattern in patterns:
-            match = re.search(pattern, raw_text, re.IGNORECASE | re.MULTILINE)
+        for pattern in JUMLAH_PATTERNS:
+            match = pattern.search(raw_text)
             if match:
                 jumlah_str = match.group(1)
                 jumlah = clean_number(jumlah_str)
                 if jumlah > 0:
-                    print(f"[✅ JUMLAH] Ditemukan: {format_currency(jumlah)} dengan pattern: {pattern}")
+                    print(f"[✅ JUMLAH] Ditemukan: {format_currency(jumlah)} dengan pattern: {pattern.pattern}")
                     return jumlah
         
         # Jika tidak ditemukan, cari angka besar (kemungkinan jumlah setoran)
@@ -3,6 +3,32 @@
 
 import re
 
+# Pattern untuk kode setor yang umum (dikompilasi sekali saat import)
+# Contoh: 411121, 411211, 411126, dsb
+KODE_SETOR_PATTERNS = [
+    # Pola dengan label "kode setor" atau "kode"
+    re.compile(r"kode\s*setor\s*:?\s*(\d{6,8})", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"kode\s*:?\s*(\d{6,8})", re.IGNORECASE | re.MULTILINE),
+
+    # Pola untuk SSP (Surat Setoran Pajak)
+    re.compile(r"ssp\s*.*?(\d{6,8})", re.IGNORECASE | re.MULTILINE),
+
+    # Pola untuk jenis setoran PPN (411211)
+    re.compile(r"(411211)", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"(411121)", re.IGNORECASE | re.MULTILINE), # PPN Dalam Negeri
+    re.compile(r"(411126)", re.IGNORECASE | re.MULTILINE), # PPN Impor
+    re.compile(r"(411128)", re.IGNORECASE | re.MULTILINE), # PPN Final
+
+    # Pola untuk PPh 
+    re.compile(r"(411124)", re.IGNORECASE | re.MULTILINE), # PPh Pasal 22
+    re.compile(r"(411125)", re.IGNORECASE | re.MULTILINE), # PPh Pasal 23
+
+    # Pola umum 6-8 digit yang didahului/diikuti kata kunci
+    re.compile(r"setoran\s*.*?(\d{6,8})", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"pajak\s*.*?(\d{6,8})", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"billing\s*.*?(\d{6,8})", re.IGNORECASE | re.MULTILINE),
+]
+
 def extract_kode_setor(raw_text):
     """
     Ekstraksi kode setor dari teks OCR bukti setor
@@ -11,38 +37,12 @@ def extract_kode_setor(raw_text):
     try:
         kode_setor = ""
         
-        # Pattern untuk kode setor yang umum
-        # Contoh: 411121, 411211, 411126, dsb
-        patterns = [
-            # Pola dengan label "kode setor" atau "kode"
-            r"kode\s*setor\s*:?\s*(\d{6,8})",
-            r"kode\s*:?\s*(\d{6,8})",
-            
-            # Pola untuk SSP (Surat Setoran Pajak)
-            r"ssp\s*.*?(\d{6,8})",
-            
-            # Pola untuk jenis setoran PPN (411211)
-            r"(411211)",
-            r"(411121)", # PPN Dalam Negeri
-            r"(411126)", # PPN Impor
-            r"(411128)", # PPN Final
-            
-            # Pola untuk PPh 
-            r"(411124)", # PPh Pasal 22
-            r"(411125)", # PPh Pasal 23
-            
-            # Pola umum 6-8 digit yang didahului/diikuti kata kunci
-            r"setoran\s*.*?(\d{6,8})",
-            r"pajak\s*.*?(\d{6,8})",
-            r"billing\s*.*?(\d{6,8})",
-        ]
-        
         # Cari dengan pattern yang spesifik dulu
-        for pattern in patterns:
-            match = re.search(pattern, raw_text, re.IGNORECASE | re.MULTILINE)
+        for pattern in KODE_SETOR_PATTERNS:
+            match = pattern.search(raw_text)
             if match:
                 kode_setor = match.group(1)
-                print(f"[✅ KODE SETOR] Ditemukan: {kode_setor} dengan pattern: {pattern}")
+                print(f"[✅ KODE SETOR] Ditemukan: {kode_setor} dengan pattern: {pattern.pattern}")
                 break
         
         # Jika tidak ditemukan dengan pattern khusus, cari di seluruh teks
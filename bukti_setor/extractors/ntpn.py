@@ -3,6 +3,28 @@
 
 import re
 
+# Pattern untuk NTPN (dikompilasi sekali saat import)
+NTPN_PATTERNS = [
+    # Dengan label jelas
+    re.compile(r"ntpn\s*:?\s*(\d{16})", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"nomor\s*transaksi\s*:?\s*(\d{16})", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"no\s*transaksi\s*:?\s*(\d{16})", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"reference\s*:?\s*(\d{16})", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"ref\s*:?\s*(\d{16})", re.IGNORECASE | re.MULTILINE),
+
+    # Pattern dengan pemisah
+    re.compile(r"ntpn\s*:?\s*(\d{4})\s*(\d{4})\s*(\d{4})\s*(\d{4})", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"ntpn\s*:?\s*(\d{4})[-.](\d{4})[-.](\d{4})[-.](\d{4})", re.IGNORECASE | re.MULTILINE),
+
+    # Pattern umum 16 digit
+    re.compile(r"\b(\d{16})\b", re.IGNORECASE | re.MULTILINE),
+
+    # Pattern dengan kata kunci di sekitarnya
+    re.compile(r"transaksi\s*.*?(\d{16})", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"penerimaan\s*.*?(\d{16})", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"billing\s*.*?(\d{16})", re.IGNORECASE | re.MULTILINE),
+]
+
 def extract_ntpn(raw_text):
     """
     Ekstraksi NTPN dari teks OCR bukti setor
@@ -11,31 +33,9 @@ def extract_ntpn(raw_text):
     try:
         ntpn = ""
         
-        # Pattern untuk NTPN
-        patterns = [
-            # Dengan label jelas
-            r"ntpn\s*:?\s*(\d{16})",
-            r"nomor\s*transaksi\s*:?\s*(\d{16})",
-            r"no\s*transaksi\s*:?\s*(\d{16})",
-            r"reference\s*:?\s*(\d{16})",
-            r"ref\s*:?\s*(\d{16})",
-            
-            # Pattern dengan pemisah
-            r"ntpn\s*:?\s*(\d{4})\s*(\d{4})\s*(\d{4})\s*(\d{4})",
-            r"ntpn\s*:?\s*(\d{4})[-.](\d{4})[-.](\d{4})[-.](\d{4})",
-            
-            # Pattern umum 16 digit
-            r"\b(\d{16})\b",
-            
-            # Pattern dengan kata kunci di sekitarnya
-            r"transaksi\s*.*?(\d{16})",
-            r"penerimaan\s*.*?(\d{16})",
-            r"billing\s*.*?(\d{16})",
-        ]
-        
         # Cari dengan pattern yang spesifik dulu
-        for pattern in patterns:
-            match = re.search(pattern, raw_text, re.IGNORECASE | re.MULTILINE)
+        for pattern in NTPN_PATTERNS:
+            match = pattern.search(raw_text)
             if match:
                 if len(match.groups()) == 1:
                     ntpn = match.group(1)
@@ -44,7 +44,7 @@ def extract_ntpn(raw_text):
                     ntpn = ''.join(match.groups())
                 
                 if len(ntpn) == 16:
-                    print(f"[✅ NTPN] Ditemukan: {ntpn} dengan pattern: {pattern}")
+                    print(f"[✅ NTPN] Ditemukan: {ntpn} dengan pattern: {pattern.pattern}")
                     return ntpn
         
         # Cari di sekitar kata kunci jika tidak ditemukan
@@ -4,6 +4,32 @@
 import re
 from datetime import datetime
 
+# Pattern untuk format tanggal Indonesia (dikompilasi sekali saat import)
+BULAN_LIST = "Januari|Februari|Maret|April|Mei|Juni|Juli|Agustus|September|Oktober|November|Desember"
+
+# Format: DD Bulan YYYY (contoh: 15 Januari 2024)
+TANGGAL_INDONESIA_PATTERN = re.compile(rf"(\d{{1,2}})\s+({BULAN_LIST})\s+(\d{{4}})", re.IGNORECASE)
+
+TANGGAL_NUMERIK_PATTERNS = [
+    # Format: DD/MM/YYYY atau DD-MM-YYYY
+    re.compile(r"(\d{1,2})[/-](\d{1,2})[/-](\d{4})", re.IGNORECASE),
+
+    # Format: YYYY/MM/DD atau YYYY-MM-DD
+    re.compile(r"(\d{4})[/-](\d{1,2})[/-](\d{1,2})", re.IGNORECASE),
+
+    # Format dengan kata kunci
+    re.compile(r"tanggal\s*:?\s*(\d{1,2})[/-](\d{1,2})[/-](\d{4})", re.IGNORECASE),
+    re.compile(r"tgl\s*:?\s*(\d{1,2})[/-](\d{1,2})[/-](\d{4})", re.IGNORECASE),
+    re.compile(r"date\s*:?\s*(\d{1,2})[/-](\d{1,2})[/-](\d{4})", re.IGNORECASE),
+]
+
+BULAN_MAP = {
+    "januari": "January", "februari": "February", "maret": "March",
+    "april": "April", "mei": "May", "juni": "June",
+    "juli": "July", "agustus": "August", "september": "September",
+    "oktober": "October", "november": "November", "desember": "December"
+}
+
 def extract_tanggal_setor(raw_text):
     """
     Ekstraksi tanggal dari teks OCR bukti setor
@@ -11,36 +37,11 @@ def extract_tanggal_setor(raw_text):
     try:
         tanggal_obj = None
         
-        # Pattern untuk format tanggal Indonesia
-        bulan_list = "Januari|Februari|Maret|April|Mei|Juni|Juli|Agustus|September|Oktober|November|Desember"
-        
-        patterns = [
-            # Format: DD Bulan YYYY (contoh: 15 Januari 2024)
-            rf"(\d{{1,2}})\s+({bulan_list})\s+(\d{{4}})",
-            
-            # Format: DD/MM/YYYY atau DD-MM-YYYY
-            r"(\d{1,2})[/-](\d{1,2})[/-](\d{4})",
-            
-            # Format: YYYY/MM/DD atau YYYY-MM-DD
-            r"(\d{4})[/-](\d{1,2})[/-](\d{1,2})",
-            
-            # Format dengan kata kunci
-            r"tanggal\s*:?\s*(\d{1,2})[/-](\d{1,2})[/-](\d{4})",
-            r"tgl\s*:?\s*(\d{1,2})[/-](\d{1,2})[/-](\d{4})",
-            r"date\s*:?\s*(\d{1,2})[/-](\d{1,2})[/-](\d{4})",
-        ]
-        
         # Coba pattern tanggal Indonesia dulu
-        match_indonesia = re.search(patterns[0], raw_text, re.IGNORECASE)
+        match_indonesia = TANGGAL_INDONESIA_PATTERN.search(raw_text)
         if match_indonesia:
             hari, bulan, tahun = match_indonesia.groups()
-            bulan_map = {
-                "januari": "January", "februari": "February", "maret": "March",
-                "april": "April", "mei": "May", "juni": "June",
-                "juli": "July", "agustus": "August", "september": "September",
-                "oktober": "October", "november": "November", "desember": "December"
-            }
-            bulan_inggris = bulan_map.get(bulan.lower())
+            bulan_inggris = BULAN_MAP.get(bulan.lower())
             if bulan_inggris:
                 try:
                     tanggal_obj = datetime.strptime(f"{hari} {bulan_inggris} {tahun}", "%d %B %Y")
@@ -50,8 +51,8 @@ def extract_tanggal_setor(raw_text):
                     pass
         
         # Coba format DD/MM/YYYY
-        for pattern in patterns[1:]:
-            match = re.search(pattern, raw_text, re.IGNORECASE)
+        for pattern in TANGGAL_NUMERIK_PATTERNS:
+            match = pattern.search(raw_text)
             if match:
                 parts = match.groups()
                 try:
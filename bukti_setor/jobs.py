@@ -0,0 +1,276 @@
+# bukti_setor/jobs.py - Job OCR asynchronous dengan antrian terbatas
+# -*- coding: utf-8 -*-
+#
+# POST /api/bukti_setor/jobs menyimpan upload ke disk, mencatat job di tabel
+# ocr_jobs lalu langsung mengembalikan job_id. Pool thread lokal menjalankan
+# BuktiSetorProcessor di belakang, hasilnya disimpan di baris job yang sama.
+# Batch besar (POST /api/bukti_setor/batch) dipecah menjadi satu job per file
+# dengan batch_id yang sama dan dijalankan di pool thread terpisah, sehingga
+# job tunggal tidak menunggu di belakang ratusan file batch.
+
+import os
+import json
+import uuid
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.utils import secure_filename
+from models import db, OcrJob
+from bukti_setor.batch import file_result
+from bukti_setor.runtime import worker_alive, worker_id
+
+logger = logging.getLogger(__name__)
+
+class QueueFull(Exception):
+    """Antrian job penuh, client diminta mencoba lagi nanti"""
+
+class JobManager:
+    """Antrian job OCR per worker yang disimpan di database"""
+
+    def __init__(self, app, processor, max_workers=1, max_queue=20, stale_after=600, admission=None,
+                 batch_workers=None, batch_capacity=500):
+        self.app = app
+        self.processor = processor
+        # Job sudah antri, jadi menunggu budget memori tanpa batas waktu
+        self.admission = admission
+        self.max_queue = max_queue
+        self.stale_after = stale_after
+        self.job_folder = os.path.join(processor.upload_folder, "jobs")
+        os.makedirs(self.job_folder, exist_ok=True)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr-job")
+        # Anggota batch: satu file per job, paralel seperti batch sinkron (default = thread halaman)
+        self.batch_capacity = batch_capacity
+        self._batch_executor = ThreadPoolExecutor(
+            max_workers=batch_workers or processor.page_workers, thread_name_prefix="ocr-batch"
+        )
+        self._pending = 0
+        self._pending_batch = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        """Jumlah job yang antri atau sedang berjalan di worker ini"""
+        with self._lock:
+            return self._pending
+
+    def submit(self, file):
+        """Simpan upload (FileStorage) dan antrikan job; raise QueueFull jika antrian penuh"""
+        with self._lock:
+            if self._pending >= self.max_queue:
+                raise QueueFull()
+            self._pending += 1
+
+        try:
+            job_id = uuid.uuid4().hex
+            file_path = self._job_path(job_id, file.filename)
+            file.save(file_path)
+
+            job = OcrJob(id=job_id, status='queued', filename=file.filename, file_path=file_path,
+                         worker=worker_id())
+            db.session.add(job)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                self._pending -= 1
+            raise
+
+        self._executor.submit(self._run, job_id)
+        logger.info(f"📥 Job {job_id} diantrikan ({file.filename})")
+        return job_id
+
+    def submit_batch(self, items, expected):
+        """
+        Antrikan setiap file batch (iterable (nama, bytes | Exception) dari batch.py)
+        sebagai job tersendiri dengan batch_id yang sama. File yang sudah ditolak
+        (format/ukuran) dicatat langsung sebagai job 'failed'. expected = jumlah
+        file menurut request, dipesan di antrian sebelum file dibaca; raise QueueFull
+        jika tidak muat. Return (batch_id, jumlah file).
+        """
+        with self._lock:
+            if self._pending_batch + expected > self.batch_capacity:
+                raise QueueFull()
+            self._pending_batch += expected
+            self._pending += expected
+
+        batch_id = uuid.uuid4().hex
+        job_ids = []
+        file_paths = []
+        total = 0
+        try:
+            for index, (name, data) in enumerate(items):
+                job_id = uuid.uuid4().hex
+                job = OcrJob(id=job_id, filename=name, batch_id=batch_id, batch_index=index, worker=worker_id())
+                if isinstance(data, Exception):
+                    job.status = 'failed'
+                    job.error = str(data)
+                    job.finished_at = datetime.utcnow()
+                else:
+                    job.status = 'queued'
+                    job.file_path = self._job_path(job_id, name)
+                    file_paths.append(job.file_path)
+                    with open(job.file_path, "wb") as f:
+                        f.write(data)
+                    job_ids.append(job_id)
+                db.session.add(job)
+                total += 1
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            for file_path in file_paths:
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+            job_ids = []
+            raise
+        finally:
+            # Kembalikan slot yang tidak terpakai (file ditolak, entri ZIP yang dilewati, error)
+            with self._lock:
+                self._pending_batch -= expected - len(job_ids)
+                self._pending -= expected - len(job_ids)
+
+        for job_id in job_ids:
+            self._batch_executor.submit(self._run, job_id, True)
+        logger.info(f"📥 Batch {batch_id} diantrikan: {len(job_ids)} dari {total} file")
+        return batch_id, total
+
+    def get(self, job_id):
+        """Status job sebagai dict, atau None jika tidak ada"""
+        job = db.session.get(OcrJob, job_id)
+        return job.to_dict() if job else None
+
+    def get_batch(self, batch_id):
+        """
+        Status batch sebagai dict (progress + results per file sesuai urutan input,
+        bentuknya sama dengan response batch sinkron), atau None jika tidak ada.
+        """
+        jobs = OcrJob.query.filter_by(batch_id=batch_id).order_by(OcrJob.batch_index).all()
+        if not jobs:
+            return None
+
+        results = []
+        for job in jobs:
+            if job.status == 'done':
+                item = file_result(job.filename, json.loads(job.result))
+            elif job.status == 'failed':
+                item = file_result(job.filename, {"success": False, "error": job.error})
+            else:
+                item = {"filename": job.filename}
+            item["job_id"] = job.id
+            item["status"] = job.status
+            results.append(item)
+
+        berhasil = sum(1 for job in jobs if job.status == 'done')
+        gagal = sum(1 for job in jobs if job.status == 'failed')
+        if berhasil + gagal == len(jobs):
+            status = 'done'
+        elif any(job.status != 'queued' for job in jobs):
+            status = 'running'
+        else:
+            status = 'queued'
+        return {
+            "batch_id": batch_id,
+            "status": status,
+            "total": len(jobs),
+            "selesai": berhasil + gagal,
+            "berhasil": berhasil,
+            "gagal": gagal,
+            "results": results,
+        }
+
+    def _job_path(self, job_id, filename):
+        filename = secure_filename(os.path.basename(filename or "")) or "upload"
+        return os.path.join(self.job_folder, f"{job_id}_{filename}")
+
+    def recover(self):
+        """
+        Antrikan ulang job 'queued'/'running' yang worker pemiliknya sudah mati
+        (crash / di-restart gunicorn). Job worker lain yang masih hidup tidak
+        disentuh; job lama tanpa pemilik yang 'running' baru diambil setelah
+        stale_after detik. Job diambil alih secara atomik, jadi jika beberapa
+        worker start bersamaan setiap job hanya diantrikan (dan dihitung) oleh satu worker.
+        """
+        me = worker_id()
+        job_ids = []
+        with self.app.app_context():
+            batas = datetime.utcnow() - timedelta(seconds=self.stale_after)
+            jobs = OcrJob.query.filter(OcrJob.status.in_(('queued', 'running'))).all()
+            for job in jobs:
+                if job.worker is not None and worker_alive(job.worker):
+                    continue
+                if job.worker is None and job.status == 'running' and job.started_at and job.started_at >= batas:
+                    continue
+                owner = OcrJob.worker.is_(None) if job.worker is None else OcrJob.worker == job.worker
+                claimed = OcrJob.query.filter(
+                    OcrJob.id == job.id, OcrJob.status == job.status, owner
+                ).update({'status': 'queued', 'worker': me}, synchronize_session=False)
+                db.session.commit()
+                if claimed:
+                    job_ids.append((job.id, job.batch_id is not None))
+
+        for job_id, batch in job_ids:
+            with self._lock:
+                self._pending += 1
+                if batch:
+                    self._pending_batch += 1
+            (self._batch_executor if batch else self._executor).submit(self._run, job_id, batch)
+        if job_ids:
+            logger.info(f"♻️ {len(job_ids)} job dipulihkan dari database")
+        return len(job_ids)
+
+    def _claim(self, job_id):
+        """Tandai job sebagai running secara atomik (aman jika beberapa worker memulihkan job yang sama)"""
+        updated = OcrJob.query.filter_by(id=job_id, status='queued').update(
+            {'status': 'running', 'started_at': datetime.utcnow()}
+        )
+        db.session.commit()
+        return updated == 1
+
+    def _run(self, job_id, batch=False):
+        try:
+            with self.app.app_context():
+                if not self._claim(job_id):
+                    return
+
+                job = db.session.get(OcrJob, job_id)
+                try:
+                    if not job.file_path or not os.path.exists(job.file_path):
+                        raise FileNotFoundError("File upload job tidak ditemukan")
+
+                    doc = self.processor.prepare(filepath=job.file_path, filename=job.filename)
+                    with self.processor.admit(doc, self.admission, timeout=None):
+                        result = self.processor.process(doc)
+                    if result.get('success'):
+                        job.status = 'done'
+                        job.result = json.dumps(result, ensure_ascii=False, default=str)
+                    else:
+                        job.status = 'failed'
+                        job.error = result.get('error', 'Processing failed')
+                except Exception as e:
+                    logger.error(f"❌ Job {job_id} gagal: {e}")
+                    job.status = 'failed'
+                    job.error = str(e)
+
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+                logger.info(f"✅ Job {job_id} selesai: {job.status}")
+
+                try:
+                    if job.file_path and os.path.exists(job.file_path):
+                        os.remove(job.file_path)
+                except OSError as e:
+                    logger.warning(f"⚠️ Failed to cleanup job file: {e}")
+        except Exception as e:
+            logger.error(f"❌ Job runner error {job_id}: {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+                if batch:
+                    self._pending_batch -= 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+        self._batch_executor.shutdown(wait=False)
@@ -0,0 +1,243 @@
+# bukti_setor/layout.py - Tahap layout: lokasi field di halaman & OCR per region
+# -*- coding: utf-8 -*-
+#
+# Pembacaan penuh (image_to_data) menghasilkan kata beserta bounding box.
+# Dari situ dicari baris berlabel NTPN / kode setor / tanggal / jumlah dan
+# posisi nilainya disimpan (koordinat relatif 0-1) per template bukti setor
+# (BPN DJP, bank tertentu). Field yang lemah dibaca ulang hanya pada crop
+# nilainya dengan setting khusus (--psm 7 + whitelist karakter, lihat retry.py);
+# jika labelnya tidak terbaca di halaman ini, region diambil dari layout
+# template yang sama di cache.
+
+import re
+import threading
+from collections import OrderedDict
+from bukti_setor.extractors.jumlah import clean_number
+from bukti_setor.extractors.engine import BULAN_LOWER
+
+# Label per field: kata (lowercase, tanpa tanda baca) yang menandai baris field
+FIELD_LABELS = {
+    "kode_setor": ("kode",),
+    "tanggal": ("tanggal", "tgl", "date"),
+    "jumlah": ("jumlah", "nominal", "total", "nilai", "amount"),
+    "ntpn": ("ntpn",),
+}
+# Kata yang masih bagian label (bukan nilai) jika muncul setelah kata label
+LABEL_WORDS = {"kode", "setor", "setoran", "tanggal", "tgl", "date", "jumlah", "nominal",
+               "total", "nilai", "amount", "ntpn", "bayar", "billing"}
+
+# Label standar untuk menyusun ulang teks dari crop agar dikenali extract_fields
+FIELD_TEXT_LABELS = {
+    "kode_setor": "Kode Setor",
+    "tanggal": "Tanggal Setor",
+    "jumlah": "Jumlah Setor",
+    "ntpn": "NTPN",
+}
+
+# Karakter yang diizinkan per field (None = bebas, tanggal bisa berisi nama bulan)
+FIELD_WHITELIST = {
+    "kode_setor": "0123456789",
+    "tanggal": None,
+    "jumlah": "Rp0123456789.,",
+    "ntpn": "0123456789-.",
+}
+
+# Penanda template di header; urutan = prioritas (yang spesifik dulu). Header
+# tanpa penanda spesifik tidak diberi template: layout bank yang berbeda-beda
+# tidak boleh berbagi region di cache.
+TEMPLATE_MARKERS = [
+    ("BUKTI PENERIMAAN NEGARA", "djp_bpn"),
+    ("MANDIRI", "bank_mandiri"),
+    ("BNI", "bank_bni"),
+    ("BRI", "bank_bri"),
+    ("BCA", "bank_bca"),
+    ("BTN", "bank_btn"),
+    ("POS INDONESIA", "pos"),
+]
+# Penanda dicocokkan per kata utuh ("BRI" tidak cocok dengan "BRIGHT"/"FABRIKAN");
+# angka boleh menempel karena OCR sering menggabungkan "BNI46"
+_TEMPLATE_PATTERNS = [
+    (re.compile(rf"(?<![A-Z]){re.escape(marker)}(?![A-Z])"), template)
+    for marker, template in TEMPLATE_MARKERS
+]
+
+# Bagian atas halaman yang dibaca untuk mengenali template
+HEADER_FRACTION = 0.2
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]")
+_SPASI = re.compile(r"\s+")
+
+def field_config(field, tesseract_config, psm=7):
+    """Config Tesseract untuk crop satu field: satu baris (--psm 7) + whitelist"""
+    lang = re.search(r"-l\s+(\S+)", tesseract_config or "")
+    config = f"--oem 3 --psm {psm} -l {lang.group(1) if lang else 'eng'}"
+    if FIELD_WHITELIST.get(field):
+        config += f" -c tessedit_char_whitelist={FIELD_WHITELIST[field]}"
+    return config
+
+def words_to_lines(words):
+    """Kelompokkan kata (hasil image_to_data) per baris, urut posisi di halaman"""
+    lines = OrderedDict()
+    for word in words:
+        lines.setdefault((word["block"], word["par"], word["line"]), []).append(word)
+
+    hasil = []
+    for key, line_words in lines.items():
+        line_words.sort(key=lambda word: word["left"])
+        hasil.append({
+            "block": key[0],
+            "words": line_words,
+            "text": " ".join(word["text"] for word in line_words),
+            "left": min(word["left"] for word in line_words),
+            "top": min(word["top"] for word in line_words),
+            "right": max(word["left"] + word["width"] for word in line_words),
+            "bottom": max(word["top"] + word["height"] for word in line_words),
+        })
+    return hasil
+
+def lines_to_text(lines):
+    """Susun ulang teks halaman seperti output image_to_string (baris kosong antar blok)"""
+    parts = []
+    block = None
+    for line in lines:
+        if block is not None and line["block"] != block:
+            parts.append("")
+        parts.append(line["text"])
+        block = line["block"]
+    return "\n".join(parts)
+
+def detect_template(text):
+    """Nama template bukti setor dari teks header, atau None jika tidak dikenali"""
+    header = _SPASI.sub(" ", (text or "").upper())
+    for pattern, template in _TEMPLATE_PATTERNS:
+        if pattern.search(header):
+            return template
+    return None
+
+def header_text(lines, height):
+    """Teks baris-baris yang berada di area header halaman"""
+    batas = height * HEADER_FRACTION
+    return "\n".join(line["text"] for line in lines if line["top"] < batas)
+
+def _clean(word):
+    return _NON_ALNUM.sub("", word.lower())
+
+def _value_words(line, labels):
+    """Kata nilai di baris berlabel: semua kata setelah label dan tanda ':'"""
+    words = line["words"]
+    start = None
+    for i, word in enumerate(words):
+        if _clean(word["text"]) in labels:
+            start = i + 1
+            break
+    if start is None:
+        return None
+    while start < len(words) and (_clean(words[start]["text"]) in LABEL_WORDS or not _clean(words[start]["text"])):
+        start += 1
+    return words[start:]
+
+def locate_fields(lines, width, height):
+    """
+    Cari region nilai setiap field. Hasil: {field: (x0, y0, x1, y1)} dalam
+    koordinat relatif, region dilebarkan sampai tepi kanan halaman karena
+    panjang nilai (mis. jumlah) berbeda antar dokumen.
+    """
+    layout = {}
+    for field, labels in FIELD_LABELS.items():
+        for i, line in enumerate(lines):
+            value_words = _value_words(line, labels)
+            if value_words is None:
+                continue
+            if not value_words:
+                # Nilai di baris berikutnya (label dan nilai ditulis bertumpuk)
+                if i + 1 >= len(lines) or lines[i + 1]["block"] != line["block"]:
+                    continue
+                value_words = lines[i + 1]["words"]
+            top = min(word["top"] for word in value_words)
+            bottom = max(word["top"] + word["height"] for word in value_words)
+            left = value_words[0]["left"]
+            pad = (bottom - top) * 0.35
+            layout[field] = (
+                max(0.0, (left - pad) / width),
+                max(0.0, (top - pad) / height),
+                1.0,
+                min(1.0, (bottom + pad) / height),
+            )
+            break
+    return layout
+
+def crop(image, box):
+    """Crop numpy image dengan box relatif (view, tanpa copy)"""
+    height, width = image.shape[:2]
+    x0, y0, x1, y1 = box
+    return image[int(y0 * height):max(int(y1 * height), int(y0 * height) + 1),
+                 int(x0 * width):max(int(x1 * width), int(x0 * width) + 1)]
+
+def field_text(field, words):
+    """Teks berlabel standar ('NTPN: ...') dari kata-kata crop satu field"""
+    return f"{FIELD_TEXT_LABELS[field]}: {' '.join(word['text'] for word in words)}"
+
+def _digits(text):
+    return re.sub(r"\D", "", text)
+
+def field_words(lines, fields):
+    """
+    Kata sumber setiap field hasil extract_fields pada pembacaan penuh:
+    {field: [kata, ...]} (list kosong jika field tidak ditemukan/tidak terlacak).
+    """
+    hasil = {field: [] for field in FIELD_LABELS}
+
+    kode = fields.get("kode_setor")
+    ntpn = fields.get("ntpn")
+    tanggal = fields.get("tanggal")
+    jumlah = fields.get("jumlah")
+
+    for line in lines:
+        words = line["words"]
+        if not hasil["kode_setor"] and kode and kode.isdigit():
+            hasil["kode_setor"] = [word for word in words if kode in _digits(word["text"])]
+        if not hasil["ntpn"] and ntpn and ntpn.isdigit() and ntpn in _digits(line["text"]):
+            hasil["ntpn"] = [word for word in words if _digits(word["text"])]
+        if not hasil["tanggal"] and tanggal is not None and str(tanggal.year) in line["text"]:
+            hasil["tanggal"] = [
+                word for word in words
+                if _digits(word["text"]) or _clean(word["text"]) in BULAN_LOWER
+            ]
+        if not hasil["jumlah"] and jumlah:
+            hasil["jumlah"] = [
+                word for word in words
+                if _digits(word["text"]) and clean_number(word["text"]) == jumlah
+            ]
+    return hasil
+
+def word_confidence(words):
+    """Confidence kata terlemah (0-100), None jika tidak ada kata yang ber-confidence"""
+    confs = [word["conf"] for word in words if word["conf"] >= 0]
+    return round(min(confs), 1) if confs else None
+
+def page_confidence(words):
+    """Rata-rata confidence semua kata di halaman"""
+    confs = [word["conf"] for word in words if word["conf"] >= 0]
+    return round(sum(confs) / len(confs), 1) if confs else None
+
+class LayoutCache:
+    """Layout field per template (LRU kecil di memori, per worker)"""
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._layouts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, template):
+        with self._lock:
+            layout = self._layouts.get(template)
+            if layout is not None:
+                self._layouts.move_to_end(template)
+            return layout
+
+    def put(self, template, layout):
+        with self._lock:
+            self._layouts[template] = layout
+            self._layouts.move_to_end(template)
+            while len(self._layouts) > self.max_entries:
+                self._layouts.popitem(last=False)
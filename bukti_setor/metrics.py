@@ -0,0 +1,242 @@
+# bukti_setor/metrics.py - Instrumentasi ringan: timer per stage, counter & histogram
+# -*- coding: utf-8 -*-
+#
+# Setiap worker gunicorn menyimpan registry di memori dan secara berkala menulis
+# snapshot-nya ke METRICS_DIR/metrics_<pid>.json. Endpoint /metrics menggabungkan
+# semua snapshot (counter dan bucket histogram dijumlahkan) lalu menampilkannya
+# dalam format teks Prometheus, sehingga angka yang terlihat adalah total semua worker.
+# Snapshot worker yang sudah exit digabung ke metrics_dead.json oleh master gunicorn
+# (child_exit) agar total tetap naik dan file tidak menumpuk; saat master start
+# folder dikosongkan (proses baru = counter mulai dari nol).
+
+import os
+import json
+import time
+import glob
+import logging
+import threading
+from contextlib import contextmanager
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PAGE_BUCKETS = (1, 2, 3, 5, 10, 20, 50)
+STARTUP_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+
+# nama -> (tipe, keterangan, bucket histogram)
+METRICS = {
+    "easyocr_requests_total": ("counter", "HTTP requests by endpoint and status", None),
+    "easyocr_request_duration_seconds": ("histogram", "HTTP request latency by endpoint", LATENCY_BUCKETS),
+    "easyocr_stage_duration_seconds": ("histogram", "OCR pipeline stage latency", LATENCY_BUCKETS),
+    "easyocr_document_pages": ("histogram", "Pages per processed document", PAGE_BUCKETS),
+    "easyocr_pages_total": ("counter", "Processed pages by status", None),
+    "easyocr_cache_events_total": ("counter", "OCR result cache events", None),
+    "easyocr_field_retries_total": ("counter", "Confidence-gated field retries by result", None),
+    "easyocr_preview_events_total": ("counter", "Page preview events (queued, duplicate, sync, evicted, error)", None),
+    "easyocr_errors_total": ("counter", "Errors by stage", None),
+    "easyocr_startup_seconds": ("histogram", "Worker cold-start duration by phase (import, app, worker, warmup)", STARTUP_BUCKETS),
+    "easyocr_admission_events_total": ("counter", "OCR admission decisions (admitted, queued, rejected)", None),
+    "easyocr_admission_in_use_bytes": ("gauge", "Estimated OCR memory in use across all workers", None),
+    "easyocr_admission_budget_bytes": ("gauge", "OCR memory budget shared by all workers", None),
+    "easyocr_admission_active": ("gauge", "Documents currently admitted across all workers", None),
+}
+
+METRICS_DIR = Config.METRICS_DIR
+FLUSH_INTERVAL = 1.0
+# Gabungan snapshot worker yang sudah exit
+DEAD_SNAPSHOT = "metrics_dead.json"
+
+class Registry:
+    """Counter dan histogram di memori, aman dipakai banyak thread"""
+
+    def __init__(self, metrics_dir=METRICS_DIR):
+        self.metrics_dir = metrics_dir
+        self._lock = threading.Lock()
+        self._counters = {}    # (nama, labels) -> nilai
+        self._histograms = {}  # (nama, labels) -> [bucket_counts, sum, count]
+        self._gauges = {}      # nama -> fungsi yang mengembalikan nilai saat ini
+        self._last_flush = 0.0
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    hist[0][i] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    def snapshot(self):
+        """Isi registry dalam bentuk yang bisa di-JSON-kan"""
+        with self._lock:
+            return _snapshot(self._counters, self._histograms)
+
+    def gauge(self, name, func):
+        """
+        Daftarkan gauge yang nilainya dibaca saat /metrics dirender. Nilainya
+        sudah global (mis. dari SQLite bersama), jadi tidak dijumlahkan antar worker.
+        """
+        self._gauges[name] = func
+
+    def flush(self, force=False):
+        """Tulis snapshot worker ini ke METRICS_DIR (dibatasi maksimal sekali per FLUSH_INTERVAL)"""
+        now = time.monotonic()
+        if not force and now - self._last_flush < FLUSH_INTERVAL:
+            return
+        self._last_flush = now
+        try:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            self._write(self._path(os.getpid()), self.snapshot())
+        except Exception as e:
+            logger.warning(f"⚠️ Gagal menulis metrics: {e}")
+
+    def reset(self):
+        """
+        Hapus semua snapshot di METRICS_DIR. Dipanggil master saat start: snapshot
+        yang ada berasal dari proses sebelumnya (restart / deploy) yang sudah mati.
+        """
+        for path in glob.glob(os.path.join(self.metrics_dir, "metrics_*.json*")):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"⚠️ Gagal menghapus snapshot metrics {path}: {e}")
+
+    def mark_process_dead(self, pid):
+        """
+        Gabungkan snapshot worker ``pid`` yang sudah exit ke metrics_dead.json lalu
+        hapus filenya: total tetap naik, file tidak menumpuk dan PID yang dipakai
+        ulang worker baru tidak menimpa angka worker lama. Hanya dipanggil master.
+        """
+        path = self._path(pid)
+        if not os.path.exists(path):
+            return
+        dead_path = os.path.join(self.metrics_dir, DEAD_SNAPSHOT)
+        try:
+            counters, histograms = {}, {}
+            for snap_path in (dead_path, path):
+                _merge(_read(snap_path), counters, histograms)
+            self._write(dead_path, _snapshot(counters, histograms))
+            os.remove(path)
+        except Exception as e:
+            logger.warning(f"⚠️ Gagal menggabungkan metrics worker {pid}: {e}")
+
+    def collect(self):
+        """Gabungkan snapshot semua worker (termasuk snapshot terbaru worker ini)"""
+        self.flush(force=True)
+        counters = {}
+        histograms = {}
+        for path in glob.glob(os.path.join(self.metrics_dir, "metrics_*.json")):
+            _merge(_read(path), counters, histograms)
+        return counters, histograms
+
+    def _path(self, pid):
+        return os.path.join(self.metrics_dir, f"metrics_{pid}.json")
+
+    @staticmethod
+    def _write(path, snap):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(snap, f)
+        os.replace(tmp_path, path)
+
+    def render_prometheus(self):
+        """Semua metrics dalam format teks Prometheus (text/plain; version=0.0.4)"""
+        counters, histograms = self.collect()
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            elif kind == "gauge":
+                if name in self._gauges:
+                    try:
+                        lines.append(f"{name} {_number(self._gauges[name]())}")
+                    except Exception as e:
+                        logger.warning(f"⚠️ Gagal membaca gauge {name}: {e}")
+            else:
+                for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, bucket_count in zip(buckets, counts):
+                        lines.append(f"{name}_bucket{_labels(labels, le=_number(bound))} {bucket_count}")
+                    lines.append(f"{name}_bucket{_labels(labels, le='+Inf')} {count}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                    lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+def _snapshot(counters, histograms):
+    return {
+        "counters": [[name, dict(labels), value] for (name, labels), value in counters.items()],
+        "histograms": [
+            [name, dict(labels), list(hist[0]), hist[1], hist[2]]
+            for (name, labels), hist in histograms.items()
+        ],
+    }
+
+def _read(path):
+    """Isi satu file snapshot, {} jika tidak ada / tidak terbaca"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _merge(snap, counters, histograms):
+    """Jumlahkan counter dan bucket histogram ``snap`` ke ``counters``/``histograms``"""
+    for name, labels, value in snap.get("counters", []):
+        key = (name, tuple(sorted(labels.items())))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, buckets, total, count in snap.get("histograms", []):
+        key = (name, tuple(sorted(labels.items())))
+        hist = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+        hist[0] = [a + b for a, b in zip(hist[0], buckets)]
+        hist[1] += total
+        hist[2] += count
+
+def _labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    escaped = ",".join(
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for key, value in items
+    )
+    return "{" + escaped + "}"
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+# Registry global per proses
+registry = Registry()
+
+@contextmanager
+def timed(stage, timings=None):
+    """
+    Ukur durasi satu stage pipeline: dicatat di histogram
+    easyocr_stage_duration_seconds dan (opsional) di dict timings sebagai '<stage>_ms'
+    (dijumlahkan jika stage yang sama berjalan lebih dari sekali).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe("easyocr_stage_duration_seconds", elapsed, stage=stage)
+        if timings is not None:
+            key = f"{stage}_ms"
+            timings[key] = round(timings.get(key, 0) + elapsed * 1000, 2)
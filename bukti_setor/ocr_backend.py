@@ -0,0 +1,293 @@
+# bukti_setor/ocr_backend.py - Backend OCR yang bisa diganti-ganti
+# -*- coding: utf-8 -*-
+#
+# "tesserocr"   : handle TessBaseAPI yang hidup terus di dalam proses worker.
+#                 traineddata hanya di-load sekali, halaman dikirim langsung
+#                 sebagai buffer numpy (tanpa subprocess dan file PNG sementara).
+# "pytesseract" : fallback lama, menjalankan binary tesseract per halaman.
+#
+# Selain teks (image_to_string), kedua backend bisa mengembalikan kata beserta
+# bounding box dan confidence (image_to_data) untuk tahap layout, serta
+# deteksi orientasi halaman lewat Tesseract OSD (detect_orientation) yang hanya
+# dipakai sebagai fallback estimasi cepat di preprocess.py.
+
+import logging
+import shlex
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:  # terpasang di image Docker; lokal butuh libtesseract-dev saat pip install
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+def parse_tesseract_config(config):
+    """
+    Pecah string config gaya CLI ('--oem 3 --psm 6 -l ind+eng -c key=val')
+    menjadi dict {'oem': 3, 'psm': 6, 'lang': 'ind+eng', 'variables': {...}}
+    """
+    parsed = {"oem": None, "psm": None, "lang": None, "variables": {}}
+    tokens = shlex.split(config or "")
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        value = tokens[i + 1] if i + 1 < len(tokens) else None
+        if token == "--oem" and value is not None:
+            parsed["oem"] = int(value)
+            i += 2
+        elif token == "--psm" and value is not None:
+            parsed["psm"] = int(value)
+            i += 2
+        elif token == "-l" and value is not None:
+            parsed["lang"] = value
+            i += 2
+        elif token == "-c" and value is not None and "=" in value:
+            key, val = value.split("=", 1)
+            parsed["variables"][key] = val
+            i += 2
+        else:
+            i += 1
+    return parsed
+
+class OCRBackend:
+    """Interface backend OCR: terima numpy array (grayscale/BGR), kembalikan teks"""
+
+    name = "base"
+
+    def image_to_string(self, image, config=None):
+        raise NotImplementedError
+
+    def image_to_data(self, image, config=None):
+        """
+        Daftar kata hasil OCR: dict text, conf, left, top, width, height,
+        block, par, line (nomor blok/paragraf/baris dimulai dari 1).
+        """
+        raise NotImplementedError
+
+    def detect_orientation(self, image):
+        """
+        Putaran searah jarum jam (0/90/180/270) agar halaman tegak, menurut
+        Tesseract OSD. None jika OSD tidak tersedia (osd.traineddata) atau
+        teks terlalu sedikit untuk diputuskan.
+        """
+        return None
+
+    def warm_up(self):
+        """Jalankan OCR pada gambar kosong agar model sudah ter-load sebelum request pertama"""
+        self.image_to_string(np.full((32, 32), 255, dtype=np.uint8))
+
+    def close(self):
+        pass
+
+class PytesseractBackend(OCRBackend):
+    """Fallback: satu proses tesseract per halaman (lewat pytesseract)"""
+
+    name = "pytesseract"
+
+    def __init__(self, tesseract_config, tesseract_cmd=None):
+        self.tesseract_config = tesseract_config
+        if tesseract_cmd:
+            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+    def image_to_string(self, image, config=None):
+        return pytesseract.image_to_string(image, config=config or self.tesseract_config)
+
+    def image_to_data(self, image, config=None):
+        data = pytesseract.image_to_data(
+            image, config=config or self.tesseract_config, output_type=pytesseract.Output.DICT
+        )
+        words = []
+        for i, text in enumerate(data["text"]):
+            if not text or not text.strip():
+                continue
+            words.append({
+                "text": text,
+                "conf": float(data["conf"][i]),
+                "left": int(data["left"][i]),
+                "top": int(data["top"][i]),
+                "width": int(data["width"][i]),
+                "height": int(data["height"][i]),
+                "block": int(data["block_num"][i]),
+                "par": int(data["par_num"][i]),
+                "line": int(data["line_num"][i]),
+            })
+        return words
+
+    def detect_orientation(self, image):
+        try:
+            osd = pytesseract.image_to_osd(image, output_type=pytesseract.Output.DICT)
+        except Exception as e:
+            logger.debug(f"OSD gagal: {e}")
+            return None
+        return int(osd["rotate"]) % 360
+
+class TesserocrBackend(OCRBackend):
+    """
+    Engine Tesseract persisten di dalam proses.
+
+    Satu handle PyTessBaseAPI per thread (TessBaseAPI tidak thread-safe),
+    dibuat sekali lalu dipakai ulang untuk semua halaman berikutnya.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, tesseract_config, tessdata_path=None):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr tidak terpasang")
+        self.tesseract_config = tesseract_config
+        self.tessdata_path = tessdata_path
+        self.defaults = parse_tesseract_config(tesseract_config)
+        self._local = threading.local()
+        self._apis = []
+        self._lock = threading.Lock()
+
+    def _api(self):
+        api = getattr(self._local, "api", None)
+        if api is None:
+            kwargs = {"lang": self.defaults["lang"] or "eng"}
+            if self.tessdata_path:
+                kwargs["path"] = self.tessdata_path
+            # tesserocr.PSM / OEM hanya kumpulan konstanta int, bukan enum yang bisa dipanggil
+            if self.defaults["psm"] is not None:
+                kwargs["psm"] = int(self.defaults["psm"])
+            if self.defaults["oem"] is not None:
+                kwargs["oem"] = int(self.defaults["oem"])
+            api = tesserocr.PyTessBaseAPI(**kwargs)
+            for key, val in self.defaults["variables"].items():
+                api.SetVariable(key, val)
+            self._local.api = api
+            with self._lock:
+                self._apis.append(api)
+            logger.info(f"🔧 Tesseract engine siap di thread {threading.current_thread().name}")
+        return api
+
+    def _osd_api(self):
+        """Engine OSD terpisah per thread (lang osd, PSM.OSD_ONLY), dibuat saat pertama dibutuhkan"""
+        api = getattr(self._local, "osd_api", None)
+        if api is None:
+            kwargs = {"lang": "osd", "psm": tesserocr.PSM.OSD_ONLY}
+            if self.tessdata_path:
+                kwargs["path"] = self.tessdata_path
+            api = tesserocr.PyTessBaseAPI(**kwargs)
+            self._local.osd_api = api
+            with self._lock:
+                self._apis.append(api)
+        return api
+
+    @contextmanager
+    def _image(self, image, config=None, api=None):
+        """Set gambar (dan override config) ke engine thread ini, lalu bersihkan lagi"""
+        api = api or self._api()
+        image = np.ascontiguousarray(image)
+        if image.ndim == 3:
+            # Tesseract mengharapkan urutan RGB
+            image = np.ascontiguousarray(image[:, :, ::-1])
+        height, width = image.shape[:2]
+        bpp = 1 if image.ndim == 2 else image.shape[2]
+
+        override = parse_tesseract_config(config) if config else None
+        try:
+            if override:
+                if override["psm"] is not None:
+                    api.SetPageSegMode(int(override["psm"]))
+                for key, val in override["variables"].items():
+                    api.SetVariable(key, val)
+            api.SetImageBytes(image.tobytes(), width, height, bpp, width * bpp)
+            yield api
+        finally:
+            api.Clear()
+            if override:
+                # Kembalikan ke setting default engine
+                if override["psm"] is not None and self.defaults["psm"] is not None:
+                    api.SetPageSegMode(int(self.defaults["psm"]))
+                for key in override["variables"]:
+                    api.SetVariable(key, self.defaults["variables"].get(key, ""))
+
+    def image_to_string(self, image, config=None):
+        with self._image(image, config) as api:
+            return api.GetUTF8Text()
+
+    def image_to_data(self, image, config=None):
+        with self._image(image, config) as api:
+            api.Recognize()
+            iterator = api.GetIterator()
+            words = []
+            if iterator is None:
+                return words
+
+            level = tesserocr.RIL.WORD
+            block = par = line = 0
+            while True:
+                if iterator.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+                    block, par, line = block + 1, 0, 0
+                if iterator.IsAtBeginningOf(tesserocr.RIL.PARA):
+                    par, line = par + 1, 0
+                if iterator.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                    line += 1
+
+                text = iterator.GetUTF8Text(level)
+                box = iterator.BoundingBox(level)
+                if text and text.strip() and box:
+                    x1, y1, x2, y2 = box
+                    words.append({
+                        "text": text,
+                        "conf": float(iterator.Confidence(level)),
+                        "left": x1,
+                        "top": y1,
+                        "width": x2 - x1,
+                        "height": y2 - y1,
+                        "block": block,
+                        "par": par,
+                        "line": line,
+                    })
+                if not iterator.Next(level):
+                    break
+            return words
+
+    def detect_orientation(self, image):
+        try:
+            with self._image(image, api=self._osd_api()) as api:
+                osd = api.DetectOrientationScript()
+        except Exception as e:
+            logger.debug(f"OSD gagal: {e}")
+            return None
+        if not osd:
+            return None
+        # orient_deg = orientasi teks; putaran koreksinya seperti "Rotate:" di output tesseract
+        return (360 - int(osd["orient_deg"])) % 360
+
+    def close(self):
+        with self._lock:
+            for api in self._apis:
+                api.End()
+            self._apis = []
+        self._local = threading.local()
+
+def get_ocr_backend(name, tesseract_config, tesseract_cmd=None, tessdata_path=None):
+    """
+    Buat backend OCR sesuai nama ('auto', 'tesserocr', 'pytesseract').
+    'auto' memilih tesserocr jika tersedia, selain itu pytesseract.
+    """
+    name = (name or "auto").lower()
+    if name in ("auto", "tesserocr") and tesserocr is not None:
+        try:
+            backend = TesserocrBackend(tesseract_config, tessdata_path=tessdata_path)
+            backend._api()  # load traineddata sekarang, bukan di request pertama
+            logger.info("⚡ OCR backend: tesserocr (engine persisten)")
+            return backend
+        except Exception as e:
+            logger.warning(f"⚠️ tesserocr gagal diinisialisasi, fallback ke pytesseract: {e}")
+    elif name in ("auto", "tesserocr"):
+        # Image Docker memasang tesserocr; sampai di sini berarti build-nya tidak lengkap
+        logger.warning(
+            f"⚠️ OCR_BACKEND={name} tetapi tesserocr tidak terpasang (butuh libtesseract-dev & "
+            "libleptonica-dev saat pip install), fallback ke pytesseract: satu subprocess + file "
+            "sementara per halaman"
+        )
+
+    logger.info("🐢 OCR backend: pytesseract (subprocess per halaman)")
+    return PytesseractBackend(tesseract_config, tesseract_cmd=tesseract_cmd)
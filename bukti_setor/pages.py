@@ -0,0 +1,237 @@
+# bukti_setor/pages.py - Sumber halaman streaming untuk PDF/gambar
+# -*- coding: utf-8 -*-
+#
+# Halaman PDF di-render satu per satu (pdftoppm per halaman) sehingga RSS
+# tidak tumbuh dengan jumlah halaman, dan render halaman N+1 bisa berjalan
+# bersamaan dengan OCR halaman N lewat prefetch_pages().
+#
+# DPI render bisa dipilih otomatis: halaman pertama di-render kecil (probe)
+# untuk mengukur tinggi huruf, lalu semua halaman di-render pada DPI yang
+# langsung menghasilkan tinggi huruf target preprocess.py (tanpa render 200 DPI
+# yang kemudian diperkecil lagi).
+#
+# PDF yang ada di memori (upload) dikirim ke pdfinfo/pdftoppm lewat stdin dan
+# halaman dibaca dari stdout (PPM), tanpa ditulis ke file sementara. Gambar
+# di-decode langsung dari buffer (decode_image).
+
+import os
+import re
+import math
+import logging
+import queue
+import subprocess
+import threading
+from functools import partial
+from io import BytesIO
+import cv2
+import numpy as np
+from PIL import Image
+from pdf2image import convert_from_path, pdfinfo_from_path
+from bukti_setor.metrics import registry, timed
+from bukti_setor.preprocess import SCALE_TOLERANCE, estimate_text_height, to_gray
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PDF_DPI = 200
+# DPI probe untuk mengukur tinggi huruf, dan rentang DPI yang boleh dipilih
+PROBE_DPI = 100
+MIN_PDF_DPI = 100
+MAX_PDF_DPI = 400
+
+# Gambar di-decode apa adanya (grayscale tetap 1 channel), tanpa rotasi EXIF
+IMDECODE_FLAGS = cv2.IMREAD_ANYCOLOR | cv2.IMREAD_IGNORE_ORIENTATION
+JPEG_MAGIC = b"\xff\xd8\xff"
+PDF_MAGIC = b"%PDF-"
+
+def choose_pdf_dpi(probe, probe_dpi=PROBE_DPI, fallback_dpi=DEFAULT_PDF_DPI, target_text_height=None, max_pixels=None):
+    """
+    DPI render agar tinggi huruf halaman = ``target_text_height``, diukur dari
+    ``probe`` (PIL image yang di-render pada ``probe_dpi``). Jika tinggi huruf
+    tidak terukur dipakai ``fallback_dpi``. Tetap dibatasi ``max_pixels``.
+    """
+    gray = to_gray(probe)
+    text_height = estimate_text_height(gray)
+    if text_height:
+        dpi = probe_dpi * target_text_height / text_height
+    else:
+        dpi = fallback_dpi
+    dpi = min(max(dpi, MIN_PDF_DPI), MAX_PDF_DPI)
+    if max_pixels:
+        dpi = min(dpi, probe_dpi * math.sqrt(max_pixels / (gray.shape[0] * gray.shape[1])))
+    return int(round(dpi))
+
+def count_pdf_pages(filepath, poppler_path=None):
+    """Jumlah halaman PDF (lewat pdfinfo, tanpa me-render apa pun)"""
+    info = pdfinfo_from_path(filepath, poppler_path=poppler_path)
+    return int(info.get("Pages", 0))
+
+def pdf_layout(filepath=None, data=None, poppler_path=None):
+    """
+    (jumlah halaman, (lebar, tinggi) halaman pertama dalam point) dari pdfinfo,
+    tanpa me-render. (None, None) jika PDF tidak bisa dibaca.
+    """
+    try:
+        if data is not None:
+            info = pdfinfo_stdin(data, poppler_path=poppler_path)
+        else:
+            info = pdfinfo_from_path(filepath, poppler_path=poppler_path)
+    except Exception as e:
+        logger.debug(f"pdfinfo gagal: {e}")
+        return None, None
+    match = re.match(r"\s*([\d.]+)\s*x\s*([\d.]+)", str(info.get("Page size", "")))
+    size = (float(match.group(1)), float(match.group(2))) if match else None
+    return int(info.get("Pages", 0)) or None, size
+
+def iter_pdf_pages(filepath, dpi=DEFAULT_PDF_DPI, max_pages=None, poppler_path=None,
+                   target_text_height=None, max_pixels=None, total_pages=None):
+    """
+    Iterator halaman PDF sebagai PIL image, di-render satu halaman per langkah.
+
+    pdfinfo dijalankan langsung (bukan saat iterasi) supaya PDF rusak langsung
+    gagal di sini. Halaman yang gagal di-render menghasilkan objek Exception
+    agar halaman lain tetap diproses.
+
+    Dengan ``target_text_height`` DPI dipilih otomatis dari probe halaman
+    pertama (lihat choose_pdf_dpi); ``dpi`` menjadi fallback.
+
+    ``total_pages`` dari pdfinfo sebelumnya (mis. saat estimasi biaya memori)
+    dipakai langsung tanpa menjalankan pdfinfo lagi.
+    """
+    total = total_pages or count_pdf_pages(filepath, poppler_path=poppler_path)
+    if max_pages:
+        total = min(total, max_pages)
+    render = partial(render_pdf_page, filepath, poppler_path=poppler_path)
+    return _render_pages(render, total, dpi, target_text_height, max_pixels)
+
+def iter_pdf_pages_from_bytes(data, dpi=DEFAULT_PDF_DPI, max_pages=None, poppler_path=None,
+                              target_text_height=None, max_pixels=None, total_pages=None):
+    """Seperti iter_pdf_pages, untuk isi PDF di memori (dikirim ke poppler lewat stdin)"""
+    total = total_pages or int(pdfinfo_stdin(data, poppler_path=poppler_path).get("Pages", 0))
+    if max_pages:
+        total = min(total, max_pages)
+    render = partial(_render_stdin, data, poppler_path=poppler_path)
+    return _render_pages(render, total, dpi, target_text_height, max_pixels)
+
+def render_pdf_page(filepath, page_num, dpi, poppler_path=None):
+    """Render satu halaman PDF di disk pada ``dpi`` (PIL image)"""
+    return convert_from_path(
+        filepath, dpi=dpi, first_page=page_num, last_page=page_num,
+        poppler_path=poppler_path
+    )[0]
+
+def _poppler(name, args, data, poppler_path=None):
+    """Jalankan utilitas poppler dengan PDF dari stdin ('-'), return stdout"""
+    command = os.path.join(poppler_path, name) if poppler_path else name
+    env = None
+    if poppler_path:
+        env = dict(os.environ, LD_LIBRARY_PATH=poppler_path + ":" + os.environ.get("LD_LIBRARY_PATH", ""))
+    proc = subprocess.run([command, *args, "-"], input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{name} gagal: {proc.stderr.decode('utf-8', 'replace').strip()}")
+    return proc.stdout
+
+def pdfinfo_stdin(data, poppler_path=None):
+    """pdfinfo untuk isi PDF di memori, hasilnya dict seperti pdfinfo_from_path"""
+    info = {}
+    for line in _poppler("pdfinfo", [], data, poppler_path).decode("utf-8", "replace").splitlines():
+        key, sep, value = line.partition(":")
+        if sep:
+            info[key.strip()] = value.strip()
+    if "Pages" not in info:
+        raise RuntimeError("pdfinfo tidak mengembalikan jumlah halaman")
+    return info
+
+def _render_stdin(data, page_num, dpi, poppler_path=None):
+    # Tanpa PPM-root pdftoppm menulis halaman (PPM) ke stdout
+    ppm = _poppler("pdftoppm", ["-f", str(page_num), "-l", str(page_num), "-r", str(dpi)], data, poppler_path)
+    page = Image.open(BytesIO(ppm))
+    page.load()
+    return page
+
+def decode_image(data):
+    """
+    Gambar (bytes) -> halaman langsung dari buffer, tanpa file sementara.
+    JPEG lewat PIL (libjpeg-turbo, lebih cepat dari cv2.imdecode untuk scan
+    JPEG), format lain (PNG) lewat cv2.imdecode sebagai numpy BGR/grayscale.
+    """
+    if bytes(data[:3]) != JPEG_MAGIC:
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), IMDECODE_FLAGS)
+        if image is not None:
+            return image
+    # BytesIO atas bytes berbagi buffer; setelah load() tidak ada file yang terkunci
+    image = Image.open(BytesIO(data))
+    image.load()
+    return image
+
+def read_image(filepath):
+    """Seperti decode_image, untuk gambar di disk"""
+    return decode_image(np.fromfile(filepath, dtype=np.uint8))
+
+def _render_pages(render, total, dpi, target_text_height=None, max_pixels=None):
+    for page_num in range(1, total + 1):
+        timings = {}
+        try:
+            with timed("render", timings):
+                if target_text_height and page_num == 1:
+                    # Satu dokumen biasanya satu ukuran huruf: DPI halaman pertama dipakai semua halaman
+                    probe = render(1, PROBE_DPI)
+                    dpi = choose_pdf_dpi(probe, PROBE_DPI, dpi, target_text_height, max_pixels)
+                    if abs(dpi / PROBE_DPI - 1.0) <= SCALE_TOLERANCE:
+                        dpi, page = PROBE_DPI, probe
+                    else:
+                        page = render(1, dpi)
+                else:
+                    page = render(page_num, dpi)
+            # Durasi & DPI render ikut dibawa halaman sampai ke hasil per halaman
+            page.info["render_ms"] = timings["render_ms"]
+            page.info["render_dpi"] = dpi
+            yield page
+        except Exception as e:
+            logger.error(f"❌ Render error page {page_num}: {e}")
+            registry.inc("easyocr_errors_total", stage="render")
+            yield e
+
+_SELESAI = object()
+
+def prefetch_pages(pages, depth=1):
+    """
+    Render halaman berikutnya di background thread selagi halaman sekarang
+    diproses. Paling banyak ``depth`` halaman menunggu di antrian.
+    """
+    antrian = queue.Queue(maxsize=depth)
+    berhenti = threading.Event()
+
+    def producer():
+        try:
+            for page in pages:
+                while not berhenti.is_set():
+                    try:
+                        antrian.put(page, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if berhenti.is_set():
+                    break
+        except Exception as e:
+            antrian.put(e)
+        finally:
+            if hasattr(pages, "close"):
+                pages.close()
+            antrian.put(_SELESAI)
+
+    thread = threading.Thread(target=producer, name="pdf-render", daemon=True)
+    thread.start()
+    try:
+        while True:
+            page = antrian.get()
+            if page is _SELESAI:
+                break
+            yield page
+    finally:
+        berhenti.set()
+        # Kosongkan antrian agar producer tidak tertahan di put()
+        while thread.is_alive():
+            try:
+                antrian.get(timeout=0.1)
+            except queue.Empty:
+                pass
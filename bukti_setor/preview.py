@@ -0,0 +1,529 @@
+# bukti_setor/preview.py - Preview halaman: hash dulu, encode di background
+# -*- coding: utf-8 -*-
+#
+# Sebelumnya setiap halaman dikonversi ke RGB, di-encode JPEG resolusi penuh
+# lalu di-MD5 di dalam loop OCR, baru kemudian dicek apakah file sudah ada.
+# Sekarang:
+#   - nama file = hash dari hash isi upload + nomor halaman (+ setting encode),
+#     yang sudah dihitung processor untuk cache hasil, sehingga halaman yang
+#     sama tidak pernah di-encode dua kali dan isi satu nama tidak pernah
+#     berubah (immutable); piksel halaman hanya di-hash jika sumbernya tidak diketahui;
+#   - file disimpan per shard: previews/ab/cd/abcd....webp;
+#   - yang disimpan adalah thumbnail berukuran terbatas (WebP jika didukung);
+#     versi resolusi penuh (JPEG, encode WebP resolusi penuh puluhan kali lebih
+#     lambat) untuk GET /uploads/<nama>?size=full baru di-render dari salinan
+#     dokumen asal saat pertama diminta, dari worker mana pun (on_demand);
+#   - encoding berjalan di thread background, request OCR tidak menunggu encode;
+#     halaman yang menunggu encode dibatasi total byte pikselnya (max_pending_bytes),
+#     selebihnya di-encode langsung agar antrian tidak menahan memori tanpa batas;
+#   - index SQLite (dipakai bersama semua worker) mencatat ukuran dan akses
+#     terakhir: total ukuran dijaga di bawah budget (LRU + umur maksimum),
+#     kecuali preview yang dirujuk baris BuktiSetor tersimpan (preview_refs).
+
+import os
+import re
+import time
+import shutil
+import hashlib
+import logging
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from PIL import Image, features
+from bukti_setor.metrics import registry, timed
+from bukti_setor.pages import DEFAULT_PDF_DPI, PDF_MAGIC, read_image, render_pdf_page
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_DIR = "previews"
+EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+FULL_SUFFIX = "_full"
+FULL_EXT = "jpg"
+# on_demand = render penuh dari dokumen asal saat pertama diminta, eager = ditulis
+# bersama thumbnail, off = hanya thumbnail
+FULL_SIZE_MODES = ("on_demand", "eager", "off")
+# Salinan dokumen asal (mode on_demand), ikut index dan budget ukuran preview
+SOURCE_DIR = "sources"
+NAME_PATTERN = re.compile(r"^([0-9a-f]{64})(_full)?\.(webp|jpg)$")
+
+# Akses terakhir hanya ditulis ulang jika sudah lebih lama dari ini (detik)
+TOUCH_INTERVAL = 3600
+# Eviction dicek paling sering sekali per interval ini, lalu dikosongkan sampai 90% budget
+EVICT_INTERVAL = 60
+EVICT_LOW_WATERMARK = 0.9
+
+def preview_format(name=None):
+    """'webp' atau 'jpeg'; WebP jatuh ke JPEG jika Pillow dibuild tanpa libwebp"""
+    name = (name or "webp").lower()
+    name = "jpeg" if name == "jpg" else name
+    if name not in EXTENSIONS:
+        raise ValueError(f"Format preview tidak dikenal: {name}")
+    if name == "webp" and not features.check("webp"):
+        logger.warning("⚠️ Pillow tanpa dukungan WebP, preview disimpan sebagai JPEG")
+        return "jpeg"
+    return name
+
+def hash_page(source, page_num, salt=""):
+    """Hash nama preview dari identitas dokumen (hash isi upload) dan nomor halaman"""
+    return hashlib.sha256(f"{salt}{source}|{page_num}".encode("utf-8")).hexdigest()
+
+def hash_pixels(image, salt=""):
+    """Hash penuh isi piksel halaman (PIL image atau numpy array), tanpa encode"""
+    h = hashlib.sha256(salt.encode("utf-8"))
+    if isinstance(image, np.ndarray):
+        image = np.ascontiguousarray(image)
+        h.update(f"{image.shape}|{image.dtype}|".encode("utf-8"))
+        h.update(image.data)
+    else:
+        h.update(f"{image.mode}|{image.size}|".encode("utf-8"))
+        h.update(image.tobytes())
+    return h.hexdigest()
+
+def full_name(name):
+    """Nama file render resolusi penuh (JPEG) dari nama thumbnail"""
+    return f"{os.path.splitext(name)[0]}{FULL_SUFFIX}.{FULL_EXT}"
+
+def base_name(name):
+    """Hash preview dari nama thumbnail atau render penuh (kunci rujukan)"""
+    return name[:64]
+
+def to_rgb(image):
+    """PIL image (mode apa pun) atau numpy BGR/gray -> PIL RGB"""
+    if isinstance(image, np.ndarray):
+        if image.ndim == 2:
+            return Image.fromarray(image).convert("RGB")
+        code = cv2.COLOR_BGRA2RGB if image.shape[2] == 4 else cv2.COLOR_BGR2RGB
+        return Image.fromarray(cv2.cvtColor(image, code))
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+def image_bytes(image):
+    """Ukuran piksel halaman di memori (PIL image atau numpy array)"""
+    if isinstance(image, np.ndarray):
+        return image.nbytes
+    width, height = image.size
+    return width * height * len(image.getbands())
+
+def thumbnail(image, max_size):
+    """Perkecil proporsional sampai sisi terpanjang <= max_size (tanpa mengubah ``image``)"""
+    width, height = image.size
+    scale = max_size / max(width, height)
+    if scale >= 1:
+        return image
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+class PreviewStore:
+    """
+    Preview content-addressed per upload folder. submit() hanya menghitung
+    nama file dan langsung mengembalikannya; thumbnail di-encode oleh thread
+    background. Render resolusi penuh dibuat saat pertama diminta dari salinan
+    dokumen asal (full_size="on_demand"), bersama thumbnail ("eager") atau tidak
+    sama sekali ("off").
+    """
+
+    def __init__(self, folder, fmt="webp", max_size=1024, quality=80, full_size="on_demand",
+                 workers=1, max_pending_bytes=128 * 1024 * 1024, max_bytes=1024 * 1024 * 1024, max_age_days=30,
+                 poppler_path=None):
+        if full_size not in FULL_SIZE_MODES:
+            raise ValueError(f"PREVIEW_FULL_SIZE harus salah satu dari {', '.join(FULL_SIZE_MODES)}")
+        self.root = os.path.join(folder, PREVIEW_DIR)
+        os.makedirs(self.root, exist_ok=True)
+        self.format = preview_format(fmt)
+        self.ext = EXTENSIONS[self.format]
+        self.max_size = max_size
+        self.quality = quality
+        self.full_size = full_size
+        self.poppler_path = poppler_path
+        self.max_pending_bytes = max_pending_bytes
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        # Setting encode ikut di-hash: nama yang sama selalu berisi byte yang sama
+        self.salt = f"{self.format}|{max_size}|{quality}|"
+
+        self._executor = (
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preview") if workers > 0 else None
+        )
+        self._pending = {}              # nama -> Future encode yang belum selesai
+        self._pending_bytes = 0         # total piksel halaman yang ditahan antrian encode
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._last_evict = 0.0
+
+        self.db_path = os.path.join(self.root, "index.sqlite3")
+        try:
+            conn = self._conn()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS previews ("
+                "name TEXT PRIMARY KEY, size INTEGER NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_previews_last_access ON previews (last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS preview_refs (name TEXT PRIMARY KEY, refs INTEGER NOT NULL)")
+            # Asal halaman tiap thumbnail untuk render penuh on_demand: salinan dokumen + DPI render
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS preview_pages ("
+                "name TEXT PRIMARY KEY, source TEXT NOT NULL, page INTEGER NOT NULL, dpi INTEGER)"
+            )
+            conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ Index preview tidak tersedia, eviction dimatikan: {e}")
+            self.db_path = None
+
+    def _conn(self):
+        """Koneksi SQLite per thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def path(self, name):
+        """Path file untuk nama preview content-addressed, None jika bukan nama preview"""
+        if not name or not NAME_PATTERN.match(name):
+            return None
+        return os.path.join(self.root, name[:2], name[2:4], name)
+
+    def _file_path(self, name):
+        """Path file untuk nama di index: preview, atau salinan dokumen asal (tidak di-serve)"""
+        if name.startswith(SOURCE_DIR + "/"):
+            base = name[len(SOURCE_DIR) + 1:]
+            return os.path.join(self.root, SOURCE_DIR, base[:2], base)
+        return self.path(name)
+
+    @staticmethod
+    def source_name(source):
+        """Nama index salinan dokumen asal untuk identitas dokumen ``source``"""
+        return f"{SOURCE_DIR}/{hashlib.sha256(source.encode('utf-8')).hexdigest()}"
+
+    def keep_source(self, source, data=None, filepath=None):
+        """
+        Simpan salinan dokumen asal (bytes upload atau file) untuk halaman-halaman
+        ``source``, agar render resolusi penuh bisa dibuat saat pertama diminta.
+        Hanya untuk mode on_demand; dokumen yang sama cukup disalin sekali.
+        """
+        if self.full_size != "on_demand" or not self.db_path:
+            return
+        name = self.source_name(source)
+        if os.path.exists(self._file_path(name)):
+            return
+        try:
+            if data is not None:
+                self._write_file(name, lambda f: f.write(data))
+            else:
+                with open(filepath, "rb") as src:
+                    self._write_file(name, lambda f: shutil.copyfileobj(src, f))
+        except Exception as e:
+            logger.warning(f"⚠️ Gagal menyimpan dokumen asal preview: {e}")
+
+    @staticmethod
+    def etag(name):
+        """ETag kuat: nama sudah berisi hash isi (dan setting encode)"""
+        return os.path.splitext(name)[0]
+
+    def submit(self, image, page_num=1, original_filename="preview", source=None):
+        """
+        Nama file preview untuk halaman ``image``; encoding berjalan di
+        background (sinkron jika antrian sudah menahan max_pending_bytes). None jika gagal.
+
+        ``source`` = identitas dokumen asal (hash isi upload), nama dihitung dari
+        itu dan ``page_num``; tanpa ``source`` seluruh piksel halaman di-hash.
+        """
+        try:
+            if source is not None:
+                name = f"{hash_page(source, page_num, self.salt)}.{self.ext}"
+            else:
+                name = f"{hash_pixels(image, self.salt)}.{self.ext}"
+        except Exception as e:
+            logger.error(f"❌ Gagal hash preview {original_filename} hal {page_num}: {e}")
+            registry.inc("easyocr_preview_events_total", event="error")
+            return None
+
+        with self._lock:
+            if name in self._pending or os.path.exists(self.path(name)):
+                registry.inc("easyocr_preview_events_total", event="duplicate")
+                return name
+            size = image_bytes(image)
+            sync = self._executor is None or self._pending_bytes + size > self.max_pending_bytes
+            if not sync:
+                self._pending_bytes += size
+                self._pending[name] = self._executor.submit(self._encode, name, image, source, page_num, size)
+
+        if sync:
+            self._encode(name, image, source, page_num)
+        registry.inc("easyocr_preview_events_total", event="sync" if sync else "queued")
+        return name
+
+    def wait(self, name, timeout=None):
+        """Tunggu encode preview ``name`` jika masih antri di worker ini"""
+        with self._lock:
+            future = self._pending.get(name)
+        if future is None:
+            return
+        try:
+            future.result(timeout=timeout)
+        except Exception as e:
+            logger.warning(f"⚠️ Preview {name} belum siap: {e}")
+
+    def full(self, name):
+        """
+        Path render resolusi penuh untuk thumbnail ``name``; pada mode on_demand
+        di-render dari dokumen asal jika belum ada. None jika tidak tersedia
+        (full_size="off", preview tanpa dokumen asal, atau sudah di-evict).
+        """
+        path = self.path(full_name(name))
+        if path is None:
+            return None
+        if os.path.exists(path):
+            return path
+        if self.full_size == "on_demand":
+            return self._render_full(name)
+        return None
+
+    def _render_full(self, name):
+        """Render halaman dari salinan dokumen asal lalu simpan sebagai JPEG; path atau None"""
+        if not self.db_path:
+            return None
+        try:
+            row = self._conn().execute(
+                "SELECT source, page, dpi FROM preview_pages WHERE name = ?", (name,)
+            ).fetchone()
+            if row is None:
+                return None
+            source, page_num, dpi = row
+            source_path = self._file_path(source)
+            if not os.path.exists(source_path):
+                return None
+            with timed("preview_full"):
+                with open(source_path, "rb") as f:
+                    is_pdf = f.read(len(PDF_MAGIC)) == PDF_MAGIC
+                if is_pdf:
+                    image = render_pdf_page(source_path, page_num, dpi or DEFAULT_PDF_DPI, poppler_path=self.poppler_path)
+                else:
+                    image = read_image(source_path)
+                self._write(full_name(name), to_rgb(image), fmt="jpeg")
+        except Exception as e:
+            logger.error(f"❌ Gagal render preview penuh {name}: {e}")
+            registry.inc("easyocr_preview_events_total", event="error")
+            return None
+        registry.inc("easyocr_preview_events_total", event="full_rendered")
+        self.touch(source)
+        self._maybe_evict()
+        return self.path(full_name(name))
+
+    def touch(self, name):
+        """Catat akses (untuk LRU), paling sering sekali per TOUCH_INTERVAL per preview"""
+        if not self.db_path:
+            return
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute(
+                "UPDATE previews SET last_access = ? WHERE name = ? AND last_access < ?",
+                (now, name, now - TOUCH_INTERVAL)
+            )
+            conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ Index preview write error: {e}")
+
+    def pin(self, *names):
+        """Tandai preview dirujuk baris BuktiSetor (tidak ikut di-evict), satu rujukan per nama"""
+        bases = [(base_name(name),) for name in names if self.path(name) is not None]
+        if not self.db_path or not bases:
+            return
+        try:
+            conn = self._conn()
+            conn.executemany(
+                "INSERT INTO preview_refs (name, refs) VALUES (?, 1) "
+                "ON CONFLICT(name) DO UPDATE SET refs = refs + 1",
+                bases
+            )
+            conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ Index preview write error: {e}")
+
+    def unpin(self, name):
+        """Lepas satu rujukan (baris BuktiSetor dihapus)"""
+        if not self.db_path or self.path(name) is None:
+            return
+        try:
+            conn = self._conn()
+            conn.execute("UPDATE preview_refs SET refs = refs - 1 WHERE name = ?", (base_name(name),))
+            conn.execute("DELETE FROM preview_refs WHERE refs <= 0")
+            conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ Index preview write error: {e}")
+
+    def sync_refs(self, counts):
+        """Samakan rujukan dengan database: ``counts`` = {preview_filename: jumlah baris}"""
+        if not self.db_path:
+            return
+        rows = [(base_name(name), refs) for name, refs in counts.items() if self.path(name) is not None]
+        try:
+            conn = self._conn()
+            with conn:
+                conn.execute("DELETE FROM preview_refs")
+                conn.executemany("INSERT OR REPLACE INTO preview_refs (name, refs) VALUES (?, ?)", rows)
+        except Exception as e:
+            logger.warning(f"⚠️ Index preview write error: {e}")
+
+    def evict(self):
+        """
+        Hapus preview yang tidak dirujuk: yang tidak diakses lebih lama dari
+        max_age, lalu yang paling lama tidak diakses sampai total ukuran di
+        bawah 90% max_bytes. Hasil: jumlah file yang dihapus.
+        """
+        if not self.db_path:
+            return 0
+        conn = self._conn()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM previews").fetchone()[0]
+        batas_umur = time.time() - self.max_age if self.max_age else None
+        if total <= self.max_bytes and batas_umur is None:
+            return 0
+        pinned = {row[0] for row in conn.execute("SELECT name FROM preview_refs WHERE refs > 0")}
+        # Dokumen asal halaman yang dirujuk tetap disimpan agar render penuhnya bisa dibuat
+        pinned.update(row[0] for row in conn.execute(
+            "SELECT DISTINCT p.source FROM preview_pages p "
+            "JOIN preview_refs r ON r.name = substr(p.name, 1, 64) WHERE r.refs > 0"
+        ))
+
+        target = self.max_bytes * EVICT_LOW_WATERMARK if total > self.max_bytes else total
+        dihapus = []
+        for name, size, last_access in conn.execute(
+            "SELECT name, size, last_access FROM previews ORDER BY last_access"
+        ).fetchall():
+            terlalu_tua = batas_umur is not None and last_access < batas_umur
+            if not terlalu_tua and total <= target:
+                break
+            if name in pinned or base_name(name) in pinned:
+                continue
+            try:
+                os.remove(self._file_path(name))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"⚠️ Gagal menghapus preview {name}: {e}")
+                continue
+            total -= size
+            dihapus.append((name,))
+
+        if dihapus:
+            conn.executemany("DELETE FROM previews WHERE name = ?", dihapus)
+            conn.executemany("DELETE FROM preview_pages WHERE name = ?", dihapus)
+            conn.commit()
+            registry.inc("easyocr_preview_events_total", len(dihapus), event="evicted")
+            logger.info(f"🧹 {len(dihapus)} preview dihapus (sisa {total / 1024 / 1024:.1f} MB)")
+        return len(dihapus)
+
+    def stats(self):
+        """Jumlah, ukuran dan rujukan preview di index"""
+        stats = {"format": self.format, "max_bytes": self.max_bytes, "index_enabled": bool(self.db_path)}
+        with self._lock:
+            stats["pending"] = len(self._pending)
+            stats["pending_bytes"] = self._pending_bytes
+        if self.db_path:
+            try:
+                conn = self._conn()
+                stats["entries"], stats["bytes"] = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM previews"
+                ).fetchone()
+                stats["pinned"] = conn.execute("SELECT COUNT(*) FROM preview_refs WHERE refs > 0").fetchone()[0]
+            except Exception:
+                stats["entries"] = stats["bytes"] = stats["pinned"] = None
+        return stats
+
+    def flush(self, timeout=None):
+        """Tunggu semua preview yang masih antri (benchmark, shutdown)"""
+        with self._lock:
+            futures = list(self._pending.values())
+        for future in futures:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _encode(self, name, image, source=None, page_num=1, pending_size=0):
+        try:
+            with timed("preview_encode"):
+                rgb = to_rgb(image)
+                self._write(name, thumbnail(rgb, self.max_size))
+            if self.full_size == "eager":
+                with timed("preview_full"):
+                    self._write(full_name(name), rgb, fmt="jpeg")
+            elif self.full_size == "on_demand" and source is not None:
+                self._record_page(name, source, page_num, image)
+            logger.debug(f"📸 Preview disimpan: {name}")
+        except Exception as e:
+            logger.error(f"❌ Gagal menyimpan preview {name}: {e}")
+            registry.inc("easyocr_preview_events_total", event="error")
+        finally:
+            with self._lock:
+                self._pending.pop(name, None)
+                self._pending_bytes -= pending_size
+        self._maybe_evict()
+
+    def _record_page(self, name, source, page_num, image):
+        """Catat dokumen asal dan DPI render halaman ``name`` (untuk render penuh on_demand)"""
+        if not self.db_path:
+            return
+        dpi = None if isinstance(image, np.ndarray) else image.info.get("render_dpi")
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO preview_pages (name, source, page, dpi) VALUES (?, ?, ?, ?)",
+                (name, self.source_name(source), page_num, dpi)
+            )
+            conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ Index preview write error: {e}")
+
+    def _write(self, name, image, fmt=None):
+        """Encode gambar lalu tulis atomik (lihat _write_file)"""
+        self._write_file(name, lambda f: image.save(f, format=(fmt or self.format).upper(), quality=self.quality))
+
+    def _write_file(self, name, write):
+        """Tulis atomik (file sementara + rename), aman dibaca worker lain, lalu catat di index"""
+        path = self._file_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".preview_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        if self.db_path:
+            now = time.time()
+            try:
+                conn = self._conn()
+                conn.execute(
+                    "INSERT OR REPLACE INTO previews (name, size, created_at, last_access) VALUES (?, ?, ?, ?)",
+                    (name, os.path.getsize(path), now, now)
+                )
+                conn.commit()
+            except Exception as e:
+                logger.warning(f"⚠️ Index preview write error: {e}")
+
+    def _maybe_evict(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_evict < EVICT_INTERVAL:
+                return
+            self._last_evict = now
+        try:
+            self.evict()
+        except Exception as e:
+            logger.warning(f"⚠️ Eviction preview gagal: {e}")
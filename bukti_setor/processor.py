@@ -2,213 +2,772 @@
 # -*- coding: utf-8 -*-
 
 import os
-import gc
+import queue
 import logging
+import time
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 import cv2
 import numpy as np
 import pytesseract
 from flask import jsonify
-from pdf2image import convert_from_path
 from PIL import Image
-from bukti_setor.extractors import (
-    extract_kode_setor, extract_tanggal_setor, 
-    extract_jumlah_setor, extract_ntpn
+from config import Config
+from bukti_setor.cache import ResultCache, hash_bytes, hash_file
+from bukti_setor.metrics import registry, timed
+from bukti_setor.ocr_backend import get_ocr_backend
+from bukti_setor.preprocess import PreprocessPipeline
+from bukti_setor.preview import PreviewStore
+from bukti_setor.pages import (
+    MAX_PDF_DPI, decode_image, iter_pdf_pages, iter_pdf_pages_from_bytes, pdf_layout, prefetch_pages, read_image
 )
-from utils.file_utils import allowed_file, simpan_preview_image
+from bukti_setor.admission import Ticket, estimate_cost, pdf_page_pixels
+from bukti_setor.layout import (
+    FIELD_LABELS, LayoutCache, detect_template, field_words, header_text, lines_to_text,
+    locate_fields, page_confidence, word_confidence, words_to_lines
+)
+from bukti_setor.retry import retry_field
+from bukti_setor.uploads import upload_source
+from bukti_setor.extractors import extract_fields, field_found
+from utils.file_utils import allowed_file
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
 # Memory-optimized OCR configuration
 TESSERACT_CONFIG = '--oem 3 --psm 6 -l ind+eng'
-MAX_IMAGE_SIZE = (1920, 1080)  # Limit image size to save memory
+MAX_PDF_PAGES = Config.MAX_PDF_PAGES  # Limit PDF pages to save memory
+
+# Naikkan setiap kali output pipeline berubah agar hasil cache lama tidak dipakai
+PIPELINE_VERSION = "13"
+
+def default_page_workers():
+    """
+    Jumlah halaman paralel per worker gunicorn.
+    CPU dibagi rata antar worker supaya (workers x pool) tidak melebihi jumlah core.
+    """
+    if Config.OCR_PAGE_WORKERS > 0:
+        return Config.OCR_PAGE_WORKERS
+    cpu = os.cpu_count() or 1
+    return max(1, cpu // max(1, Config.WEB_CONCURRENCY))
+
+# Pipeline default untuk pemanggil lama (benchmark, kode di luar processor)
+_default_pipeline = PreprocessPipeline()
 
-def preprocess_for_ocr(img):
-    """Memory-optimized image preprocessing for OCR"""
+def preprocess_for_ocr(img, buffers=None):
+    """Preprocessing halaman untuk OCR dengan pipeline default (hasil: gambar biner)
+
+    Jika ``buffers`` (dict) diberikan, setiap stage menulis ke buffer yang sama
+    antar halaman sehingga tidak ada alokasi baru.
+    """
     try:
-        # Resize image if too large to save memory
-        height, width = img.shape[:2]
-        if width > MAX_IMAGE_SIZE[0] or height > MAX_IMAGE_SIZE[1]:
-            scale = min(MAX_IMAGE_SIZE[0]/width, MAX_IMAGE_SIZE[1]/height)
-            new_width = int(width * scale)
-            new_height = int(height * scale)
-            img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_AREA)
-            
-        # Convert to grayscale
-        if len(img.shape) == 3:
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = img
-        
-        # Adaptive threshold for better text detection
-        thresh = cv2.adaptiveThreshold(
-            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-            cv2.THRESH_BINARY, 11, 2
-        )
-        
-        # Light noise reduction
-        kernel = np.ones((1,1), np.uint8)
-        thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
-        
-        # Force garbage collection
-        del gray
-        gc.collect()
-        
-        return thresh
-        
+        return _default_pipeline.run(img, buffers)[1]
     except Exception as e:
         logger.error(f"❌ Preprocessing error: {e}")
         # Return original image as fallback
         return img
 
-def process_bukti_setor_file(request, config):
-    """Memory-optimized bukti setor processing"""
-    if "file" not in request.files:
-        return jsonify(error="File tidak ditemukan"), 400
+class PreparedDocument:
+    """
+    Upload yang sudah di-hash dan dicek ke cache hasil (lihat BuktiSetorProcessor.prepare).
 
-    file = request.files["file"]
-    
-    if not allowed_file(file.filename):
-        return jsonify(error="Format file tidak didukung"), 400
+    Dibawa dari estimasi biaya sampai render supaya file cukup di-hash sekali
+    dan pdfinfo cukup dijalankan sekali per dokumen.
+    """
 
-    # Create upload folder if not exists
-    upload_folder = config.get('UPLOAD_FOLDER', 'uploads')
-    os.makedirs(upload_folder, exist_ok=True)
-    
-    # Save temporary file
-    filepath = os.path.join(upload_folder, file.filename)
-    file.save(filepath)
+    def __init__(self, filename, filepath=None, data=None, digest=None):
+        self.filename = filename
+        self.filepath = filepath
+        self.data = data
+        self.digest = digest
+        self.key = None
+        self.cached = None
+        self.pdf_pages = None
 
-    try:
-        logger.info(f"📄 Processing file: {file.filename}")
-        
-        # Convert PDF to images if needed (memory optimized)
-        if file.filename.lower().endswith(".pdf"):
+    @property
+    def is_pdf(self):
+        # File di disk dibuka sesuai ekstensi path-nya, bytes sesuai nama file upload
+        return (self.filepath or self.filename).lower().endswith(".pdf")
+
+class BuktiSetorProcessor:
+    """
+    Engine OCR bukti setor yang dibuat sekali per worker.
+
+    Menyimpan state yang mahal untuk dibuat ulang (engine Tesseract,
+    pattern extractor yang sudah dikompilasi, buffer preprocessing) sehingga
+    endpoint HTTP, CLI, maupun benchmark memakai engine yang sama tanpa biaya
+    setup per request. Semua method mengembalikan dict biasa (tanpa Flask).
+    """
+
+    def __init__(self, upload_folder=None, tesseract_cmd=None, poppler_path=None,
+                 tesseract_config=TESSERACT_CONFIG, max_pages=MAX_PDF_PAGES, ocr_backend=None,
+                 page_workers=None, pdf_dpi=None, cache=None, layout_cache=None, min_confidence=None,
+                 preprocess_stages=None, osd=None, previews=None):
+        self.upload_folder = upload_folder or Config.UPLOAD_FOLDER
+        self.poppler_path = poppler_path or Config.POPPLER_PATH
+        self.tesseract_config = tesseract_config
+        self.max_pages = max_pages
+        self.pdf_dpi = pdf_dpi or Config.PDF_DPI
+
+        # Resolve path Tesseract sekali saja
+        self.tesseract_cmd = tesseract_cmd or Config.TESSERACT_CMD
+        pytesseract.pytesseract.tesseract_cmd = self.tesseract_cmd
+
+        # Engine OCR persisten (tesserocr) atau fallback pytesseract
+        self.ocr = get_ocr_backend(
+            ocr_backend or Config.OCR_BACKEND, self.tesseract_config,
+            tesseract_cmd=self.tesseract_cmd, tessdata_path=Config.TESSDATA_PREFIX
+        )
+
+        # Rangkaian stage preprocessing (grayscale langsung, buffer per thread);
+        # Tesseract OSD hanya fallback untuk orientasi yang tidak bisa diestimasi cepat
+        osd = Config.OCR_OSD_ENABLED if osd is None else osd
+        self.preprocess = PreprocessPipeline(
+            preprocess_stages or Config.OCR_PREPROCESS_STAGES,
+            target_text_height=Config.OCR_TARGET_TEXT_HEIGHT, max_pixels=Config.OCR_MAX_PIXELS,
+            osd=self.ocr.detect_orientation if osd else None
+        )
+
+        # Preview content-addressed: nama dari hash upload + nomor halaman, thumbnail
+        # di-encode di thread background, disimpan per shard dengan budget ukuran
+        self.previews = previews or PreviewStore(
+            self.upload_folder, fmt=Config.PREVIEW_FORMAT, max_size=Config.PREVIEW_MAX_SIZE,
+            quality=Config.PREVIEW_QUALITY, full_size=Config.PREVIEW_FULL_SIZE,
+            workers=Config.PREVIEW_WORKERS, max_pending_bytes=Config.PREVIEW_MAX_PENDING_BYTES,
+            max_bytes=Config.PREVIEW_MAX_BYTES, max_age_days=Config.PREVIEW_MAX_AGE_DAYS,
+            poppler_path=self.poppler_path
+        )
+
+        # Engine ekstraksi satu-lintasan (pattern sudah dikompilasi saat import)
+        self.extract = extract_fields
+
+        # Cache hasil per isi file (cache=False untuk mematikan)
+        if cache is None and Config.OCR_CACHE_ENABLED:
+            cache = ResultCache(
+                max_bytes=Config.OCR_CACHE_MAX_BYTES,
+                db_path=os.path.join(self.upload_folder, "ocr_cache.sqlite3") if Config.OCR_CACHE_DISK else None,
+                disk_max_bytes=Config.OCR_CACHE_DISK_MAX_BYTES,
+                disk_max_age_days=Config.OCR_CACHE_DISK_MAX_AGE_DAYS
+            )
+        self.cache = cache or None
+
+        # Layout field per template: region field yang labelnya tidak terbaca di
+        # halaman diambil dari layout template yang sama untuk retry (lihat layout.py)
+        if layout_cache is None:
+            layout_cache = Config.OCR_LAYOUT_CACHE_ENABLED
+        self.layouts = LayoutCache(Config.OCR_LAYOUT_CACHE_SIZE) if layout_cache else None
+
+        # Field dengan confidence di bawah batas ini (atau tidak ditemukan) dibaca
+        # ulang pada region-nya saja; None = retry dimatikan
+        if min_confidence is None and Config.OCR_RETRY_ENABLED:
+            min_confidence = Config.OCR_MIN_CONFIDENCE
+        self.min_confidence = min_confidence or None
+        self.cache_salt = (
+            f"{PIPELINE_VERSION}|{self.tesseract_config}|{self.max_pages}|{self.pdf_dpi}|"
+            f"{bool(layout_cache)}|{self.min_confidence}|{self.preprocess.name}|{bool(osd)}|"
+            f"{self.preprocess.target_text_height}|{self.preprocess.max_pixels}"
+        )
+
+        # Buffer preprocessing yang dipakai ulang antar halaman (satu set per thread)
+        self._local = threading.local()
+
+        # Pool halaman bersama untuk semua request di worker ini, sekaligus
+        # menjadi batas global jumlah halaman yang diproses bersamaan
+        self.page_workers = page_workers or default_page_workers()
+        self._executor = None
+        if self.page_workers > 1:
+            # Tesseract & OpenCV jangan membuat thread sendiri di atas pool ini
+            os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+            cv2.setNumThreads(1)
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.page_workers, thread_name_prefix="ocr-page"
+            )
+
+        os.makedirs(self.upload_folder, exist_ok=True)
+        logger.info(
+            f"🔧 BuktiSetorProcessor siap (ocr: {self.ocr.name}, config: {self.tesseract_config}, "
+            f"page workers: {self.page_workers})"
+        )
+
+    def prepare(self, filepath=None, data=None, filename=None):
+        """
+        Hash isi file dan cek cache hasil, tanpa membuka dokumen. Dokumen yang
+        sudah ada di cache (``doc.cached``) tidak perlu budget memori OCR.
+        """
+        filename = filename or os.path.basename(filepath)
+        digest = hash_bytes(data) if data is not None else hash_file(filepath)
+        doc = PreparedDocument(filename, filepath=filepath, data=data, digest=digest)
+        if self.cache is not None:
+            # File di disk: ekstensi dari path (jalur PDF/gambar), bytes: dari nama file
+            doc.key = self._cache_key(digest, filepath or filename)
+            cached = self.cache.get(doc.key)
+            if cached is not None:
+                logger.info(f"⚡ Cache hit {doc.key[:12]}, OCR dilewati")
+                doc.cached = self._drop_timings(cached)
+        return doc
+
+    def admit(self, doc, admission, timeout=-1):
+        """
+        Tiket budget memori untuk memproses ``doc`` (lihat AdmissionController.admit).
+        Hasil dari cache tidak di-render, jadi tidak antri / ditolak 503.
+        """
+        if doc.cached is not None or admission is None:
+            return Ticket(admission, None, 0)
+        return admission.admit(self.memory_cost(doc), timeout=timeout)
+
+    def process(self, doc):
+        """Hasil OCR dokumen dari prepare(); hasil yang sukses disimpan ke cache"""
+        if doc.cached is not None:
+            return dict(doc.cached, cached=True)
+        try:
+            images, error = self._open(doc)
+            if error:
+                return error
+            result = self._process_pages(images, doc.filename, self._preview_source(doc))
+
+        except Exception as err:
+            logger.error(f"❌ Processing error: {err}")
+            logger.error(traceback.format_exc())
+            registry.inc("easyocr_errors_total", stage="document")
+            return {"success": False, "error": "Gagal memproses file", "message": str(err)}
+
+        if doc.key is not None and result.get("success"):
+            self.cache.put(doc.key, result)
+        return result
+
+    def process_file(self, filepath, original_filename=None):
+        """Proses file PDF/gambar dari disk"""
+        return self.process(self.prepare(filepath=filepath, filename=original_filename))
+
+    def process_bytes(self, data, filename):
+        """Proses isi file (bytes) tanpa menulis ke disk"""
+        return self.process(self.prepare(data=data, filename=filename))
+
+    def stream(self, doc):
+        """
+        Seperti process, tetapi berupa generator event ``(jenis, data)``:
+        ``("page", hasil_halaman)`` begitu satu halaman selesai, lalu diakhiri
+        ``("summary", ringkasan)`` atau ``("error", error)``.
+        """
+        if doc.cached is not None:
+            for page in doc.cached["data"]:
+                yield "page", page
+            yield "summary", self._summary(doc.cached, cached=True)
+            return
+
+        started = time.perf_counter()
+        try:
+            images, error = self._open(doc)
+            if error:
+                yield "error", error
+                return
+
+            logger.info(f"📄 Processing file: {doc.filename}")
+            hasil_semua_halaman = []
+            for hasil_halaman in self._iter_page_results(images, doc.filename, self._preview_source(doc)):
+                hasil_semua_halaman.append(hasil_halaman)
+                yield "page", hasil_halaman
+
+        except Exception as err:
+            logger.error(f"❌ Processing error: {err}")
+            logger.error(traceback.format_exc())
+            registry.inc("easyocr_errors_total", stage="document")
+            yield "error", {"success": False, "error": "Gagal memproses file", "message": str(err)}
+            return
+
+        result = self._result(hasil_semua_halaman, started)
+        if doc.key is not None:
+            self.cache.put(doc.key, result)
+        yield "summary", self._summary(result)
+
+    def stream_file(self, filepath, original_filename=None):
+        """Versi generator dari process_file (lihat stream)"""
+        return self.stream(self.prepare(filepath=filepath, filename=original_filename))
+
+    def stream_bytes(self, data, filename):
+        """Versi generator dari process_bytes (lihat stream)"""
+        return self.stream(self.prepare(data=data, filename=filename))
+
+    def _open(self, doc):
+        """Sumber halaman dokumen: (halaman, None) atau (None, dict_error)"""
+        if doc.is_pdf:
             try:
-                # Limit PDF pages to save memory
-                images = convert_from_path(filepath, first_page=1, last_page=3)
+                options = dict(
+                    dpi=self.pdf_dpi, max_pages=self.max_pages, poppler_path=self.poppler_path,
+                    total_pages=doc.pdf_pages, **self._pdf_resolution()
+                )
+                if doc.data is not None:
+                    return iter_pdf_pages_from_bytes(doc.data, **options), None
+                return iter_pdf_pages(doc.filepath, **options), None
             except Exception as e:
                 logger.error(f"PDF conversion error: {e}")
-                return jsonify(error="PDF tidak dapat diproses"), 500
-        else:
-            try:
-                with Image.open(filepath) as img:
-                    # Copy to prevent file lock
-                    images = [img.copy()]
-            except Exception as e:
-                logger.error(f"Image loading error: {e}")
-                return jsonify(error="Gambar tidak dapat dimuat"), 500
+                return None, {"success": False, "error": "PDF tidak dapat diproses"}
 
-        hasil_semua_halaman = []
+        try:
+            if doc.data is not None:
+                # Decode langsung dari buffer upload (tanpa salinan BytesIO / file sementara)
+                return [decode_image(doc.data)], None
+            return [read_image(doc.filepath)], None
+        except Exception as e:
+            logger.error(f"Image loading error: {e}")
+            return None, {"success": False, "error": "Gambar tidak dapat dimuat"}
 
-        for i, image in enumerate(images):
-            halaman_ke = i + 1
-            logger.info(f"� Processing page {halaman_ke}")
+    def memory_cost(self, doc):
+        """
+        Perkiraan memori puncak (byte) untuk memproses satu dokumen dari prepare(),
+        dari ukuran file, jumlah halaman dan piksel render (dipakai admission control).
+        Hanya membaca header gambar / pdfinfo, tidak me-render apa pun; jumlah
+        halaman PDF disimpan di ``doc.pdf_pages`` agar tidak dibaca ulang saat render.
+        """
+        file_size = len(doc.data) if doc.data is not None else os.path.getsize(doc.filepath)
+        # Halaman di pool + satu halaman berikutnya yang sudah di-render (prefetch)
+        in_flight = self.page_workers + 1
 
-            try:
-                # Convert PIL to OpenCV format (memory optimized)
-                if isinstance(image, np.ndarray):
-                    img_cv = image
+        if doc.is_pdf:
+            pages, page_points = pdf_layout(filepath=doc.filepath, data=doc.data, poppler_path=self.poppler_path)
+            doc.pdf_pages = pages
+            if self.max_pages:
+                pages = min(pages or self.max_pages, self.max_pages)
+            # Resolusi adaptif: DPI bisa naik sampai MAX_PDF_DPI tetapi dibatasi max_pixels
+            if self.preprocess.target_text_height:
+                pixels = pdf_page_pixels(page_points, MAX_PDF_DPI, self.preprocess.max_pixels)
+            else:
+                pixels = pdf_page_pixels(page_points, self.pdf_dpi)
+            return estimate_cost(file_size, pages, pixels, in_flight)
+
+        try:
+            with Image.open(BytesIO(doc.data) if doc.data is not None else doc.filepath) as img:
+                width, height = img.size
+        except Exception:
+            # Gambar rusak akan gagal dengan cepat saat diproses
+            return file_size
+        return estimate_cost(file_size, 1, width * height, in_flight)
+
+    def _pdf_resolution(self):
+        """Argumen resolusi adaptif untuk render PDF (DPI dipilih dari tinggi huruf)"""
+        return {
+            "target_text_height": self.preprocess.target_text_height,
+            "max_pixels": self.preprocess.max_pixels,
+        }
+
+    def process_image(self, image, page_num=1, original_filename="preview", source=None):
+        """
+        Proses satu halaman (PIL image atau numpy array BGR) dan kembalikan hasil halaman.
+        ``source`` = identitas dokumen asal (lihat _page_source) untuk nama preview;
+        tanpa itu nama preview dihitung dari piksel halaman.
+        """
+        # Durasi per stage (ms); render_ms dibawa oleh halaman PDF dari pages.py
+        timings = {}
+        if not isinstance(image, np.ndarray) and "render_ms" in image.info:
+            timings["render_ms"] = image.info["render_ms"]
+
+        with timed("preprocess", timings):
+            # PIL langsung ke grayscale, lalu stage preprocessing di buffer thread ini;
+            # skala (tinggi huruf) dan deskew (orientasi, sudut) dicatat ke ``info_halaman``
+            info_halaman = {}
+            buffers = self._thread_buffers()
+            gray, thresh = self.preprocess.run(image, buffers, info_halaman)
+
+        # Preview: hanya hash di sini, encode thumbnail berjalan di background
+        with timed("preview", timings):
+            preview_filename = self.previews.submit(image, page_num, original_filename, source=source)
+
+        # OCR halaman penuh dengan Tesseract (buffer numpy langsung ke engine)
+        bacaan, fields = self._read_and_extract(thresh, timings)
+
+        # Halaman terbalik lolos dari estimasi cepat (profil proyeksinya sama
+        # dengan halaman tegak): tanpa field dan confidence rendah -> tanya OSD
+        if self._perlu_osd(bacaan, fields, info_halaman):
+            with timed("orientation", timings):
+                rotate_cw = self.preprocess.osd(gray)
+            if rotate_cw:
+                logger.info(f"🔄 Halaman {page_num} diputar {rotate_cw}° menurut OSD")
+                with timed("preprocess", timings):
+                    gray, thresh = self.preprocess.reorient(gray, rotate_cw, buffers, info_halaman)
+                bacaan, fields = self._read_and_extract(thresh, timings)
+        raw_text = bacaan["text"]
+        logger.info(f"✅ OCR completed for page {page_num}")
+
+        # Confidence per field = confidence kata terlemah sumber field tersebut
+        words_per_field = field_words(bacaan["lines"], fields)
+        confidence = {field: word_confidence(words) for field, words in words_per_field.items()}
+
+        # Field hilang / tidak yakin: baca ulang region field itu saja
+        retries = {}
+        if self.min_confidence is not None:
+            with timed("retry", timings):
+                retries = self._retry_fields(gray, thresh.shape, bacaan, fields, confidence, words_per_field)
+
+        kode_setor = fields["kode_setor"]
+        tanggal_setor = fields["tanggal"]
+        jumlah_setor = fields["jumlah"]
+        ntpn = fields["ntpn"]
+
+        # Format hasil
+        hasil_halaman = {
+            "kode_setor": kode_setor,
+            "tanggal": tanggal_setor.strftime("%Y-%m-%d") if tanggal_setor else "",
+            "jumlah": jumlah_setor,
+            "ntpn": ntpn,
+            "halaman": page_num,
+            "preview_filename": preview_filename,
+            "raw_ocr": raw_text[:200] + "..." if len(raw_text) > 200 else raw_text,  # Limit raw text size
+            # Teks lengkap untuk disimpan & dicari (full-text search) saat data disimpan
+            "raw_text": raw_text,
+            "extraction_rules": fields["rules"],
+            "confidence": confidence,
+            "ocr_confidence": bacaan["confidence"],
+            "field_words": {
+                field: [{"text": word["text"], "conf": word["conf"]} for word in words]
+                for field, words in words_per_field.items()
+            },
+            "retries": retries,
+            "layout": bacaan["layout"],
+            "orientation": info_halaman.get("orientation", 0),
+            "skew_angle": info_halaman.get("skew_angle", 0.0),
+            "resolution": {
+                "text_height": info_halaman.get("text_height"),
+                "scale": info_halaman.get("scale", 1.0),
+                "dpi": None if isinstance(image, np.ndarray) else image.info.get("render_dpi"),
+            },
+            "timings": timings,
+        }
+
+        # Tambahkan warning jika data tidak lengkap
+        missing_fields = [
+            label for field, label in (
+                ("kode_setor", "Kode Setor"), ("tanggal", "Tanggal"), ("jumlah", "Jumlah"), ("ntpn", "NTPN")
+            )
+            if not field_found(field, fields[field])
+        ]
+        low_confidence = [
+            field for field, score in confidence.items()
+            if self.min_confidence is not None and score is not None and score < self.min_confidence
+            and field_found(field, fields[field])
+        ]
+
+        warnings = []
+        if missing_fields:
+            warnings.append(f"Data tidak terdeteksi: {', '.join(missing_fields)}")
+        if low_confidence:
+            warnings.append(f"Confidence rendah: {', '.join(low_confidence)}")
+        if warnings:
+            hasil_halaman["warning_message"] = "; ".join(warnings)
+
+        return hasil_halaman
+
+    def _read_and_extract(self, image, timings):
+        """OCR halaman lalu ekstraksi keempat field"""
+        with timed("ocr", timings):
+            bacaan = self._read_page(image)
+        with timed("extract", timings):
+            fields = self.extract(bacaan["text"])
+        return bacaan, fields
+
+    def _perlu_osd(self, bacaan, fields, info_halaman):
+        """Halaman mungkin terbalik: OSD aktif, belum dipakai, tidak ada field, OCR tidak yakin"""
+        if self.preprocess.osd is None or "deskew" not in self.preprocess.stages:
+            return False
+        if info_halaman.get("rotation_method") == "osd":
+            return False
+        if any(field_found(field, fields[field]) for field in FIELD_LABELS):
+            return False
+        return (bacaan["confidence"] or 0) < Config.OCR_OSD_MAX_PAGE_CONFIDENCE
+
+    def _read_page(self, image):
+        """
+        OCR satu halaman hasil preprocessing. Hasil dict: text, lines, regions,
+        confidence, layout.
+
+        Halaman selalu dibaca penuh (image_to_data): teks lengkapnya disimpan
+        dan di-index untuk full-text search, jadi tidak bisa diganti crop field
+        saja. Template dikenali dari baris header pembacaan yang sama (tanpa OCR
+        header terpisah). Region field yang tidak ditemukan di halaman ini (mis.
+        label salah baca) diambil dari layout template di cache, untuk retry.
+        """
+        height, width = image.shape[:2]
+        words = self.ocr.image_to_data(image)
+        lines = words_to_lines(words)
+        template = None
+        regions = None
+        cached = []
+        if self.layouts is not None:
+            template = detect_template(header_text(lines, height))
+            regions = locate_fields(lines, width, height)
+            if template:
+                key = f"{template}@{width / height:.1f}"
+                if len(regions) == len(FIELD_LABELS):
+                    self.layouts.put(key, regions)
                 else:
-                    img_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+                    layout = self.layouts.get(key) or {}
+                    cached = [field for field in layout if field not in regions]
+                    regions = {**layout, **regions}
+        return {
+            "text": lines_to_text(lines),
+            "lines": lines,
+            "regions": regions,
+            "confidence": page_confidence(words),
+            "layout": {"template": template, "cached_regions": cached},
+        }
 
-                # Preprocessing untuk OCR
-                thresh = preprocess_for_ocr(img_cv)
+    def _retry_fields(self, image, shape, bacaan, fields, confidence, words_per_field):
+        """
+        Jalankan retry ladder untuk field yang hilang atau confidence-nya di
+        bawah min_confidence. ``fields``, ``confidence`` dan ``words_per_field``
+        diperbarui di tempat. Hasil: {field: langkah retry yang dipakai}.
+        """
+        perlu = [
+            field for field in FIELD_LABELS
+            if not field_found(field, fields[field])
+            or (confidence.get(field) is not None and confidence[field] < self.min_confidence)
+        ]
+        if not perlu:
+            return {}
 
-                # Simpan preview image
-                preview_filename = simpan_preview_image(
-                    pil_image=image,
-                    upload_folder=upload_folder,
-                    page_num=halaman_ke,
-                    original_filename=file.filename
-                )
+        regions = bacaan["regions"]
+        if regions is None:
+            regions = locate_fields(bacaan["lines"], shape[1], shape[0])
 
-                # OCR dengan Tesseract (optimized config)
-                raw_text = pytesseract.image_to_string(thresh, config=TESSERACT_CONFIG)
-                logger.info(f"✅ OCR completed for page {halaman_ke}")
-
-                # Ekstraksi data dari OCR
-                kode_setor = extract_kode_setor(raw_text)
-                tanggal_setor = extract_tanggal_setor(raw_text)
-                jumlah_setor = extract_jumlah_setor(raw_text)
-                ntpn = extract_ntpn(raw_text)
-
-                # Format hasil
-                hasil_halaman = {
-                    "kode_setor": kode_setor,
-                    "tanggal": tanggal_setor.strftime("%Y-%m-%d") if tanggal_setor else "",
-                    "jumlah": jumlah_setor,
-                    "ntpn": ntpn,
-                    "halaman": halaman_ke,
-                    "preview_filename": preview_filename,
-                    "raw_ocr": raw_text[:200] + "..." if len(raw_text) > 200 else raw_text,  # Limit raw text size
-                }
-
-                # Tambahkan warning jika data tidak lengkap
-                missing_fields = []
-                if not kode_setor:
-                    missing_fields.append("Kode Setor")
-                if not tanggal_setor:
-                    missing_fields.append("Tanggal")
-                if not jumlah_setor:
-                    missing_fields.append("Jumlah")
-                    
-                if missing_fields:
-                    hasil_halaman["warning_message"] = f"Data tidak terdeteksi: {', '.join(missing_fields)}"
+        dipakai = {}
+        for field in perlu:
+            box = (regions or {}).get(field)
+            if box is None:
+                continue
+            current = confidence.get(field) if field_found(field, fields[field]) else None
+            hasil = retry_field(
+                self.ocr, image, field, box, self.extract, self.tesseract_config,
+                self.min_confidence, current_confidence=current,
+                cached=field in bacaan["layout"]["cached_regions"]
+            )
+            registry.inc("easyocr_field_retries_total", field=field, result="ok" if hasil else "failed")
+            if hasil is None:
+                continue
+            fields[field] = hasil["value"]
+            fields["rules"][field] = hasil["rule"]
+            confidence[field] = hasil["confidence"]
+            words_per_field[field] = hasil["words"]
+            dipakai[field] = hasil["step"]
+        return dipakai
 
-                hasil_semua_halaman.append(hasil_halaman)
-                
-                # Memory cleanup
-                del img_cv, thresh
-                if 'raw_text' in locals():
-                    del raw_text
-                gc.collect()
-                
-            except Exception as e:
-                logger.error(f"❌ Error processing page {halaman_ke}: {e}")
-                # Add fallback data for failed page
-                hasil_halaman = {
-                    "kode_setor": "",
-                    "tanggal": "",
-                    "jumlah": 0,
-                    "ntpn": "",
-                    "halaman": halaman_ke,
-                    "preview_filename": f"error_page_{halaman_ke}.jpg",
-                    "raw_ocr": "",
-                    "error_message": f"Gagal memproses halaman {halaman_ke}: {str(e)}"
-                }
-                hasil_semua_halaman.append(hasil_halaman)
+    def _process_pages(self, images, original_filename, source=None):
+        """
+        Jalankan OCR untuk setiap halaman dan gabungkan hasilnya.
+        ``images`` boleh list atau iterator (halaman PDF yang di-render bertahap).
+        """
+        logger.info(f"📄 Processing file: {original_filename}")
+        started = time.perf_counter()
+        hasil_semua_halaman = list(self._iter_page_results(images, original_filename, source))
+        return self._result(hasil_semua_halaman, started)
 
-        # Final memory cleanup
-        if 'images' in locals():
-            del images
-        gc.collect()
+    def _iter_page_results(self, images, original_filename, source=None):
+        """
+        Generator hasil per halaman, dikirim begitu halaman selesai diproses
+        (dengan pool, urutannya bisa berbeda dari urutan halaman).
+        """
+        if not isinstance(images, list):
+            # Render halaman berikutnya selagi halaman sekarang di-OCR
+            images = prefetch_pages(images)
 
-        return jsonify({
+        if self._executor is None:
+            for i, image in enumerate(images):
+                yield self._process_page_safe(image, i + 1, original_filename, source)
+            return
+
+        # Batasi halaman yang sudah di-render tapi belum selesai diproses
+        slot = threading.BoundedSemaphore(self.page_workers)
+        selesai = queue.Queue()
+
+        def on_done(future):
+            slot.release()
+            selesai.put(future)
+
+        submitted = 0
+        yielded = 0
+        for i, image in enumerate(images):
+            # Kirim hasil yang sudah selesai sebelum menunggu slot kosong
+            while not slot.acquire(blocking=False):
+                yield selesai.get().result()
+                yielded += 1
+            while True:
+                try:
+                    future = selesai.get_nowait()
+                except queue.Empty:
+                    break
+                yield future.result()
+                yielded += 1
+
+            future = self._executor.submit(self._process_page_safe, image, i + 1, original_filename, source)
+            future.add_done_callback(on_done)
+            submitted += 1
+            del image
+
+        while yielded < submitted:
+            yield selesai.get().result()
+            yielded += 1
+
+    @staticmethod
+    def _result(hasil_semua_halaman, started=None):
+        """Bentuk hasil akhir; halaman selalu diurutkan sesuai nomor halaman"""
+        hasil_semua_halaman = sorted(hasil_semua_halaman, key=lambda hasil: hasil["halaman"])
+        registry.observe("easyocr_document_pages", len(hasil_semua_halaman))
+        result = {
             "success": True,
             "data": hasil_semua_halaman,
             "total_halaman": len(hasil_semua_halaman),
             "message": f"✅ Berhasil memproses {len(hasil_semua_halaman)} halaman"
-        }), 200
+        }
+        if started is not None:
+            # Total per stage dijumlahkan dari semua halaman, total_ms = waktu dinding
+            timings = {}
+            for hasil in hasil_semua_halaman:
+                for stage, ms in hasil.get("timings", {}).items():
+                    timings[stage] = round(timings.get(stage, 0) + ms, 2)
+            timings["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            result["timings"] = timings
+        return result
+
+    @staticmethod
+    def _drop_timings(result):
+        """Hasil dari cache tidak membawa timing OCR lama"""
+        result.pop("timings", None)
+        for hasil in result.get("data", []):
+            hasil.pop("timings", None)
+        return result
+
+    @staticmethod
+    def _summary(result, cached=False):
+        """Event ringkasan untuk mode streaming (tanpa data per halaman)"""
+        summary = {key: value for key, value in result.items() if key != "data"}
+        summary["halaman"] = [hasil["halaman"] for hasil in result.get("data", [])]
+        if cached:
+            summary["cached"] = True
+        return summary
 
-    except Exception as err:
-        logger.error(f"❌ Processing error: {err}")
-        logger.error(traceback.format_exc())
+    def _cache_salt_for(self, filename):
+        """PDF dan gambar diproses lewat jalur berbeda, jadi ekstensi ikut jadi bagian key"""
+        return f"{self.cache_salt}|{os.path.splitext(filename)[1].lower()}|"
+
+    def _cache_key(self, digest, filename):
+        """Key cache hasil dari hash isi file (file cukup di-hash sekali per request)"""
+        return hash_bytes(digest.encode("utf-8"), salt=self._cache_salt_for(filename))
+
+    def _page_source(self, digest):
+        """
+        Identitas dokumen untuk nama preview per halaman: hash isi upload + setting
+        yang menentukan piksel halaman (DPI render PDF), tanpa hash piksel halaman
+        """
+        return f"{digest}|{self.pdf_dpi}|{self.preprocess.target_text_height}|{self.preprocess.max_pixels}"
+
+    def _preview_source(self, doc):
+        """Identitas preview dokumen; salinan dokumen disimpan untuk render penuh on_demand"""
+        source = self._page_source(doc.digest)
+        self.previews.keep_source(source, data=doc.data, filepath=doc.filepath)
+        return source
+
+    def _process_page_safe(self, image, halaman_ke, original_filename, source=None):
+        """Proses satu halaman; error dijadikan data fallback, bukan exception"""
+        logger.info(f"📃 Processing page {halaman_ke}")
+        try:
+            if isinstance(image, Exception):
+                # Halaman gagal di-render oleh sumber halaman
+                raise image
+            hasil = self.process_image(image, page_num=halaman_ke, original_filename=original_filename, source=source)
+            registry.inc("easyocr_pages_total", status="ok")
+            return hasil
+        except Exception as e:
+            logger.error(f"❌ Error processing page {halaman_ke}: {e}")
+            registry.inc("easyocr_pages_total", status="error")
+            return self._failed_page(halaman_ke, e)
+
+    def warm_up(self):
+        """
+        Proses satu halaman dummy (preprocessing, OCR, ekstraksi) tanpa preview,
+        cache maupun layout, agar model Tesseract, kernel OpenCV dan buffer sudah
+        siap sebelum request pertama. Berjalan di pool halaman jika ada.
+        """
+        page = np.full((700, 1240, 3), 255, dtype=np.uint8)
+        for row, line in enumerate(("BUKTI PENERIMAAN NEGARA", "Kode Setor : 411211",
+                                    "Tanggal Setor : 01-01-2024", "NTPN : 0123456789ABCDEF")):
+            cv2.putText(page, line, (60, 120 + row * 120), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (0, 0, 0), 3)
+
+        def run():
+            _, thresh = self.preprocess.run(page, self._thread_buffers(), {})
+            words = self.ocr.image_to_data(thresh)
+            self.extract(" ".join(word["text"] for word in words))
+
+        if self._executor is not None:
+            self._executor.submit(run).result()
+        else:
+            run()
+
+    def _thread_buffers(self):
+        """Dict buffer preprocessing milik thread yang sedang berjalan"""
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        return buffers
+
+    def close(self):
+        """Hentikan pool halaman, encoder preview dan engine OCR"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.previews.close()
+        self.ocr.close()
+
+    @staticmethod
+    def _failed_page(halaman_ke, error):
+        """Data fallback untuk halaman yang gagal diproses"""
+        return {
+            "kode_setor": "",
+            "tanggal": "",
+            "jumlah": 0,
+            "ntpn": "",
+            "halaman": halaman_ke,
+            "preview_filename": f"error_page_{halaman_ke}.jpg",
+            "raw_ocr": "",
+            "raw_text": "",
+            "error_message": f"Gagal memproses halaman {halaman_ke}: {str(error)}"
+        }
+
+# Processor default per worker untuk wrapper Flask di bawah
+_default_processor = None
+
+def get_processor(config=None):
+    """Ambil (atau buat sekali) processor default untuk worker ini"""
+    global _default_processor
+    if _default_processor is None:
+        upload_folder = config.get('UPLOAD_FOLDER', 'uploads') if config else None
+        _default_processor = BuktiSetorProcessor(upload_folder=upload_folder)
+    return _default_processor
+
+def process_bukti_setor_file(request, config):
+    """Memory-optimized bukti setor processing"""
+    if "file" not in request.files:
+        return jsonify(error="File tidak ditemukan"), 400
+
+    file = request.files["file"]
+
+    if not allowed_file(file.filename):
+        return jsonify(error="Format file tidak didukung"), 400
+
+    processor = get_processor(config)
+
+    # OCR langsung dari buffer upload; upload besar dari file spill bernama unik
+    # (bukan UPLOAD_FOLDER/<nama file> yang bisa bentrok antar request)
+    data, filepath = upload_source(file)
+    if data is not None:
+        result = processor.process_bytes(data, file.filename)
+    else:
+        result = processor.process_file(filepath, original_filename=file.filename)
+
+    if not result.get("success"):
         return jsonify({
-            "error": "Gagal memproses file",
-            "message": str(err),
+            "error": result.get("error", "Gagal memproses file"),
+            "message": result.get("message", ""),
             "fallback_available": True
         }), 500
 
-    finally:
-        # Cleanup temporary file
-        try:
-            if 'filepath' in locals() and os.path.exists(filepath):
-                os.remove(filepath)
-                logger.info(f"🗑️ Cleaned up temporary file: {file.filename}")
-        except Exception as e:
-            logger.warning(f"⚠️ Failed to cleanup file: {e}")
-        
-        # Force memory cleanup
-        gc.collect()
+    return jsonify(result), 200
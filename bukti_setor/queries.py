@@ -0,0 +1,100 @@
+# bukti_setor/queries.py - Filter dan pagination keyset untuk data bukti setor
+# -*- coding: utf-8 -*-
+#
+# History memakai keyset pagination pada (created_at, id): halaman berikutnya
+# diambil dengan WHERE (created_at, id) < cursor lewat index, tanpa COUNT(*) dan
+# tanpa OFFSET, sehingga halaman ke-1000 sama cepatnya dengan halaman pertama.
+# Cursor dikirim ke client sebagai string opaque (base64 dari JSON).
+
+import json
+import base64
+import binascii
+from datetime import datetime
+from sqlalchemy import and_, or_, func, text
+from models import db, BuktiSetor
+
+MAX_PER_PAGE = 100
+
+def parse_filters(args):
+    """
+    Baca filter dari query string: start/end (tanggal setor YYYY-MM-DD, inklusif),
+    kode_setor (bisa dipisah koma) dan ntpn. Raise ValueError jika format salah.
+    """
+    filters = {}
+    for key in ("start", "end"):
+        value = (args.get(key) or "").strip()
+        if value:
+            try:
+                filters[key] = datetime.strptime(value, "%Y-%m-%d").date()
+            except ValueError:
+                raise ValueError(f"{key} harus berformat YYYY-MM-DD")
+    if "start" in filters and "end" in filters and filters["start"] > filters["end"]:
+        raise ValueError("start tidak boleh setelah end")
+    kode = [k.strip() for k in (args.get("kode_setor") or "").split(",") if k.strip()]
+    if kode:
+        filters["kode_setor"] = kode
+    ntpn = (args.get("ntpn") or "").strip().upper()
+    if ntpn:
+        filters["ntpn"] = ntpn
+    return filters
+
+def apply_filters(query, filters):
+    """Terapkan filter hasil parse_filters ke query BuktiSetor"""
+    if "start" in filters:
+        query = query.filter(BuktiSetor.tanggal >= filters["start"])
+    if "end" in filters:
+        query = query.filter(BuktiSetor.tanggal <= filters["end"])
+    if "kode_setor" in filters:
+        query = query.filter(BuktiSetor.kode_setor.in_(filters["kode_setor"]))
+    if "ntpn" in filters:
+        query = query.filter(BuktiSetor.ntpn == filters["ntpn"])
+    return query
+
+def encode_cursor(record):
+    """Cursor opaque dari (created_at, id) baris terakhir di halaman"""
+    raw = json.dumps([record.created_at.isoformat(), record.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor):
+    """Kebalikan encode_cursor; raise ValueError jika cursor rusak"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, record_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(record_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise ValueError("cursor tidak valid")
+
+def page_after(filters, cursor=None, per_page=10):
+    """
+    Satu halaman history (terbaru dulu) setelah cursor.
+    Return (records, next_cursor); next_cursor None jika ini halaman terakhir.
+    """
+    query = apply_filters(BuktiSetor.query, filters)
+    if cursor:
+        created_at, record_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            BuktiSetor.created_at < created_at,
+            and_(BuktiSetor.created_at == created_at, BuktiSetor.id < record_id)
+        ))
+    query = query.order_by(BuktiSetor.created_at.desc(), BuktiSetor.id.desc())
+
+    records = query.limit(per_page + 1).all()
+    if len(records) > per_page:
+        records = records[:per_page]
+        return records, encode_cursor(records[-1])
+    return records, None
+
+def count_total(filters):
+    """
+    Jumlah baris untuk ditampilkan (opsional, ?total=1). Tanpa filter di PostgreSQL
+    dipakai estimasi statistik tabel (tanpa scan); selain itu COUNT(*) lewat index.
+    Return (total, is_estimate).
+    """
+    if not filters and db.engine.dialect.name == "postgresql":
+        estimate = db.session.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+            {"table": BuktiSetor.__tablename__}
+        ).scalar()
+        if estimate is not None and estimate >= 0:
+            return int(estimate), True
+    return apply_filters(db.session.query(func.count(BuktiSetor.id)), filters).scalar(), False
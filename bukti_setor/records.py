@@ -0,0 +1,205 @@
+# bukti_setor/records.py - Validasi dan simpan hasil OCR ke tabel bukti_setor
+# -*- coding: utf-8 -*-
+#
+# Satu atau banyak hasil OCR disimpan dalam satu transaksi dengan bulk insert.
+# NTPN unik per bukti setor: baris dengan NTPN yang sudah ada tidak disimpan
+# ulang (INSERT ... ON CONFLICT DO NOTHING di PostgreSQL dan SQLite), sehingga
+# request yang di-retry tidak membuat duplikat. Setiap baris mendapat status
+# created / duplicate / invalid. NTPN kosong atau placeholder "Tidak ditemukan"
+# dari hasil OCR disimpan sebagai NULL (bukan NTPN, tidak kena index unik).
+# Teks OCR lengkap (raw_text) disimpan terkompresi dan baris baru langsung
+# masuk index full-text (search.py).
+
+import os
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import func, insert, or_
+from models import db, BuktiSetor
+from bukti_setor.extractors.engine import TIDAK_DITEMUKAN
+from bukti_setor.search import compress_text, index_records
+
+CREATED = "created"
+DUPLICATE = "duplicate"
+INVALID = "invalid"
+
+# Numeric(15, 2): 13 digit sebelum koma
+MAX_JUMLAH = Decimal("9999999999999.99")
+# Teks OCR satu bukti setor (beberapa halaman) jauh di bawah ini
+MAX_RAW_TEXT = 200000
+
+def _text(data, key, max_length, errors, required=False):
+    """Ambil field teks (strip), None jika kosong"""
+    value = data.get(key)
+    if value is None:
+        value = ""
+    if not isinstance(value, str):
+        errors[key] = "harus berupa teks"
+        return None
+    value = value.strip()
+    if not value:
+        if required:
+            errors[key] = "wajib diisi"
+        return None
+    if len(value) > max_length:
+        errors[key] = f"maksimal {max_length} karakter"
+        return None
+    return value
+
+def normalize_ntpn(ntpn):
+    """NTPN huruf besar; kosong / placeholder OCR "Tidak ditemukan" -> None"""
+    if not ntpn or not ntpn.strip():
+        return None
+    ntpn = ntpn.strip().upper()
+    if ntpn == TIDAK_DITEMUKAN.upper():
+        return None
+    return ntpn
+
+def clear_missing_ntpn():
+    """
+    Ubah NTPN kosong / placeholder di data lama (disimpan sebelum validasi ini
+    ada) menjadi NULL, agar index unik NTPN bisa dibuat. Return jumlah baris.
+    """
+    ntpn = func.upper(func.trim(BuktiSetor.ntpn))
+    result = db.session.execute(
+        BuktiSetor.__table__.update()
+        .where(or_(ntpn == "", ntpn == TIDAK_DITEMUKAN.upper()))
+        .values(ntpn=None)
+    )
+    db.session.commit()
+    return result.rowcount
+
+def validate_record(data):
+    """
+    Validasi satu hasil OCR terhadap model BuktiSetor.
+    Return (values, errors): values siap di-insert jika errors kosong.
+    """
+    if not isinstance(data, dict):
+        return None, {"record": "harus berupa object"}
+
+    errors = {}
+    values = {
+        "kode_setor": _text(data, "kode_setor", 100, errors, required=True),
+        "ntpn": _text(data, "ntpn", 100, errors),
+        "preview_filename": _text(data, "preview_filename", 255, errors),
+    }
+    values["ntpn"] = normalize_ntpn(values["ntpn"])
+    if values["preview_filename"] and os.path.basename(values["preview_filename"]) != values["preview_filename"]:
+        errors["preview_filename"] = "harus nama file, bukan path"
+
+    tanggal = data.get("tanggal")
+    if not tanggal:
+        errors["tanggal"] = "wajib diisi"
+    else:
+        try:
+            values["tanggal"] = datetime.strptime(str(tanggal).strip(), "%Y-%m-%d").date()
+        except ValueError:
+            errors["tanggal"] = "harus berformat YYYY-MM-DD"
+
+    jumlah = data.get("jumlah")
+    if jumlah is None or jumlah == "" or isinstance(jumlah, bool):
+        errors["jumlah"] = "wajib diisi"
+    else:
+        try:
+            values["jumlah"] = Decimal(str(jumlah)).quantize(Decimal("0.01"))
+            if not Decimal(0) <= values["jumlah"] <= MAX_JUMLAH:
+                errors["jumlah"] = "di luar rentang"
+        except InvalidOperation:
+            errors["jumlah"] = "harus berupa angka"
+
+    raw_text = _text(data, "raw_text", MAX_RAW_TEXT, errors)
+    values["ocr_text"] = compress_text(raw_text)
+
+    if errors:
+        return None, errors
+    values["created_at"] = datetime.utcnow()
+    return values, {}
+
+def _insert_ignore(rows):
+    """
+    Bulk INSERT yang melewati baris dengan NTPN yang sudah ada.
+    Return {ntpn: id} untuk baris yang benar-benar ter-insert.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        dialect_insert = None
+
+    if dialect_insert is not None:
+        stmt = dialect_insert(BuktiSetor).on_conflict_do_nothing().returning(BuktiSetor.id, BuktiSetor.ntpn)
+    else:
+        stmt = insert(BuktiSetor).returning(BuktiSetor.id, BuktiSetor.ntpn)
+    return {ntpn: record_id for record_id, ntpn in db.session.execute(stmt, rows)}
+
+def save_records(items):
+    """
+    Simpan banyak hasil OCR dalam satu transaksi.
+    Return (results, previews): status per item dengan urutan sama seperti input
+    ({"index", "status", "id"} atau {"index", "status": "invalid", "errors"}) dan
+    daftar preview_filename milik baris yang baru dibuat.
+    """
+    results = [None] * len(items)
+    with_ntpn = {}
+    without_ntpn = []
+
+    for index, data in enumerate(items):
+        values, errors = validate_record(data)
+        if errors:
+            results[index] = {"index": index, "status": INVALID, "errors": errors}
+        elif values["ntpn"] is None:
+            without_ntpn.append((index, values))
+        elif values["ntpn"] in with_ntpn:
+            # NTPN sama dua kali dalam satu request: yang kedua duplikat
+            results[index] = {"index": index, "status": DUPLICATE, "ntpn": values["ntpn"]}
+        else:
+            with_ntpn[values["ntpn"]] = (index, values)
+
+    try:
+        existing = {}
+        if with_ntpn:
+            existing = dict(db.session.query(BuktiSetor.ntpn, BuktiSetor.id).filter(
+                BuktiSetor.ntpn.in_(list(with_ntpn))
+            ).all())
+
+        new_rows = [values for ntpn, (_, values) in with_ntpn.items() if ntpn not in existing]
+        inserted = _insert_ignore(new_rows) if new_rows else {}
+
+        # Baris yang dilewati ON CONFLICT (disimpan request lain barusan)
+        missing = [values["ntpn"] for values in new_rows if values["ntpn"] not in inserted]
+        if missing:
+            existing.update(db.session.query(BuktiSetor.ntpn, BuktiSetor.id).filter(
+                BuktiSetor.ntpn.in_(missing)
+            ).all())
+
+        ids_without_ntpn = []
+        if without_ntpn:
+            stmt = insert(BuktiSetor).returning(BuktiSetor.id, sort_by_parameter_order=True)
+            ids_without_ntpn = db.session.execute(stmt, [values for _, values in without_ntpn]).scalars().all()
+
+        index_records(
+            [(inserted[ntpn], values) for ntpn, (_, values) in with_ntpn.items() if ntpn in inserted]
+            + [(record_id, values) for (_, values), record_id in zip(without_ntpn, ids_without_ntpn)]
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    ids = dict(existing)
+    ids.update(inserted)
+    previews = []
+    for ntpn, (index, values) in with_ntpn.items():
+        status = CREATED if ntpn in inserted else DUPLICATE
+        results[index] = {"index": index, "status": status, "id": ids.get(ntpn)}
+        if status == CREATED and values["preview_filename"]:
+            previews.append(values["preview_filename"])
+    for (index, values), record_id in zip(without_ntpn, ids_without_ntpn):
+        results[index] = {"index": index, "status": CREATED, "id": record_id}
+        if values["preview_filename"]:
+            previews.append(values["preview_filename"])
+    for result in results:
+        if "ntpn" in result:
+            result["id"] = ids.get(result.pop("ntpn"))
+    return results, previews
@@ -0,0 +1,64 @@
+# bukti_setor/retry.py - Retry OCR per field berdasarkan confidence
+# -*- coding: utf-8 -*-
+#
+# Field yang tidak ditemukan atau confidence-nya rendah dibaca ulang hanya
+# pada region field tersebut, dengan langkah dari yang paling murah ke yang
+# paling mahal. Langkah berhenti begitu hasilnya cukup yakin, sehingga
+# bukti setor yang bersih tetap hanya melewati satu kali pembacaan. Hasil crop
+# hanya dipakai jika formatnya valid (field_valid); region yang diambil dari
+# cache template juga harus mencapai min_confidence.
+
+import cv2
+from bukti_setor.layout import crop, field_config, field_text, word_confidence
+from bukti_setor.extractors.engine import field_valid
+
+# (nama langkah, skala crop, psm Tesseract)
+RETRY_LADDER = (
+    ("otsu", 1.0, 7),      # threshold global Otsu, bukan adaptive
+    ("upscale", 2.0, 7),   # huruf kecil/blur: perbesar 2x sebelum threshold
+    ("psm6", 2.0, 6),      # segmentasi blok, untuk nilai yang terpecah/bertumpuk
+)
+
+def _region(image, box, scale):
+    region = crop(image, box)
+    if region.ndim == 3:
+        region = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+    if scale != 1.0:
+        region = cv2.resize(region, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+    _, region = cv2.threshold(region, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return region
+
+def retry_field(ocr, image, field, box, extract, tesseract_config, min_confidence, current_confidence=None,
+                cached=False):
+    """
+    Jalankan tangga retry untuk satu field pada ``box`` (koordinat relatif).
+    ``cached`` = box berasal dari layout template di cache, bukan dari label
+    di halaman ini.
+
+    Hasil: dict {value, rule, words, confidence, step} dari langkah terbaik
+    yang formatnya valid dan confidence-nya melebihi ``current_confidence``
+    (dan minimal ``min_confidence`` untuk box dari cache), atau None.
+    """
+    terbaik = None
+    for step, scale, psm in RETRY_LADDER:
+        words = ocr.image_to_data(_region(image, box, scale), config=field_config(field, tesseract_config, psm=psm))
+        fields = extract(field_text(field, words))
+        if not field_valid(field, fields[field]):
+            continue
+
+        confidence = word_confidence(words)
+        if current_confidence is not None and (confidence is None or confidence <= current_confidence):
+            continue
+        if cached and (confidence is None or confidence < min_confidence):
+            continue
+        if terbaik is None or (confidence or 0) > (terbaik["confidence"] or 0):
+            terbaik = {
+                "value": fields[field],
+                "rule": fields["rules"][field],
+                "words": words,
+                "confidence": confidence,
+                "step": step,
+            }
+        if confidence is not None and confidence >= min_confidence:
+            break
+    return terbaik
@@ -0,0 +1,100 @@
+# bukti_setor/runtime.py - Objek per proses worker & laporan waktu startup
+# -*- coding: utf-8 -*-
+#
+# Dengan gunicorn --preload (lihat gunicorn.conf.py) app dibuat sekali di proses
+# master: modul berat (cv2, numpy, PIL, pytesseract, SQLAlchemy) di-import dan
+# database diinisialisasi satu kali, lalu dibagi copy-on-write ke semua worker.
+# Objek yang punya thread, koneksi SQLite atau engine Tesseract tidak boleh ikut
+# di-fork, jadi dibungkus PerProcess: dibuat di proses yang memakainya, saat
+# worker siap (post_worker_init) atau paling lambat saat pertama dipakai.
+
+import os
+import time
+import uuid
+import logging
+import threading
+from contextlib import contextmanager
+from bukti_setor.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# fase -> detik, untuk proses ini (fase dari master ikut terbawa saat fork)
+STARTUP = {}
+
+@contextmanager
+def startup_phase(phase):
+    """Ukur satu fase startup (import, app, worker, warmup)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP[phase] = time.perf_counter() - start
+
+def report_startup():
+    """Catat semua fase startup ke metrics worker ini dan tulis satu baris log"""
+    for phase, seconds in STARTUP.items():
+        registry.observe("easyocr_startup_seconds", seconds, phase=phase)
+    registry.flush(force=True)
+    summary = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in STARTUP.items())
+    logger.info(f"⏱️ Startup worker {os.getpid()}: {summary}")
+
+_owners = {}
+
+def process_owner():
+    """
+    Token acak proses ini (per pid, dibuat ulang setelah fork). Data bersama
+    (tiket admission, job) mencatat pid + token: pid yang dipakai ulang proses
+    baru tidak mewarisi milik proses lama.
+    """
+    pid = os.getpid()
+    if pid not in _owners:
+        _owners[pid] = uuid.uuid4().hex
+    return _owners[pid]
+
+def worker_id():
+    """Identitas proses ini sebagai satu string "pid:token" """
+    return f"{os.getpid()}:{process_owner()}"
+
+def worker_alive(worker):
+    """True jika proses pemilik ``worker`` (hasil worker_id) masih hidup"""
+    try:
+        pid = int(worker.split(":", 1)[0])
+    except (AttributeError, ValueError):
+        return False
+    if pid == os.getpid():
+        return worker == worker_id()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class PerProcess:
+    """
+    Pembungkus lazy untuk objek yang harus dibuat sekali per proses.
+    Atribut diteruskan ke objek aslinya; setelah fork objek dibuat ulang.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._pid = None
+        self._value = None
+
+    @property
+    def ready(self):
+        """True jika objek sudah dibuat di proses ini"""
+        return self._pid == os.getpid()
+
+    def get(self):
+        if not self.ready:
+            with self._lock:
+                if not self.ready:
+                    self._value = self._factory()
+                    self._pid = os.getpid()
+        return self._value
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
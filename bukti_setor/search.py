@@ -0,0 +1,278 @@
+# bukti_setor/search.py - Full-text search teks OCR dan field bukti setor
+# -*- coding: utf-8 -*-
+#
+# Teks OCR lengkap disimpan terkompresi (zlib) di kolom bukti_setor.ocr_text.
+# Index full-text berisi teks itu + field terstruktur (kode setor, NTPN,
+# tanggal, jumlah) dan versi angka tanpa pemisah (NPWP 01.234.567.8-901.000 ->
+# 012345678901000, jumlah 1.500.000 -> 1500000) agar pencarian angka tidak
+# tergantung format hasil OCR:
+#   - SQLite: tabel FTS5 contentless bukti_setor_fts (rowid = bukti_setor.id),
+#     teks tidak disimpan dua kali; ranking bm25
+#   - PostgreSQL: kolom tsvector bukti_setor.search_vector + index GIN; ranking ts_rank
+# Semua kata query wajib ada; kata terakhir dan angka dicocokkan sebagai prefix.
+
+import re
+import zlib
+import logging
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import column, func, inspect, literal_column, null, select, table, text
+from sqlalchemy.orm import undefer
+from models import db, BuktiSetor
+from bukti_setor.queries import apply_filters
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "bukti_setor_fts"
+MAX_PER_PAGE = 100
+MAX_QUERY_TERMS = 16
+BACKFILL_CHUNK = 1000
+# Di atas jumlah hasil ini pencarian tidak diurutkan per relevansi (lihat search())
+RANK_MAX_MATCHES = 20000
+SNIPPET_CONTEXT = 60
+
+# Angka dengan pemisah (NPWP, NTPN, jumlah, tanggal): 01.234.567.8-901.000, 1.500.000,00
+_NUMBER = re.compile(r"\d[\d.,/-]*\d")
+_WORD = re.compile(r"[^\W_]+")
+
+_fts = table(FTS_TABLE, column("rowid"))
+_search_vector = literal_column("bukti_setor.search_vector")
+
+# dialect -> index tersedia (dicek sekali per proses)
+_available = {}
+
+def compress_text(raw_text):
+    """Teks OCR -> bytes zlib untuk kolom ocr_text (None jika kosong)"""
+    if not raw_text:
+        return None
+    return zlib.compress(raw_text.encode("utf-8"), 6)
+
+def decompress_text(data):
+    """Kebalikan compress_text"""
+    if not data:
+        return ""
+    return zlib.decompress(data).decode("utf-8")
+
+def _digits(value):
+    return re.sub(r"\D", "", value)
+
+def document(fields):
+    """
+    Teks yang di-index untuk satu bukti setor (dict berisi kode_setor, ntpn,
+    tanggal, jumlah, ocr_text). Harus deterministik: FTS5 contentless menghapus
+    entri dengan teks yang sama persis seperti saat di-index.
+    """
+    raw_text = decompress_text(fields.get("ocr_text"))
+    parts = [raw_text, fields.get("kode_setor") or "", fields.get("ntpn") or ""]
+
+    tanggal = fields.get("tanggal")
+    if isinstance(tanggal, date):
+        parts.append(tanggal.strftime("%Y-%m-%d %d-%m-%Y %Y%m%d %d%m%Y"))
+
+    jumlah = fields.get("jumlah")
+    if jumlah is not None:
+        jumlah = Decimal(jumlah).quantize(Decimal("0.01"))
+        rupiah = int(jumlah)
+        parts.append(f"{rupiah} {rupiah:,}".replace(",", "."))
+        if jumlah != rupiah:
+            parts.append(_digits(str(jumlah)))
+
+    # Angka bertanda baca juga di-index tanpa pemisah (lihat query_terms)
+    numbers = {_digits(match) for match in _NUMBER.findall(" ".join(parts)) if not match.isdigit()}
+    parts.extend(sorted(numbers))
+    return "\n".join(part for part in parts if part)
+
+def query_terms(q):
+    """
+    Query pencarian -> daftar term, masing-masing daftar kata (frasa).
+    Angka dengan pemisah menjadi satu kata angka saja, sama seperti di document().
+    """
+    terms = []
+    for token in q.split():
+        if _NUMBER.fullmatch(token) and not token.isdigit():
+            words = [_digits(token)]
+        else:
+            words = [word.lower() for word in _WORD.findall(token)]
+        if words and words not in terms:
+            terms.append(words)
+    return terms[:MAX_QUERY_TERMS]
+
+def _is_prefix(terms, index):
+    # Prefix untuk term terakhir (sedang diketik) dan angka (NPWP/NTPN sebagian);
+    # kata lain utuh, prefix kata umum yang panjang mahal di-merge
+    return index == len(terms) - 1 or terms[index][-1].isdigit()
+
+def _fts5_query(terms):
+    # Setiap term frasa dalam tanda kutip (aman dari sintaks FTS5)
+    return " AND ".join(
+        '"' + " ".join(words) + '"' + ("*" if _is_prefix(terms, i) else "") for i, words in enumerate(terms)
+    )
+
+def _tsquery(terms):
+    # Kata hanya huruf/angka (lihat _WORD), jadi aman dipakai di to_tsquery
+    return " & ".join(
+        " <-> ".join(words[:-1] + [words[-1] + (":*" if _is_prefix(terms, i) else "")])
+        for i, words in enumerate(terms)
+    )
+
+def available():
+    """True jika index full-text ada untuk database ini"""
+    dialect = db.engine.dialect.name
+    if dialect not in _available:
+        try:
+            inspector = inspect(db.engine)
+            if dialect == "sqlite":
+                _available[dialect] = inspector.has_table(FTS_TABLE)
+            elif dialect == "postgresql":
+                _available[dialect] = any(
+                    col["name"] == "search_vector" for col in inspector.get_columns(BuktiSetor.__tablename__)
+                )
+            else:
+                _available[dialect] = False
+        except Exception as e:
+            logger.warning(f"⚠️ Cek index full-text gagal: {e}")
+            return False
+    return _available[dialect]
+
+def ensure_search_index():
+    """
+    Buat index full-text jika belum ada (FTS5 di SQLite, tsvector + GIN di
+    PostgreSQL) lalu index baris lama yang belum ter-index. Aman dijalankan
+    berulang dan oleh beberapa worker bersamaan. Return jumlah baris yang di-index.
+    """
+    dialect = db.engine.dialect.name
+    _available.pop(dialect, None)
+    if dialect not in ("sqlite", "postgresql"):
+        logger.info(f"ℹ️ Full-text search tidak didukung untuk database {dialect}")
+        return 0
+
+    with db.engine.connect() as conn:
+        last_id = 0
+        if dialect == "sqlite":
+            # Kunci tulis sampai backfill selesai: worker lain yang start bersamaan
+            # menunggu lalu melihat semua baris sudah ter-index (tidak ada entri ganda)
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "body, content='', tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')"
+            ))
+            # Baris baru selalu di-index saat disimpan: yang belum hanya id di atas rowid terakhir
+            last_id = conn.execute(text(
+                f"SELECT rowid FROM {FTS_TABLE} ORDER BY rowid DESC LIMIT 1"
+            )).scalar() or 0
+        elif not any(col["name"] == "search_vector" for col in inspect(conn).get_columns(BuktiSetor.__tablename__)):
+            # ALTER TABLE mengunci tabel: hanya sekali, saat kolom belum ada
+            conn.execute(text("ALTER TABLE bukti_setor ADD COLUMN IF NOT EXISTS search_vector tsvector"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_bukti_setor_search ON bukti_setor USING GIN (search_vector)"
+            ))
+            conn.commit()
+        total = _backfill(conn, dialect, last_id)
+        conn.commit()
+    return total
+
+def _backfill(conn, dialect, last_id=0):
+    """Index semua baris yang belum ter-index (id > last_id), per chunk id"""
+    columns = (BuktiSetor.id, BuktiSetor.kode_setor, BuktiSetor.ntpn, BuktiSetor.tanggal,
+               BuktiSetor.jumlah, BuktiSetor.ocr_text)
+    total = 0
+    while True:
+        query = select(*columns).where(BuktiSetor.id > last_id)
+        if dialect == "postgresql":
+            query = query.where(_search_vector.is_(None))
+        rows = conn.execute(query.order_by(BuktiSetor.id).limit(BACKFILL_CHUNK)).all()
+        if not rows:
+            break
+        _write_index(conn, dialect, [(row.id, row._asdict()) for row in rows])
+        if dialect == "postgresql":
+            # Transaksi pendek per chunk; SQLite tetap satu transaksi (lihat ensure_search_index)
+            conn.commit()
+        last_id = rows[-1].id
+        total += len(rows)
+    return total
+
+def _write_index(conn, dialect, rows):
+    params = [{"id": record_id, "body": document(values)} for record_id, values in rows]
+    if dialect == "sqlite":
+        conn.execute(text(f"INSERT INTO {FTS_TABLE} (rowid, body) VALUES (:id, :body)"), params)
+    else:
+        conn.execute(text(
+            "UPDATE bukti_setor SET search_vector = to_tsvector('simple', :body) WHERE id = :id"
+        ), params)
+
+def index_records(rows):
+    """
+    Index baris yang baru disimpan, di transaksi session yang sedang berjalan.
+    ``rows``: daftar (id, values) dengan values seperti di document().
+    """
+    if rows and available():
+        _write_index(db.session, db.engine.dialect.name, rows)
+
+def unindex(record):
+    """Hapus entri index milik record (sebelum record dihapus, di transaksi yang sama)"""
+    if db.engine.dialect.name != "sqlite" or not available():
+        # PostgreSQL: tsvector ikut terhapus bersama barisnya
+        return
+    values = {
+        "kode_setor": record.kode_setor, "ntpn": record.ntpn, "tanggal": record.tanggal,
+        "jumlah": record.jumlah, "ocr_text": record.ocr_text,
+    }
+    db.session.execute(
+        text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, body) VALUES ('delete', :id, :body)"),
+        {"id": record.id, "body": document(values)}
+    )
+
+def search(q, filters, page=1, per_page=20):
+    """
+    Cari bukti setor dengan filter terstruktur dari queries.parse_filters.
+    Return (daftar (record, rank), has_next, ranked); rank makin besar makin
+    cocok, None jika tidak di-ranking: query yang cocok dengan lebih dari
+    RANK_MAX_MATCHES baris (kata umum seperti "pajak") diurutkan terbaru dulu,
+    karena menghitung rank semua baris itu mahal dan hampir tidak membedakan apa pun.
+    Raise ValueError jika query tidak berisi kata yang bisa dicari.
+    """
+    terms = query_terms(q or "")
+    if not terms:
+        raise ValueError("q wajib berisi kata yang dicari")
+
+    if db.engine.dialect.name == "sqlite":
+        match = text(f"{FTS_TABLE} MATCH :match").bindparams(match=_fts5_query(terms))
+        ranked = _count_upto(db.session.query(_fts.c.rowid).filter(match)) <= RANK_MAX_MATCHES
+        # bm25 negatif (makin kecil makin relevan): dibalik agar sama arahnya dengan ts_rank
+        rank = literal_column(f"-bm25({FTS_TABLE})")
+        newest = _fts.c.rowid.desc()
+        base = db.session.query(BuktiSetor).join(_fts, _fts.c.rowid == BuktiSetor.id).filter(match)
+    else:
+        tsquery = func.to_tsquery("simple", _tsquery(terms))
+        match = _search_vector.op("@@")(tsquery)
+        ranked = _count_upto(db.session.query(BuktiSetor.id).filter(match)) <= RANK_MAX_MATCHES
+        rank = func.ts_rank(_search_vector, tsquery)
+        newest = BuktiSetor.id.desc()
+        base = db.session.query(BuktiSetor).filter(match)
+
+    # Tanpa ranking rank tidak dihitung sama sekali: bm25 butuh statistik semua baris yang cocok
+    if ranked:
+        query = base.add_columns(rank.label("rank")).order_by(rank.desc(), BuktiSetor.id.desc())
+    else:
+        query = base.add_columns(null().label("rank")).order_by(newest)
+    # ocr_text dipakai snippet, load sekalian (tanpa query per baris)
+    query = apply_filters(query.options(undefer(BuktiSetor.ocr_text)), filters)
+    rows = query.offset((page - 1) * per_page).limit(per_page + 1).all()
+    return rows[:per_page], len(rows) > per_page, ranked
+
+def _count_upto(query, limit=RANK_MAX_MATCHES + 1):
+    """Jumlah baris query, berhenti menghitung di ``limit``"""
+    return db.session.query(func.count()).select_from(query.limit(limit).subquery()).scalar()
+
+def snippet(record, q):
+    """Potongan teks OCR di sekitar kata pertama query yang ditemukan"""
+    raw_text = decompress_text(record.ocr_text)
+    if not raw_text:
+        return ""
+    lower = raw_text.lower()
+    positions = [lower.find(word) for words in query_terms(q) for word in words[:1]]
+    positions = [pos for pos in positions if pos >= 0]
+    start = max(0, min(positions) - SNIPPET_CONTEXT) if positions else 0
+    end = start + 2 * SNIPPET_CONTEXT + 40
+    text_part = " ".join(raw_text[start:end].split())
+    return ("..." if start > 0 else "") + text_part + ("..." if end < len(raw_text) else "")
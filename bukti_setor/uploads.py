@@ -0,0 +1,49 @@
+# bukti_setor/uploads.py - Upload langsung ke memori, spill ke file sementara jika besar
+# -*- coding: utf-8 -*-
+#
+# Werkzeug menampung upload di SpooledTemporaryFile 500 KB, lalu route dulu
+# menyalinnya lagi ke NamedTemporaryFile / UPLOAD_FOLDER sebelum OCR membacanya
+# kembali dari disk. UploadRequest menampung request sampai UPLOAD_MEMORY_LIMIT
+# di BytesIO (OCR membaca buffer itu langsung). Request yang lebih besar ditulis
+# sekali ke file sementara bernama unik, dipakai OCR apa adanya, dan terhapus
+# sendiri saat request selesai.
+
+import os
+import re
+import tempfile
+from io import BytesIO
+from flask import Request
+from config import Config
+
+# Ekstensi file spill mengikuti nama upload (processor memilih PDF/gambar dari ekstensi)
+_SUFFIX = re.compile(r"\.[A-Za-z0-9]{1,8}")
+
+class UploadRequest(Request):
+    """Request Flask dengan stream upload di memori sampai ``upload_memory_limit``"""
+
+    upload_memory_limit = Config.UPLOAD_MEMORY_LIMIT
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length <= self.upload_memory_limit:
+            return BytesIO()
+        suffix = os.path.splitext(filename or "")[1].lower()
+        if not _SUFFIX.fullmatch(suffix):
+            suffix = ""
+        return tempfile.NamedTemporaryFile(mode="w+b", prefix="upload_", suffix=suffix)
+
+def upload_source(file):
+    """
+    Sumber OCR untuk upload (FileStorage): (data, None) jika isinya di memori,
+    atau (None, path) file spill yang masih hidup sampai request selesai.
+    """
+    stream = file.stream
+    if isinstance(stream, BytesIO):
+        # getvalue() berbagi buffer dengan BytesIO (tanpa salinan)
+        return stream.getvalue(), None
+    path = getattr(stream, "name", None)
+    if isinstance(path, str) and os.path.isfile(path):
+        stream.flush()
+        return None, path
+    # Stream lain (request biasa tanpa UploadRequest): baca ke memori
+    stream.seek(0)
+    return stream.read(), None
@@ -1,6 +1,7 @@
 # File: config.py
 
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Muat variabel dari file .env
@@ -18,6 +19,107 @@ class Config:
     # Path Tesseract OCR (untuk Windows/Railway)
     TESSERACT_CMD = os.getenv("TESSERACT_CMD", "tesseract")
     
+    # Backend OCR: auto | tesserocr (engine persisten) | pytesseract (subprocess)
+    OCR_BACKEND = os.getenv("OCR_BACKEND", "auto")
+    
+    # Folder traineddata Tesseract untuk tesserocr (opsional)
+    TESSDATA_PREFIX = os.getenv("TESSDATA_PREFIX")
+    
+    # Jumlah halaman yang di-OCR paralel per worker (0 = otomatis: CPU / WEB_CONCURRENCY)
+    OCR_PAGE_WORKERS = int(os.getenv("OCR_PAGE_WORKERS", "0"))
+    
+    # Jumlah worker gunicorn, dipakai untuk membagi CPU antar worker
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "2"))
+    
+    # Resolusi render PDF dan batas jumlah halaman yang di-OCR
+    # (PDF_DPI dipakai jika tinggi huruf tidak terukur atau resolusi adaptif mati)
+    PDF_DPI = int(os.getenv("PDF_DPI", "200"))
+    MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "3"))
+    
+    # Preview halaman: format (webp/jpeg), sisi terpanjang thumbnail, kualitas,
+    # versi resolusi penuh (on_demand = JPEG di-render dari dokumen asal saat pertama diminta,
+    # eager = ditulis bersama thumbnail, off) dan thread encoder
+    PREVIEW_FORMAT = os.getenv("PREVIEW_FORMAT", "webp")
+    PREVIEW_MAX_SIZE = int(os.getenv("PREVIEW_MAX_SIZE", "1024"))
+    PREVIEW_QUALITY = int(os.getenv("PREVIEW_QUALITY", "80"))
+    PREVIEW_FULL_SIZE = os.getenv("PREVIEW_FULL_SIZE", "on_demand").lower()
+    PREVIEW_WORKERS = int(os.getenv("PREVIEW_WORKERS", "1"))
+    # Batas piksel halaman (byte) yang boleh ditahan antrian encode per worker; lebih dari itu encode langsung
+    PREVIEW_MAX_PENDING_BYTES = int(os.getenv("PREVIEW_MAX_PENDING_BYTES", str(128 * 1024 * 1024)))
+    # Budget total ukuran preview di disk (LRU) dan umur maksimum tanpa diakses (hari, 0 = tanpa batas);
+    # preview milik data yang sudah disimpan tidak pernah dihapus
+    PREVIEW_MAX_BYTES = int(os.getenv("PREVIEW_MAX_BYTES", str(1024 * 1024 * 1024)))
+    PREVIEW_MAX_AGE_DAYS = int(os.getenv("PREVIEW_MAX_AGE_DAYS", "30"))
+    
+    # Resolusi adaptif: halaman (dan DPI render PDF) diskalakan agar tinggi huruf
+    # ~N piksel (0 = mati), dengan batas jumlah piksel per halaman
+    OCR_TARGET_TEXT_HEIGHT = int(os.getenv("OCR_TARGET_TEXT_HEIGHT", "30"))
+    OCR_MAX_PIXELS = int(os.getenv("OCR_MAX_PIXELS", "6000000"))
+    
+    # Cache hasil OCR per isi file (memori LRU + SQLite di UPLOAD_FOLDER)
+    OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+    OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    OCR_CACHE_DISK = os.getenv("OCR_CACHE_DISK", "true").lower() == "true"
+    # Batas cache disk: total ukuran (byte) dan umur tanpa dipakai (hari, 0 = tanpa batas)
+    OCR_CACHE_DISK_MAX_BYTES = int(os.getenv("OCR_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024)))
+    OCR_CACHE_DISK_MAX_AGE_DAYS = int(os.getenv("OCR_CACHE_DISK_MAX_AGE_DAYS", "30"))
+    
+    # Job OCR asynchronous: jumlah thread job per worker dan batas antrian (lebih dari ini -> 429)
+    OCR_JOB_WORKERS = int(os.getenv("OCR_JOB_WORKERS", "1"))
+    OCR_JOB_QUEUE_SIZE = int(os.getenv("OCR_JOB_QUEUE_SIZE", "20"))
+    
+    # Batch upload: batas ukuran request batch, jumlah file dan thread per batch (0 = otomatis)
+    BATCH_MAX_CONTENT_LENGTH = int(os.getenv("BATCH_MAX_CONTENT_LENGTH", str(512 * 1024 * 1024)))
+    BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))
+    OCR_BATCH_WORKERS = int(os.getenv("OCR_BATCH_WORKERS", "0"))
+    # Batch sampai N file diproses langsung di request (harus selesai dalam GUNICORN_TIMEOUT);
+    # lebih dari itu (atau ?async=1) diantrikan sebagai job per file. Batas total file batch
+    # yang antri per worker (lebih dari ini -> 429)
+    BATCH_SYNC_MAX_FILES = int(os.getenv("BATCH_SYNC_MAX_FILES", "20"))
+    BATCH_QUEUE_SIZE = int(os.getenv("BATCH_QUEUE_SIZE", "1000"))
+    
+    # Upload sampai batas ini (byte, total request) dibaca di memori dan di-OCR langsung
+    # dari buffer; lebih besar ditulis sekali ke file sementara bernama unik
+    UPLOAD_MEMORY_LIMIT = int(os.getenv("UPLOAD_MEMORY_LIMIT", str(8 * 1024 * 1024)))
+    
+    # Admission control: budget memori OCR (byte) bersama semua worker, 0 = mati.
+    # Request yang tidak muat antri maksimal OCR_ADMISSION_MAX_WAIT detik lalu 503 + Retry-After
+    OCR_MEMORY_BUDGET = int(os.getenv("OCR_MEMORY_BUDGET", str(1024 * 1024 * 1024)))
+    OCR_ADMISSION_MAX_WAIT = float(os.getenv("OCR_ADMISSION_MAX_WAIT", "10"))
+    OCR_ADMISSION_RETRY_AFTER = int(os.getenv("OCR_ADMISSION_RETRY_AFTER", "5"))
+    
+    # Jumlah maksimum baris per request /api/bukti_setor/save/bulk
+    SAVE_MAX_RECORDS = int(os.getenv("SAVE_MAX_RECORDS", "1000"))
+    
+    # Export XLSX/CSV: jumlah baris yang dibaca dari database per chunk
+    EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+    
+    # Urutan stage preprocessing: deskew, denoise, lalu threshold adaptive atau otsu
+    OCR_PREPROCESS_STAGES = os.getenv("OCR_PREPROCESS_STAGES", "deskew,adaptive")
+    
+    # Tesseract OSD sebagai fallback orientasi (butuh osd.traineddata)
+    OCR_OSD_ENABLED = os.getenv("OCR_OSD_ENABLED", "true").lower() == "true"
+    # Halaman tanpa field terbaca dengan confidence OCR di bawah ini dicek OSD (terbalik?)
+    OCR_OSD_MAX_PAGE_CONFIDENCE = float(os.getenv("OCR_OSD_MAX_PAGE_CONFIDENCE", "40"))
+    
+    # Layout field di-cache per template bukti setor: region field yang labelnya
+    # tidak terbaca diambil dari cache untuk retry per field
+    # (OCR_ROI_ENABLED = nama lama setting ini)
+    OCR_LAYOUT_CACHE_ENABLED = os.getenv(
+        "OCR_LAYOUT_CACHE_ENABLED", os.getenv("OCR_ROI_ENABLED", "true")
+    ).lower() == "true"
+    OCR_LAYOUT_CACHE_SIZE = int(os.getenv("OCR_LAYOUT_CACHE_SIZE", "32"))
+    
+    # Retry per field: field hilang / confidence di bawah batas dibaca ulang pada region-nya
+    OCR_RETRY_ENABLED = os.getenv("OCR_RETRY_ENABLED", "true").lower() == "true"
+    OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "60"))
+    
+    # Jalankan satu halaman OCR dummy saat worker start, sebelum menerima request
+    OCR_WARMUP = os.getenv("OCR_WARMUP", "true").lower() == "true"
+    
+    # Folder snapshot metrics per worker gunicorn (digabung oleh endpoint /metrics)
+    METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "easyocr-metrics"))
+    
     # Path Poppler (untuk konversi PDF)
     POPPLER_PATH = os.getenv("POPPLER_PATH")
     
@@ -0,0 +1,34 @@
+# gunicorn.conf.py - Konfigurasi gunicorn (otomatis dibaca dari working directory)
+# -*- coding: utf-8 -*-
+#
+# App di-preload di master: import modul berat dan inisialisasi database terjadi
+# sekali, lalu worker di-fork dan berbagi memori itu (copy-on-write). Objek per
+# worker (processor OCR, antrian job) dibuat di post_worker_init, termasuk
+# warm-up OCR, sebelum worker mulai menerima request. Snapshot metrics worker
+# yang exit digabung master (child_exit) dan dikosongkan saat master start.
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+def on_starting(server):
+    from bukti_setor.metrics import registry
+    registry.reset()
+    if preload_app:
+        # Hanya dipakai export, tapi cukup di-import sekali di master
+        import openpyxl  # noqa: F401
+
+def post_worker_init(worker):
+    worker.wsgi.extensions['easyocr_worker'].get()
+
+def worker_exit(server, worker):
+    # Tulis angka terakhir worker ini sebelum digabung master
+    from bukti_setor.metrics import registry
+    registry.flush(force=True)
+
+def child_exit(server, worker):
+    from bukti_setor.metrics import registry
+    registry.mark_process_dead(worker.pid)
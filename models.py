@@ -1,19 +1,34 @@
 # models.py - Database models for production
+import json
+import logging
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import deferred
+from sqlalchemy.schema import CreateIndex
 from datetime import datetime
 
 db = SQLAlchemy()
+logger = logging.getLogger(__name__)
 
 class BuktiSetor(db.Model):
     """Model untuk menyimpan data bukti setor pajak"""
     __tablename__ = 'bukti_setor'
+    __table_args__ = (
+        # Urutan history / keyset pagination: ORDER BY created_at DESC, id DESC
+        db.Index('ix_bukti_setor_created_at_id', 'created_at', 'id'),
+        # Satu NTPN = satu bukti setor; dasar save idempotent (ON CONFLICT DO NOTHING)
+        db.Index('uq_bukti_setor_ntpn', 'ntpn', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    kode_setor = db.Column(db.String(100), nullable=False)
-    tanggal = db.Column(db.Date, nullable=False)
+    kode_setor = db.Column(db.String(100), nullable=False, index=True)
+    tanggal = db.Column(db.Date, nullable=False, index=True)
     jumlah = db.Column(db.Numeric(15, 2), nullable=False)
     ntpn = db.Column(db.String(100), nullable=True)
     preview_filename = db.Column(db.String(255), nullable=True)
+    # Teks OCR lengkap, terkompresi zlib (lihat bukti_setor/search.py); tidak ikut
+    # di-load history/export kecuali diminta
+    ocr_text = deferred(db.Column(db.LargeBinary, nullable=True))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
@@ -30,3 +45,94 @@ class BuktiSetor(db.Model):
     
     def __repr__(self):
         return f'<BuktiSetor {self.kode_setor} - {self.tanggal}>'
+
+class OcrJob(db.Model):
+    """Model untuk job OCR asynchronous (bertahan walau worker restart)"""
+    __tablename__ = 'ocr_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(512), nullable=True)
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    # Anggota batch asynchronous: id batch dan urutan file di dalam batch
+    batch_id = db.Column(db.String(32), nullable=True, index=True)
+    batch_index = db.Column(db.Integer, nullable=True)
+    # Worker yang memegang job di antriannya ("pid:token", lihat runtime.worker_id)
+    worker = db.Column(db.String(64), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        """Convert model to dictionary"""
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'filename': self.filename,
+            'error': self.error,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else '',
+            'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S') if self.started_at else '',
+            'finished_at': self.finished_at.strftime('%Y-%m-%d %H:%M:%S') if self.finished_at else ''
+        }
+        if self.batch_id:
+            data['batch_id'] = self.batch_id
+        if self.result:
+            data['result'] = json.loads(self.result)
+        return data
+    
+    def __repr__(self):
+        return f'<OcrJob {self.id} - {self.status}>'
+
+def ensure_columns():
+    """
+    Tambahkan kolom model (nullable) yang belum ada di tabel database lama,
+    karena create_all tidak mengubah tabel yang sudah ada. Return daftar
+    "tabel.kolom" yang baru ditambahkan.
+    """
+    added = []
+    inspector = inspect(db.engine)
+    for model in (BuktiSetor, OcrJob):
+        table = model.__table__
+        if not inspector.has_table(table.name):
+            continue
+        existing = {col['name'] for col in inspector.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in existing or not col.nullable:
+                continue
+            col_type = col.type.compile(dialect=db.engine.dialect)
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}'))
+                added.append(f'{table.name}.{col.name}')
+            except Exception as e:
+                # Worker lain mungkin menambahkannya bersamaan
+                logger.error(f"❌ Gagal menambah kolom {table.name}.{col.name}: {e}")
+    return added
+
+def ensure_indexes():
+    """
+    Buat index model yang belum ada di database lama (create_all tidak menambah
+    index ke tabel yang sudah ada). Memakai CREATE INDEX IF NOT EXISTS sehingga
+    aman dijalankan berulang dan bersamaan oleh beberapa worker (SQLite & PostgreSQL).
+    Return daftar nama index yang baru dibuat.
+    """
+    created = []
+    inspector = inspect(db.engine)
+    for model in (BuktiSetor, OcrJob):
+        table = model.__table__
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+                created.append(index.name)
+            except Exception as e:
+                # Mis. index unik gagal karena data lama berisi NTPN ganda
+                logger.error(f"❌ Gagal membuat index {index.name}: {e}")
+    return created
@@ -0,0 +1,47 @@
+# tests/conftest.py - Fixture app Flask dengan database SQLite sementara
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+
+import pytest
+
+# Config dan app module-level dibuat saat import: tanpa warm-up OCR, database,
+# metrics dan upload folder (cwd/uploads) di folder sementara
+_tmp = tempfile.mkdtemp(prefix="easyocr-test-")
+os.environ.setdefault("OCR_WARMUP", "false")
+os.environ.setdefault("METRICS_DIR", os.path.join(_tmp, "metrics"))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'import.db')}"
+
+_cwd = os.getcwd()
+os.chdir(_tmp)
+try:
+    from app import create_app  # noqa: E402
+    from models import db  # noqa: E402
+finally:
+    os.chdir(_cwd)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """App dengan database SQLite dan upload folder baru per test"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def receipt(**fields):
+    """Hasil OCR minimal yang valid untuk /api/bukti_setor/save"""
+    data = {"kode_setor": "411211", "tanggal": "2024-03-01", "jumlah": 1500000}
+    data.update(fields)
+    return data
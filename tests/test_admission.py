@@ -0,0 +1,94 @@
+# tests/test_admission.py - Buku besar budget memori OCR (acquire/release)
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+from bukti_setor.admission import AdmissionController, OverBudget
+
+
+@pytest.fixture
+def controller(tmp_path):
+    return AdmissionController(str(tmp_path / "admission.sqlite3"), max_bytes=100, max_wait=0)
+
+
+def insert_ticket(controller, pid, owner, cost=50):
+    controller._conn().execute(
+        "INSERT INTO admission (pid, cost, admitted_at, owner) VALUES (?, ?, ?, ?)",
+        (pid, cost, time.time(), owner)
+    )
+
+
+def dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def test_admit_and_release(controller):
+    first = controller.admit(60)
+    assert controller.usage()["in_use_bytes"] == 60
+    assert controller.usage()["active"] == 1
+
+    with pytest.raises(OverBudget):
+        controller.admit(60)
+
+    first.release()
+    first.release()  # release kedua tidak melakukan apa-apa
+    assert controller.usage()["in_use_bytes"] == 0
+    with controller.admit(60):
+        assert controller.usage()["active"] == 1
+    assert controller.usage()["active"] == 0
+
+
+def test_lone_request_over_budget_is_admitted(controller):
+    with controller.admit(500):
+        assert controller.usage()["in_use_bytes"] == 500
+
+
+def test_long_running_ticket_is_kept(controller):
+    # Job yang berjalan berjam-jam tetap memegang budget-nya
+    ticket = controller.admit(60, timeout=None)
+    controller._conn().execute("UPDATE admission SET admitted_at = 0")
+    with pytest.raises(OverBudget):
+        controller.admit(60)
+    ticket.release()
+
+
+def test_tickets_of_dead_or_replaced_process_are_dropped(controller):
+    insert_ticket(controller, dead_pid(), "worker-lama")
+    # pid proses ini dipakai ulang: tiket dengan token lain milik proses lama
+    insert_ticket(controller, os.getpid(), "pid-dipakai-ulang")
+    assert controller.usage()["active"] == 2
+
+    with controller.admit(60):
+        assert controller.usage()["active"] == 1
+
+
+def test_old_ledger_without_owner_column(tmp_path):
+    path = str(tmp_path / "admission.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE admission (id INTEGER PRIMARY KEY AUTOINCREMENT, pid INTEGER NOT NULL, "
+        "cost INTEGER NOT NULL, admitted_at REAL NOT NULL)"
+    )
+    conn.execute("INSERT INTO admission (pid, cost, admitted_at) VALUES (?, 50, 0)", (os.getpid(),))
+    conn.commit()
+    conn.close()
+
+    controller = AdmissionController(path, max_bytes=100, max_wait=0)
+    # Tiket tanpa token berasal dari versi lama, bukan dari proses ini
+    with controller.admit(60):
+        assert controller.usage()["in_use_bytes"] == 60
+
+
+def test_disabled_controller_admits_everything(tmp_path):
+    controller = AdmissionController(str(tmp_path / "admission.sqlite3"), max_bytes=0)
+    with controller.admit(10 ** 12) as ticket:
+        assert ticket.ticket_id is None
+    assert controller.usage()["enabled"] is False
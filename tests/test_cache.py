@@ -0,0 +1,49 @@
+# tests/test_cache.py - Cache hasil OCR: batas ukuran & umur tier disk
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import time
+
+from bukti_setor.cache import ResultCache
+
+
+def disk_keys(cache):
+    return [row[0] for row in cache._conn().execute("SELECT key FROM ocr_cache ORDER BY key")]
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(max_bytes=0, db_path=str(tmp_path / "ocr_cache.sqlite3"), disk_max_bytes=300)
+    cache._last_evict = time.time()  # eviction dijalankan manual di bawah
+    for i, key in enumerate(("a", "b", "c", "d")):
+        cache.put(key, {"data": "x" * 80})
+        cache._conn().execute("UPDATE ocr_cache SET last_access = ? WHERE key = ?", (time.time() - 100 + i, key))
+    cache._conn().commit()
+    assert cache.get("a") is not None  # disk hit memperbarui last_access
+
+    assert cache.evict() == 2
+    assert disk_keys(cache) == ["a", "d"]
+    assert cache.stats()["disk_evictions"] == 2
+    assert cache.stats()["disk_bytes"] <= 300
+
+
+def test_disk_tier_drops_rows_older_than_max_age(tmp_path):
+    cache = ResultCache(max_bytes=0, db_path=str(tmp_path / "ocr_cache.sqlite3"), disk_max_age_days=30)
+    cache.put("lama", {"data": 1})
+    cache.put("baru", {"data": 2})
+    cache._conn().execute("UPDATE ocr_cache SET last_access = ? WHERE key = 'lama'", (time.time() - 31 * 86400,))
+    cache._conn().commit()
+    assert cache.evict() == 1
+    assert disk_keys(cache) == ["baru"]
+
+
+def test_old_cache_table_is_migrated(tmp_path):
+    path = str(tmp_path / "ocr_cache.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE ocr_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)")
+    conn.execute("INSERT INTO ocr_cache VALUES ('k', '{\"data\": 1}', ?)", (time.time(),))
+    conn.commit()
+    conn.close()
+
+    cache = ResultCache(max_bytes=0, db_path=path)
+    assert cache.get("k") == {"data": 1}
+    assert cache.stats()["disk_bytes"] == len('{"data": 1}')
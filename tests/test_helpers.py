@@ -0,0 +1,17 @@
+# tests/test_helpers.py - Bentuk response JSON standar
+# -*- coding: utf-8 -*-
+
+from utils.helpers import format_response
+
+
+def test_format_response_keeps_processor_message():
+    result = {"data": [], "message": "Berhasil memproses 2 halaman"}
+    response = format_response(result, "OCR processing completed successfully")
+    assert response["message"] == "Berhasil memproses 2 halaman"
+    assert response["success"] is True
+
+
+def test_format_response_default_message():
+    response = format_response({"success": True, "data": []}, "OCR processing completed successfully")
+    assert response["message"] == "OCR processing completed successfully"
+    assert "message" not in format_response({"data": []})
@@ -0,0 +1,58 @@
+# tests/test_history.py - History dengan keyset pagination (cursor)
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from tests.conftest import receipt
+
+
+@pytest.fixture
+def saved(client):
+    records = [
+        receipt(ntpn=f"{i:016d}", kode_setor="411121" if i % 2 else "411211", tanggal=f"2024-03-0{i}")
+        for i in range(1, 8)
+    ]
+    response = client.post("/api/bukti_setor/save/bulk", json={"records": records})
+    assert response.json["summary"]["created"] == 7
+    return [result["id"] for result in response.json["results"]]
+
+
+def walk(client, query=""):
+    """Ikuti next_cursor sampai halaman terakhir, return id per halaman"""
+    pages = []
+    url = f"/api/bukti_setor/history?per_page=3{query}"
+    while True:
+        response = client.get(url)
+        assert response.status_code == 200, response.json
+        pagination = response.json["pagination"]
+        pages.append([item["id"] for item in response.json["data"]])
+        if not pagination["has_next"]:
+            assert pagination["next_cursor"] is None
+            return pages
+        url = f"/api/bukti_setor/history?per_page=3{query}&cursor={pagination['next_cursor']}"
+
+
+def test_cursor_pages_cover_all_records_newest_first(client, saved):
+    pages = walk(client)
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sum(pages, []) == sorted(saved, reverse=True)
+
+
+def test_cursor_pages_with_filters_and_total(client, saved):
+    pages = walk(client, "&kode_setor=411121&start=2024-03-02")
+    assert sum(pages, []) == [saved[6], saved[4], saved[2]]
+
+    response = client.get("/api/bukti_setor/history?kode_setor=411211&total=1")
+    assert response.json["pagination"]["total"] == 3
+    assert response.json["pagination"]["total_is_estimate"] is False
+
+
+def test_offset_page_still_supported(client, saved):
+    response = client.get("/api/bukti_setor/history?page=2&per_page=3")
+    assert [item["id"] for item in response.json["data"]] == sorted(saved, reverse=True)[3:6]
+    assert response.json["pagination"]["total"] == 7
+
+
+@pytest.mark.parametrize("query", ["cursor=bukan-cursor", "start=03-01-2024", "start=2024-03-05&end=2024-03-01"])
+def test_invalid_history_query(client, query):
+    assert client.get(f"/api/bukti_setor/history?{query}").status_code == 400
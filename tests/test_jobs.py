@@ -0,0 +1,129 @@
+# tests/test_jobs.py - Batch besar diantrikan sebagai job per file
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import subprocess
+import sys
+import time
+import zipfile
+from datetime import datetime
+
+import pytest
+
+from bukti_setor.admission import Ticket
+from bukti_setor.jobs import JobManager, QueueFull
+from bukti_setor.processor import PreparedDocument
+
+
+class FakeProcessor:
+    """Processor tanpa Tesseract: hasil OCR dari isi file"""
+
+    page_workers = 2
+
+    def __init__(self, upload_folder):
+        self.upload_folder = upload_folder
+
+    def prepare(self, filepath=None, data=None, filename=None):
+        return PreparedDocument(filename, filepath=filepath, data=data)
+
+    def admit(self, doc, admission, timeout=-1):
+        return Ticket(admission, None, 0)
+
+    def process(self, doc):
+        with open(doc.filepath, "rb") as f:
+            data = f.read()
+        if data == b"rusak":
+            return {"success": False, "error": "Gagal membaca file"}
+        return {"success": True, "filename": doc.filename,
+                "data": [{"page": 1, "ntpn": data.decode()}], "timings": {"total_ms": 1}}
+
+
+@pytest.fixture
+def manager(app, tmp_path):
+    manager = JobManager(app, FakeProcessor(str(tmp_path)), batch_capacity=3)
+    yield manager
+    manager.shutdown()
+
+
+def dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def wait_batch(manager, batch_id):
+    for _ in range(200):
+        batch = manager.get_batch(batch_id)
+        if batch["status"] == "done" and manager.pending == 0:
+            return batch
+        time.sleep(0.01)
+    raise AssertionError(f"batch belum selesai: {batch}")
+
+
+def test_batch_members_run_as_jobs_in_input_order(manager):
+    items = [("a.pdf", b"111"), ("b.exe", ValueError("Format file tidak didukung")), ("c.pdf", b"rusak")]
+    batch_id, total = manager.submit_batch(iter(items), expected=3)
+    assert total == 3
+
+    batch = wait_batch(manager, batch_id)
+    assert [item["filename"] for item in batch["results"]] == ["a.pdf", "b.exe", "c.pdf"]
+    assert [item["status"] for item in batch["results"]] == ["done", "failed", "failed"]
+    assert batch["results"][0]["data"] == [{"page": 1, "ntpn": "111"}]
+    assert batch["results"][1]["error"] == "Format file tidak didukung"
+    assert (batch["berhasil"], batch["gagal"], batch["selesai"]) == (1, 2, 3)
+    assert manager.pending == 0
+
+
+def test_batch_over_capacity_is_rejected(manager):
+    with pytest.raises(QueueFull):
+        manager.submit_batch(iter([]), expected=4)
+    assert manager.pending == 0
+    assert manager.get_batch("tidak-ada") is None
+
+
+def test_large_batch_endpoint_returns_batch_id(client, monkeypatch):
+    monkeypatch.setattr("app.Config.BATCH_SYNC_MAX_FILES", 1)
+    submitted = {}
+
+    def submit_batch(self, items, expected):
+        submitted["names"] = [name for name, _ in items]
+        submitted["expected"] = expected
+        return "b" * 32, len(submitted["names"])
+
+    monkeypatch.setattr(JobManager, "submit_batch", submit_batch)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("a.pdf", b"%PDF-1")
+        zf.writestr("b.jpg", b"\xff\xd8")
+
+    response = client.post("/api/bukti_setor/batch", data=archive.getvalue(), content_type="application/zip")
+    assert response.status_code == 202
+    assert response.json["status_url"] == f"/api/bukti_setor/batch/{'b' * 32}"
+    assert submitted == {"names": ["a.pdf", "b.jpg"], "expected": 2}
+
+
+def test_recover_only_takes_jobs_of_dead_workers(app, manager, monkeypatch):
+    from models import db, OcrJob
+    from bukti_setor.runtime import worker_id
+
+    monkeypatch.setattr(manager, "_run", lambda job_id, batch=False: None)
+    other = f"{os.getppid()}:worker-lain"
+    db.session.add_all([
+        OcrJob(id="dead", status="queued", filename="a.pdf", worker=f"{dead_pid()}:lama"),
+        OcrJob(id="legacy", status="queued", filename="b.pdf"),
+        OcrJob(id="alive", status="queued", filename="c.pdf", worker=other),
+        OcrJob(id="running", status="running", filename="d.pdf", worker=other, started_at=datetime(2000, 1, 1)),
+        OcrJob(id="done", status="done", filename="e.pdf", worker=f"{dead_pid()}:lama"),
+    ])
+    db.session.commit()
+
+    assert manager.recover() == 2
+    assert manager.pending == 2
+    workers = {job.id: job.worker for job in OcrJob.query}
+    assert workers["dead"] == workers["legacy"] == worker_id()
+    assert workers["alive"] == workers["running"] == other
+
+    # Worker kedua yang start bersamaan tidak mengambil (dan menghitung) job yang sama
+    assert manager.recover() == 0
+    assert manager.pending == 2
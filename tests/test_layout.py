@@ -0,0 +1,26 @@
+# tests/test_layout.py - Pengenalan template dari teks header
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from bukti_setor.layout import detect_template
+
+
+@pytest.mark.parametrize("header, template", [
+    ("BUKTI PENERIMAAN NEGARA\nBANK RAKYAT INDONESIA (BRI)", "djp_bpn"),
+    ("PT BANK RAKYAT INDONESIA\nBRI  Cabang Sudirman", "bank_bri"),
+    ("bni46 kantor cabang", "bank_bni"),
+    ("Bank Mandiri", "bank_mandiri"),
+])
+def test_detect_template_by_whole_marker(header, template):
+    assert detect_template(header) == template
+
+
+@pytest.mark.parametrize("header", [
+    "PT FABRIKAN BRIGHT INDONESIA",   # BRI hanya sebagai bagian kata
+    "BANK JAGO",                      # bank tanpa template spesifik
+    "",
+    None,
+])
+def test_detect_template_unknown_header(header):
+    assert detect_template(header) is None
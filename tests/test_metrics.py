@@ -0,0 +1,42 @@
+# tests/test_metrics.py - Snapshot metrics per worker dan penggabungannya
+# -*- coding: utf-8 -*-
+
+import os
+
+from bukti_setor.metrics import DEAD_SNAPSHOT, Registry
+
+
+def requests_total(registry):
+    counters, _ = registry.collect()
+    return sum(value for (name, _), value in counters.items() if name == "easyocr_requests_total")
+
+
+def test_dead_worker_snapshot_is_folded_and_removed(tmp_path):
+    worker = Registry(str(tmp_path))
+    worker.inc("easyocr_requests_total", 3, endpoint="health", status="200")
+    worker.observe("easyocr_document_pages", 2)
+    worker.flush(force=True)
+    # Snapshot worker lain yang sudah exit, PID-nya nanti bisa dipakai ulang
+    os.replace(tmp_path / f"metrics_{os.getpid()}.json", tmp_path / "metrics_1.json")
+
+    master = Registry(str(tmp_path))
+    master.mark_process_dead(1)
+    assert not (tmp_path / "metrics_1.json").exists()
+    assert (tmp_path / DEAD_SNAPSHOT).exists()
+
+    current = Registry(str(tmp_path))
+    current.inc("easyocr_requests_total", endpoint="health", status="200")
+    assert requests_total(current) == 4
+    _, histograms = current.collect()
+    assert histograms[("easyocr_document_pages", ())][2] == 1
+
+
+def test_reset_clears_previous_run(tmp_path):
+    old = Registry(str(tmp_path))
+    old.inc("easyocr_requests_total", 5, endpoint="health", status="200")
+    old.flush(force=True)
+
+    fresh = Registry(str(tmp_path))
+    fresh.reset()
+    assert requests_total(fresh) == 0
+    assert os.listdir(tmp_path) == [f"metrics_{os.getpid()}.json"]
@@ -0,0 +1,90 @@
+# tests/test_ocr_backend.py - Pemilihan backend OCR (tesserocr tanpa fallback diam-diam)
+# -*- coding: utf-8 -*-
+
+import types
+
+import numpy as np
+import pytest
+
+from bukti_setor import ocr_backend
+from bukti_setor.ocr_backend import get_ocr_backend
+from bukti_setor.processor import TESSERACT_CONFIG
+
+
+class FakeTessBaseAPI:
+    """Meniru PyTessBaseAPI: argumen psm/oem harus int biasa"""
+
+    instances = []
+
+    def __init__(self, path=None, lang="eng", psm=3, oem=3):
+        assert type(psm) is int and type(oem) is int
+        self.lang, self.psm, self.oem = lang, psm, oem
+        self.page_seg_modes = []
+        self.variables = {}
+        FakeTessBaseAPI.instances.append(self)
+
+    def SetVariable(self, key, val):
+        self.variables[key] = val
+
+    def SetPageSegMode(self, psm):
+        assert type(psm) is int
+        self.page_seg_modes.append(psm)
+
+    def SetImageBytes(self, data, width, height, bpp, bpl):
+        pass
+
+    def GetUTF8Text(self):
+        return "NTPN 1234567890123456"
+
+    def Clear(self):
+        pass
+
+    def End(self):
+        pass
+
+
+def fake_tesserocr():
+    # Seperti tesserocr asli: PSM/OEM/RIL kelas berisi konstanta, tidak bisa dipanggil PSM(6)
+    class PSM:
+        OSD_ONLY, AUTO, SINGLE_BLOCK, SINGLE_LINE = 0, 3, 6, 7
+
+    class OEM:
+        LSTM_ONLY, DEFAULT = 1, 3
+
+    class RIL:
+        BLOCK, PARA, TEXTLINE, WORD = 0, 1, 2, 3
+
+    return types.SimpleNamespace(PSM=PSM, OEM=OEM, RIL=RIL, PyTessBaseAPI=FakeTessBaseAPI)
+
+
+@pytest.fixture
+def tesserocr(monkeypatch):
+    FakeTessBaseAPI.instances = []
+    monkeypatch.setattr(ocr_backend, "tesserocr", fake_tesserocr())
+
+
+def test_auto_uses_tesserocr_with_default_config(tesserocr):
+    backend = get_ocr_backend("auto", TESSERACT_CONFIG)
+    assert backend.name == "tesserocr"
+    api = FakeTessBaseAPI.instances[0]
+    assert (api.lang, api.psm, api.oem) == ("ind+eng", 6, 3)
+    backend.close()
+
+
+def test_config_override_restores_default_psm(tesserocr):
+    backend = get_ocr_backend("tesserocr", TESSERACT_CONFIG)
+    image = np.zeros((10, 10), np.uint8)
+    assert backend.image_to_string(image, config="--psm 7 -c tessedit_char_whitelist=0123456789")
+    api = FakeTessBaseAPI.instances[0]
+    assert api.page_seg_modes == [7, 6]
+    assert api.variables["tessedit_char_whitelist"] == ""
+    backend.close()
+
+
+def test_real_tesserocr_does_not_fall_back():
+    pytest.importorskip("tesserocr")
+    backend = get_ocr_backend("auto", TESSERACT_CONFIG)
+    try:
+        assert backend.name == "tesserocr"
+    finally:
+        backend.close()
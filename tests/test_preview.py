@@ -0,0 +1,117 @@
+# tests/test_preview.py - Nama preview dari hash upload dan render resolusi penuh di disk
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from bukti_setor.preview import PreviewStore, full_name
+
+
+def page(value=255):
+    return np.full((400, 300, 3), value, np.uint8)
+
+
+def test_name_from_source_and_page_number(tmp_path):
+    store = PreviewStore(str(tmp_path), fmt="jpeg", workers=0)
+    first = store.submit(page(), 1, source="abc")
+    assert store.submit(page(0), 1, source="abc") == first
+    assert store.submit(page(), 2, source="abc") != first
+    assert store.submit(page(), 1, source="def") != first
+    store.close()
+
+
+def test_full_render_is_written_with_thumbnail(tmp_path):
+    store = PreviewStore(str(tmp_path), fmt="jpeg", max_size=100, full_size="eager", workers=1)
+    name = store.submit(page(), 1, source="abc")
+    store.flush()
+    assert store.full(name) == store.path(full_name(name))
+    assert os.path.exists(store.full(name))
+    store.close()
+
+    # Worker lain (store baru, tanpa state di memori) tetap menemukannya
+    other = PreviewStore(str(tmp_path), fmt="jpeg", max_size=100, full_size="eager", workers=0)
+    assert other.full(name) is not None
+    other.close()
+
+
+def test_full_size_off_keeps_thumbnail_only(tmp_path):
+    store = PreviewStore(str(tmp_path), fmt="jpeg", full_size="off", workers=0)
+    name = store.submit(page(), 1, source="abc")
+    assert os.path.exists(store.path(name))
+    assert store.full(name) is None
+    store.close()
+
+
+def test_pinned_full_render_is_not_evicted(tmp_path):
+    store = PreviewStore(str(tmp_path), fmt="jpeg", full_size="eager", workers=0, max_age_days=0)
+    kept = store.submit(page(), 1, source="kept")
+    dropped = store.submit(page(), 1, source="dropped")
+    store.pin(kept)
+    store.max_bytes = 1
+    assert store.evict() == 2
+    assert store.full(kept) is not None
+    assert store.full(dropped) is None
+    store.close()
+
+
+def png(value=255):
+    return cv2.imencode(".png", page(value))[1].tobytes()
+
+
+def test_full_render_on_demand_from_kept_source(tmp_path):
+    store = PreviewStore(str(tmp_path), fmt="jpeg", max_size=100, workers=1)
+    store.keep_source("abc", data=png())
+    name = store.submit(page(), 1, source="abc")
+    store.flush()
+    # Hanya thumbnail yang di-encode saat OCR
+    assert not os.path.exists(store.path(full_name(name)))
+    store.close()
+
+    # Render penuh dibuat saat pertama diminta, juga dari worker lain
+    other = PreviewStore(str(tmp_path), fmt="jpeg", max_size=100, workers=0)
+    path = other.full(name)
+    assert path == other.path(full_name(name))
+    with Image.open(path) as image:
+        assert image.size == (300, 400)
+    other.close()
+
+
+def test_on_demand_without_source_has_no_full_render(tmp_path):
+    store = PreviewStore(str(tmp_path), fmt="jpeg", workers=0)
+    assert store.full(store.submit(page(), 1)) is None
+    assert store.full(store.submit(page(), 1, source="tanpa-dokumen")) is None
+    store.close()
+
+
+def test_source_of_pinned_preview_is_not_evicted(tmp_path):
+    store = PreviewStore(str(tmp_path), fmt="jpeg", workers=0, max_age_days=0)
+    for source in ("kept", "dropped"):
+        store.keep_source(source, data=png())
+    kept = store.submit(page(), 1, source="kept")
+    dropped = store.submit(page(), 1, source="dropped")
+    store.pin(kept)
+    store.max_bytes = 1
+    assert store.evict() == 2
+    assert store.full(kept) is not None
+    assert store.full(dropped) is None
+    store.close()
+
+
+def test_pending_queue_is_bounded_by_bytes(tmp_path):
+    store = PreviewStore(str(tmp_path), fmt="jpeg", workers=1, max_pending_bytes=page().nbytes)
+    # Thread encoder ditahan: halaman yang masuk antrian belum di-encode
+    busy = threading.Event()
+    store._executor.submit(busy.wait, 5)
+    names = [store.submit(page(), number, source="abc") for number in (1, 2, 3)]
+    assert store.stats()["pending"] == 1
+    assert store.stats()["pending_bytes"] == page().nbytes
+    assert [os.path.exists(store.path(name)) for name in names] == [False, True, True]
+
+    busy.set()
+    store.flush()
+    assert store.stats()["pending_bytes"] == 0
+    store.close()
@@ -0,0 +1,179 @@
+# tests/test_processor.py - Pembacaan halaman processor dengan backend OCR palsu
+# -*- coding: utf-8 -*-
+
+import cv2
+import numpy as np
+import pytest
+
+from bukti_setor import pages, processor as processor_module
+from bukti_setor.admission import AdmissionController, OverBudget
+from bukti_setor.cache import ResultCache
+from bukti_setor.processor import BuktiSetorProcessor
+
+WIDTH, HEIGHT = 1000, 1400
+LINES = [
+    (1, "BUKTI PENERIMAAN NEGARA"),
+    (2, "NPWP : 01.234.567.8-901.000"),
+    (2, "Nama Penyetor : PT Maju Jaya"),
+    (2, "Kode Setor : 411211"),
+    (2, "Tanggal Setor : 3 Maret 2021"),
+    (2, "Jumlah Setor : Rp 1.500.000,00"),
+    (2, "NTPN : 1234567890123456"),
+    (3, "Terima kasih"),
+]
+
+
+def page_words(lines=LINES, conf=None):
+    words = []
+    for row, (block, text) in enumerate(lines):
+        left = 50
+        for word in text.split():
+            words.append({
+                "text": word, "conf": (conf or {}).get(word, 90.0), "left": left, "top": 100 + row * 60, "width": len(word) * 14,
+                "height": 30, "block": block, "par": 1, "line": row + 1,
+            })
+            left += len(word) * 14 + 12
+    return words
+
+
+class FakeOCR:
+    """Backend OCR palsu: halaman penuh = LINES, crop field tidak terbaca"""
+
+    name = "fake"
+
+    def __init__(self):
+        self.calls = []
+        self.lines = LINES
+        self.conf = {}
+        self.crop_words = []
+
+    def image_to_data(self, image, config=None):
+        self.calls.append("page" if config is None else "crop")
+        return page_words(self.lines, self.conf) if config is None else self.crop_words
+
+    def image_to_string(self, image, config=None):
+        self.calls.append("string")
+        return ""
+
+    def detect_orientation(self, image):
+        return None
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def processor(tmp_path):
+    processor = BuktiSetorProcessor(
+        upload_folder=str(tmp_path), cache=False, page_workers=1, layout_cache=True, osd=False
+    )
+    processor.ocr = FakeOCR()
+    yield processor
+    processor.close()
+
+
+def test_every_page_keeps_full_ocr_text(processor):
+    image = np.full((HEIGHT, WIDTH, 3), 255, np.uint8)
+    for _ in range(3):
+        processor.ocr.calls.clear()
+        page = processor.process_image(image, 1, "bukti.png")
+        # Satu pembacaan halaman penuh, tanpa OCR header terpisah
+        assert processor.ocr.calls == ["page"]
+        assert page["layout"] == {"template": "djp_bpn", "cached_regions": []}
+        assert page["ntpn"] == "1234567890123456"
+        assert page["kode_setor"] == "411211"
+        assert "PT Maju Jaya" in page["raw_text"]
+        assert "01.234.567.8-901.000" in page["raw_text"]
+
+
+def test_missing_label_uses_cached_template_region(processor):
+    image = np.full((HEIGHT, WIDTH, 3), 255, np.uint8)
+    processor.process_image(image, 1, "bukti.png")
+
+    # Label NTPN salah baca dan nilainya tidak yakin: region retry diambil dari cache
+    processor.ocr.lines = [(block, text.replace("NTPN", "NTFN")) for block, text in LINES]
+    processor.ocr.conf = {"1234567890123456": 30.0}
+    processor.ocr.calls.clear()
+    page = processor.process_image(image, 1, "bukti.png")
+    assert page["layout"]["cached_regions"] == ["ntpn"]
+    assert "crop" in processor.ocr.calls
+    assert "NTFN : 1234567890123456" in page["raw_text"]
+
+
+
+def test_layout_cache_disabled_reads_page_without_template(tmp_path):
+    processor = BuktiSetorProcessor(
+        upload_folder=str(tmp_path), cache=False, page_workers=1, layout_cache=False, osd=False
+    )
+    processor.ocr = FakeOCR()
+    try:
+        page = processor.process_image(np.full((HEIGHT, WIDTH, 3), 255, np.uint8), 1, "bukti.png")
+    finally:
+        processor.close()
+    assert processor.layouts is None
+    assert page["layout"] == {"template": None, "cached_regions": []}
+    assert page["ntpn"] == "1234567890123456"
+
+def crop_words(text, conf):
+    return [dict(word, conf=conf) for word in page_words([(1, text)])]
+
+
+@pytest.mark.parametrize("text, conf", [
+    ("12345", 95.0),                # bukan format NTPN
+    ("9999999999999999", 50.0),     # format valid, confidence di bawah batas untuk region cache
+])
+def test_cached_region_retry_rejects_unchecked_result(processor, text, conf):
+    image = np.full((HEIGHT, WIDTH, 3), 255, np.uint8)
+    processor.process_image(image, 1, "bukti.png")
+
+    processor.ocr.lines = [(block, text.replace("NTPN : 1234567890123456", "NTFN :")) for block, text in LINES]
+    processor.ocr.crop_words = crop_words(text, conf)
+    page = processor.process_image(image, 1, "bukti.png")
+    assert page["layout"]["cached_regions"] == ["ntpn"]
+    assert "ntpn" not in page["retries"]
+    assert page["ntpn"] != text
+
+
+def test_cached_region_retry_accepts_confident_valid_result(processor):
+    image = np.full((HEIGHT, WIDTH, 3), 255, np.uint8)
+    processor.process_image(image, 1, "bukti.png")
+
+    processor.ocr.lines = [(block, text.replace("NTPN : 1234567890123456", "NTFN :")) for block, text in LINES]
+    processor.ocr.crop_words = crop_words("9999999999999999", 95.0)
+    page = processor.process_image(image, 1, "bukti.png")
+    assert page["retries"] == {"ntpn": "otsu"}
+    assert page["ntpn"] == "9999999999999999"
+
+
+def test_cached_document_skips_admission(processor, tmp_path):
+    processor.cache = ResultCache(max_bytes=10 ** 6)
+    data = cv2.imencode(".png", np.full((HEIGHT, WIDTH, 3), 255, np.uint8))[1].tobytes()
+    assert processor.process_bytes(data, "bukti.png")["success"]
+
+    # Budget penuh: dokumen baru ditolak, hasil cache tetap dijawab
+    admission = AdmissionController(str(tmp_path / "admission.sqlite3"), max_bytes=100, max_wait=0)
+    with admission.admit(100):
+        with pytest.raises(OverBudget):
+            processor.admit(processor.prepare(data=b"lain", filename="lain.png"), admission)
+        doc = processor.prepare(data=data, filename="bukti.png")
+        with processor.admit(doc, admission):
+            result = processor.process(doc)
+    assert result["cached"] is True
+    assert result["data"][0]["ntpn"] == "1234567890123456"
+
+
+def test_pdf_page_count_from_estimate_is_reused(processor, monkeypatch):
+    monkeypatch.setattr(processor_module, "pdf_layout", lambda **kwargs: (3, (595.0, 842.0)))
+
+    def pdfinfo_again(*args, **kwargs):
+        raise AssertionError("pdfinfo dijalankan dua kali")
+
+    rendered = []
+    monkeypatch.setattr(pages, "pdfinfo_stdin", pdfinfo_again)
+    monkeypatch.setattr(pages, "_render_pages", lambda render, total, *args: rendered.append(total) or [])
+
+    doc = processor.prepare(data=b"%PDF-1.4", filename="bukti.pdf")
+    processor.memory_cost(doc)
+    images, error = processor._open(doc)
+    assert error is None
+    assert rendered == [3]
@@ -0,0 +1,68 @@
+# tests/test_records.py - Save dan bulk save bukti setor (NTPN idempotent)
+# -*- coding: utf-8 -*-
+
+from datetime import date
+
+from models import db, BuktiSetor
+from bukti_setor.records import clear_missing_ntpn
+from tests.conftest import receipt
+
+
+def test_save_creates_then_reports_duplicate(client):
+    first = client.post("/api/bukti_setor/save", json=receipt(ntpn="1234567890abcdef"))
+    assert first.status_code == 201
+    assert first.json["status"] == "created"
+    assert first.json["data"]["ntpn"] == "1234567890ABCDEF"
+
+    again = client.post("/api/bukti_setor/save", json=receipt(ntpn="1234567890ABCDEF"))
+    assert again.status_code == 200
+    assert again.json["status"] == "duplicate"
+    assert again.json["id"] == first.json["id"]
+    assert BuktiSetor.query.count() == 1
+
+
+def test_save_without_ntpn_always_creates(client):
+    ids = set()
+    for ntpn in ("Tidak ditemukan", "TIDAK DITEMUKAN", "", "   ", None):
+        response = client.post("/api/bukti_setor/save", json=receipt(ntpn=ntpn))
+        assert response.status_code == 201, response.json
+        assert response.json["status"] == "created"
+        assert response.json["data"]["ntpn"] is None
+        ids.add(response.json["id"])
+    assert len(ids) == 5
+
+
+def test_save_rejects_invalid_record(client):
+    response = client.post("/api/bukti_setor/save", json={"kode_setor": "411211", "jumlah": "abc"})
+    assert response.status_code == 400
+    assert set(response.json["errors"]) == {"tanggal", "jumlah"}
+    assert BuktiSetor.query.count() == 0
+
+
+def test_bulk_save_statuses(client):
+    client.post("/api/bukti_setor/save", json=receipt(ntpn="AAAA000000000001"))
+    response = client.post("/api/bukti_setor/save/bulk", json={"records": [
+        receipt(ntpn="AAAA000000000001"),
+        receipt(ntpn="BBBB000000000002"),
+        receipt(ntpn="bbbb000000000002"),
+        receipt(ntpn="Tidak ditemukan"),
+        receipt(ntpn="Tidak ditemukan"),
+        receipt(tanggal="01-03-2024"),
+    ]})
+    assert response.status_code == 200
+    statuses = [result["status"] for result in response.json["results"]]
+    assert statuses == ["duplicate", "created", "duplicate", "created", "created", "invalid"]
+    assert response.json["summary"] == {"created": 3, "duplicate": 2, "invalid": 1}
+    results = response.json["results"]
+    assert results[2]["id"] == results[1]["id"]
+    assert BuktiSetor.query.count() == 4
+
+
+def test_clear_missing_ntpn_on_old_rows(app):
+    db.session.execute(BuktiSetor.__table__.insert(), [
+        {"kode_setor": "411211", "tanggal": date(2024, 3, 1), "jumlah": 1, "ntpn": ntpn}
+        for ntpn in ("Tidak ditemukan", "", "1234567890123456")
+    ])
+    db.session.commit()
+    assert clear_missing_ntpn() == 2
+    assert sorted(filter(None, (row.ntpn for row in BuktiSetor.query))) == ["1234567890123456"]
@@ -0,0 +1,54 @@
+# tests/test_search.py - Index full-text (SQLite FTS5) saat save dan delete
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from bukti_setor import search
+from tests.conftest import receipt
+
+RAW_TEXT = """BUKTI PENERIMAAN NEGARA
+NPWP : 01.234.567.8-901.000
+Nama Penyetor : PT Maju Jaya
+Bank : BANK RAKYAT INDONESIA"""
+
+
+@pytest.fixture
+def saved(client):
+    if not search.available():
+        pytest.skip("SQLite tanpa FTS5")
+    response = client.post("/api/bukti_setor/save", json=receipt(ntpn="1234567890123456", raw_text=RAW_TEXT))
+    assert response.status_code == 201
+    other = client.post("/api/bukti_setor/save", json=receipt(ntpn="6543210987654321", jumlah=250000, raw_text="PT Lain Sentosa"))
+    return response.json["id"], other.json["id"]
+
+
+def found(client, q, **params):
+    response = client.get("/api/bukti_setor/search", query_string={"q": q, **params})
+    assert response.status_code == 200, response.json
+    return [item["id"] for item in response.json["data"]]
+
+
+@pytest.mark.parametrize("q", [
+    "maju jaya",                 # kata di teks OCR
+    "raky",                      # prefix kata terakhir
+    "012345678901000",           # NPWP tanpa pemisah
+    "01.234.567.8",              # sebagian NPWP dengan pemisah
+    "1.500.000",                 # jumlah setor
+    "12345678901",               # prefix NTPN
+])
+def test_search_finds_saved_record(client, saved, q):
+    assert found(client, q) == [saved[0]]
+
+
+def test_search_requires_all_words_and_applies_filters(client, saved):
+    assert found(client, "maju sentosa") == []
+    assert sorted(found(client, "pt")) == sorted(saved)
+    assert found(client, "pt", ntpn="6543210987654321") == [saved[1]]
+    assert client.get("/api/bukti_setor/search?q=%20-").status_code == 400
+
+
+def test_deleted_record_is_unindexed(client, saved):
+    response = client.delete(f"/api/bukti_setor/delete/{saved[0]}")
+    assert response.status_code == 200
+    assert found(client, "maju jaya") == []
+    assert found(client, "pt") == [saved[1]]
@@ -1,9 +1,8 @@
 # utils/file_utils.py
 
 import os
-import re
-import hashlib
-from io import BytesIO
+import time
+import tempfile
 from PIL import Image
 
 ALLOWED_EXTENSIONS = {"pdf", "png", "jpg", "jpeg"}
@@ -25,41 +24,41 @@ def is_valid_image(path):
     except Exception:
         return False
 
-def simpan_preview_image(pil_image, upload_folder, page_num=1, original_filename="preview"):
+def cleanup_temp_files(folder, max_age_seconds=3600, prefix="tmp"):
+    """Hapus file sementara yang lebih tua dari max_age_seconds"""
+    dihapus = 0
+    if not os.path.isdir(folder):
+        return dihapus
+
+    batas = time.time() - max_age_seconds
+    for name in os.listdir(folder):
+        if not name.startswith(prefix):
+            continue
+        path = os.path.join(folder, name)
+        try:
+            if os.path.isfile(path) and os.path.getmtime(path) < batas:
+                os.remove(path)
+                dihapus += 1
+        except OSError as e:
+            print(f"[⚠️ CLEANUP] Gagal menghapus {name}: {e}")
+    return dihapus
+
+def save_stream_to_tempfile(stream, max_bytes, chunk_size=1024 * 1024, suffix=""):
     """
-    Simpan preview image untuk ditampilkan di frontend
+    Tulis stream (misal request.stream) ke file sementara per chunk.
+    Mengembalikan file object yang sudah di-seek ke awal (hapus sendiri saat ditutup),
+    atau raise ValueError jika ukurannya melebihi max_bytes.
     """
+    tmp = tempfile.TemporaryFile(suffix=suffix)
+    total = 0
     try:
-        # Pastikan folder upload ada
-        os.makedirs(upload_folder, exist_ok=True)
-        
-        # Konversi ke RGB jika perlu
-        pil_image = pil_image.convert("RGB")
-        
-        # Buat buffer untuk menyimpan gambar
-        buffer = BytesIO()
-        pil_image.save(buffer, format="JPEG", quality=85)
-        img_bytes = buffer.getvalue()
-        
-        # Buat hash untuk nama file unik
-        img_hash = hashlib.md5(img_bytes).hexdigest()
-        
-        # Buat nama file yang aman
-        safe_name = os.path.splitext(os.path.basename(original_filename))[0]
-        safe_name = re.sub(r'[^\w\-_.]', '_', safe_name)  # Hapus karakter tidak aman
-        filename = f"{safe_name}_hal_{page_num}_{img_hash[:8]}.jpg"
-        filepath = os.path.join(upload_folder, filename)
-        
-        # Simpan jika belum ada
-        if not os.path.exists(filepath):
-            with open(filepath, "wb") as f:
-                f.write(img_bytes)
-            print(f"[📸 PREVIEW DISIMPAN] {filename}")
-        else:
-            print(f"[📎 PREVIEW SUDAH ADA] {filename}")
-        
-        return filename
-        
-    except Exception as e:
-        print(f"[❌ ERROR SIMPAN PREVIEW] {e}")
-        return None
+        for chunk in iter(lambda: stream.read(chunk_size), b""):
+            total += len(chunk)
+            if total > max_bytes:
+                raise ValueError("File terlalu besar")
+            tmp.write(chunk)
+        tmp.seek(0)
+        return tmp
+    except Exception:
+        tmp.close()
+        raise
@@ -1,6 +1,7 @@
 # utils/helpers.py
 
 import re
+import json
 from PIL import Image
 
 ALLOWED_EXTENSIONS = {"pdf", "png", "jpg", "jpeg"}
@@ -50,3 +51,44 @@ def clean_string(text):
     text = re.sub(r"[^\w\s]", " ", text)
     text = re.sub(r"\s+", " ", text)
     return text.strip().upper()
+
+def validate_file_size(file, max_size=16 * 1024 * 1024):
+    """Cek ukuran file upload (FileStorage) tanpa membaca seluruh isinya"""
+    try:
+        stream = file.stream
+        posisi = stream.tell()
+        stream.seek(0, 2)
+        ukuran = stream.tell()
+        stream.seek(posisi)
+        return ukuran <= max_size
+    except Exception:
+        # Jika stream tidak bisa di-seek, biarkan MAX_CONTENT_LENGTH Flask yang membatasi
+        return True
+
+def format_response(result, message=None):
+    """
+    Bentuk response JSON standar dari hasil processor. ``message`` hanya
+    dipakai jika hasil processor belum membawa message sendiri.
+    """
+    response = dict(result)
+    response["success"] = result.get("success", True)
+    if message and not response.get("message"):
+        response["message"] = message
+    return response
+
+def format_stream_event(event, data, fmt="ndjson"):
+    """Bentuk satu event streaming sebagai baris NDJSON atau blok Server-Sent Events"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    if fmt == "sse":
+        return f"event: {event}\ndata: {payload}\n\n"
+    return json.dumps({"event": event, "data": data}, ensure_ascii=False, default=str) + "\n"
+
+def strip_timings(result):
+    """Hapus field timings dari hasil (termasuk per halaman / per file / hasil job)"""
+    if isinstance(result, dict):
+        result.pop("timings", None)
+        for key in ("data", "results"):
+            for item in result.get(key) or []:
+                strip_timings(item)
+        strip_timings(result.get("result"))
+    return result